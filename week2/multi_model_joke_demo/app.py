@@ -1,28 +1,25 @@
 import streamlit as st
-from multi_model_joke import generate_all_jokes
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from multi_model_joke import MODELS, make_clients, submit_all
 from datetime import datetime
 import os
+import time
 
 st.set_page_config(page_title="😂 Multi-Model Joke Generator", layout="wide")
 
-st.title("😂 Multi-Model Joke Generator for Data Scientists")
 
-st.markdown("""
-Welcome to the ultimate LLM showdown! Click the **Generate Jokes** button to see what each model brings to the (comedy) table. All jokes are light-hearted and meant for a Data Science audience.
-""")
+# Clients and the worker pool survive reruns; building them per rerun reopened every connection pool
+@st.cache_resource
+def get_clients():
+    return make_clients()
 
-# Generate jokes when button clicked
-if st.button("Generate Jokes"):
-    with st.spinner("Fetching jokes from all models..."):
-        results = generate_all_jokes()
-    
-    st.success("All jokes generated successfully!")
 
-    st.markdown("## 🤖 Model Responses")
-    for model_name, content in results.items():
-        st.markdown(f"### {model_name}")
-        st.markdown(content)
+@st.cache_resource
+def get_executor():
+    return ThreadPoolExecutor(max_workers=len(MODELS), thread_name_prefix="joke")
+
 
+def save_results(results):
     # Ensure output directory exists
     output_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../output"))
     os.makedirs(output_dir, exist_ok=True)
@@ -32,10 +29,62 @@ if st.button("Generate Jokes"):
     # Save all results to markdown
     with open(output_path, "w", encoding="utf-8") as f:
         f.write("# Data Science Jokes from Various Models\n\n")
-        for model, text in results.items():
+        for model, (text, _) in results.items():
             f.write(f"## {model}\n\n{text.strip()}\n\n")
+    return output_path
+
+
+def show(placeholder, model_name, result=None):
+    with placeholder.container():
+        st.markdown(f"### {model_name}")
+        if result is None:
+            st.markdown("⏳ Waiting for a punchline...")
+        else:
+            text, seconds = result
+            st.caption(f"⏱️ {seconds:.2f}s")
+            st.markdown(text)
+
+
+st.title("😂 Multi-Model Joke Generator for Data Scientists")
+
+st.markdown("""
+Welcome to the ultimate LLM showdown! Click the **Generate Jokes** button to see what each model brings to the (comedy) table. All jokes are light-hearted and meant for a Data Science audience.
+""")
+
+# Each press starts a run on the background pool; its futures and finished results live in
+# session_state, so a rerun mid-generation picks up where it was instead of calling the models again
+if st.button("Generate Jokes"):
+    started = time.perf_counter()
+    st.session_state["run"] = {
+        "futures": submit_all(get_executor(), get_clients()),
+        "results": {},
+        "started": started,
+        "saved": None,
+    }
+
+run = st.session_state.get("run")
+if run:
+    st.markdown("## 🤖 Model Responses")
+    placeholders = {name: st.empty() for name in MODELS}
+    for name, placeholder in placeholders.items():
+        show(placeholder, name, run["results"].get(name))
+
+    # Render each model as soon as it answers, in whatever order they finish
+    pending = {future: name for name, future in run["futures"].items() if name not in run["results"]}
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = pending.pop(future)
+            run["results"][name] = future.result()
+            show(placeholders[name], name, run["results"][name])
+    run.setdefault("elapsed", time.perf_counter() - run["started"])
+
+    slowest = max(seconds for _, seconds in run["results"].values())
+    st.success(f"All jokes generated in {run['elapsed']:.2f}s (slowest model {slowest:.2f}s).")
 
-    st.markdown(f"✅ Saved output to `{output_path}`")
+    if run["saved"] is None:
+        run["saved"] = save_results({name: run["results"][name] for name in MODELS})
+    st.markdown(f"✅ Saved output to `{run['saved']}`")
 
 else:
     st.info("Click the button to get jokes from OpenAI, Claude, and Gemini.")
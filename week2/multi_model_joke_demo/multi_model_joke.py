@@ -1,15 +1,10 @@
 import os
+import time
 from dotenv import load_dotenv
 from openai import OpenAI
 import anthropic
 import google.generativeai
 
-load_dotenv(override=True)
-
-openai = OpenAI()
-claude = anthropic.Anthropic()
-google.generativeai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
 system_message = "You are an assistant that is great at telling jokes"
 user_prompt = "Tell a light-hearted joke for an audience of Data Scientists"
 
@@ -18,61 +13,82 @@ prompts = [
     {"role": "user", "content": user_prompt}
 ]
 
-def generate_all_jokes():
-    results = {}
 
-    # OpenAI
-    try:
-        response = openai.chat.completions.create(model="gpt-3.5-turbo", messages=prompts)
-        results["GPT-3.5-Turbo"] = response.choices[0].message.content
-    except Exception as e:
-        results["GPT-3.5-Turbo"] = f"❌ Error: {str(e)}"
+def make_clients():
+    """Build the SDK clients once; the Streamlit app keeps them across reruns."""
+    load_dotenv(override=True)
+    google.generativeai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    return {
+        "openai": OpenAI(),
+        "claude": anthropic.Anthropic(),
+        "gemini_openai": OpenAI(
+            api_key=os.getenv("GOOGLE_API_KEY"),
+            base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
+        ),
+    }
 
-    try:
-        response = openai.chat.completions.create(model="gpt-4o-mini", messages=prompts, temperature=0.7)
-        results["GPT-4o-Mini"] = response.choices[0].message.content
-    except Exception as e:
-        results["GPT-4o-Mini"] = f"❌ Error: {str(e)}"
 
-    try:
-        response = openai.chat.completions.create(model="gpt-4o", messages=prompts, temperature=0.4)
-        results["GPT-4o"] = response.choices[0].message.content
-    except Exception as e:
-        results["GPT-4o"] = f"❌ Error: {str(e)}"
+# ---------- One function per model ----------
+def gpt(model, **options):
+    def tell(clients):
+        response = clients["openai"].chat.completions.create(model=model, messages=prompts, **options)
+        return response.choices[0].message.content
+    return tell
 
-    # Claude
-    try:
-        response = claude.messages.create(
-            model="claude-3-5-sonnet-latest",
-            max_tokens=200,
-            temperature=0.7,
-            system=system_message,
-            messages=[{"role": "user", "content": user_prompt}]
-        )
-        results["Claude 3.5 Sonnet"] = response.content[0].text
-    except Exception as e:
-        results["Claude 3.5 Sonnet"] = f"❌ Error: {str(e)}"
 
-    # Gemini
-    try:
-        gemini = google.generativeai.GenerativeModel(
-            model_name="gemini-2.0-flash-exp",
-            system_instruction=system_message
-        )
-        response = gemini.generate_content(user_prompt)
-        results["Gemini 2.0 (via SDK)"] = response.text
-    except Exception as e:
-        results["Gemini 2.0 (via SDK)"] = f"❌ Error: {str(e)}"
+def claude_sonnet(clients):
+    response = clients["claude"].messages.create(
+        model="claude-3-5-sonnet-latest",
+        max_tokens=200,
+        temperature=0.7,
+        system=system_message,
+        messages=[{"role": "user", "content": user_prompt}]
+    )
+    return response.content[0].text
+
+
+def gemini_sdk(clients):
+    gemini = google.generativeai.GenerativeModel(
+        model_name="gemini-2.0-flash-exp",
+        system_instruction=system_message
+    )
+    return gemini.generate_content(user_prompt).text
+
+
+def gemini_openai(clients):
+    response = clients["gemini_openai"].chat.completions.create(model="gemini-2.0-flash-exp", messages=prompts)
+    return response.choices[0].message.content
+
+
+# display name -> call, in the order the app shows them
+MODELS = {
+    "GPT-3.5-Turbo": gpt("gpt-3.5-turbo"),
+    "GPT-4o-Mini": gpt("gpt-4o-mini", temperature=0.7),
+    "GPT-4o": gpt("gpt-4o", temperature=0.4),
+    "Claude 3.5 Sonnet": claude_sonnet,
+    "Gemini 2.0 (via SDK)": gemini_sdk,
+    "Gemini 2.0 (OpenAI-Compatible API)": gemini_openai,
+}
 
-    # Gemini via OpenAI-compatible API
+
+def tell_joke(clients, model_name):
+    """(joke, seconds) for one model; errors come back as the joke text so one model can't sink the rest."""
+    start = time.perf_counter()
     try:
-        gemini_openai = OpenAI(
-            api_key=os.getenv("GOOGLE_API_KEY"),
-            base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-        )
-        response = gemini_openai.chat.completions.create(model="gemini-2.0-flash-exp", messages=prompts)
-        results["Gemini 2.0 (OpenAI-Compatible API)"] = response.choices[0].message.content
+        text = MODELS[model_name](clients)
     except Exception as e:
-        results["Gemini 2.0 (OpenAI-Compatible API)"] = f"❌ Error: {str(e)}"
+        text = f"❌ Error: {str(e)}"
+    return text, time.perf_counter() - start
+
 
+def submit_all(executor, clients):
+    """Start every model on `executor`; returns {model name: future of (joke, seconds)}."""
+    return {name: executor.submit(tell_joke, clients, name) for name in MODELS}
+
+
+def generate_all_jokes(clients=None):
+    results = {}
+    clients = clients or make_clients()
+    for name in MODELS:
+        results[name], _ = tell_joke(clients, name)
     return results
@@ -1,10 +1,14 @@
 import os
+import sys
 from datetime import datetime
 import gradio as gr
 import anthropic
 from openai import OpenAI
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import checkpoint, sink, telemetry, tracing, transcripts, turns
+
 # ---------- Load environment variables ----------
 load_dotenv()
 
@@ -28,15 +32,18 @@ PERSONALITIES = {
 }
 
 # ---------- Save Markdown Output ----------
+# Written by the output sink's background thread (deduplicated, compressed when old, size-capped)
+outputs = sink.get("output")
+
 def save_convo(convo):
-    os.makedirs("output", exist_ok=True)
-    filename = f"output/claude_vs_deepseek_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.md"
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write("# Claude 😇 vs DeepSeek 😈 Conversation\n\n")
-        for speaker, msg in convo:
-            role = "User" if speaker is None else speaker
-            f.write(f"**{role}:** {msg}\n\n")
-    print(f"💾 Saved to {filename}")
+    filename = f"claude_vs_deepseek_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.md"
+    lines = ["# Claude 😇 vs DeepSeek 😈 Conversation\n\n"]
+    for speaker, msg in convo:
+        role = "User" if speaker is None else speaker
+        lines.append(f"**{role}:** {msg}\n\n")
+    path = outputs.write(filename, "".join(lines), kind="transcript")
+    print(f"💾 Saved to {path}")
+    return path
 
 # ---------- DeepSeek Initialization ----------
 def init_deepseek():
@@ -51,60 +58,87 @@ def init_deepseek():
     return client
 
 # ---------- Main Conversation Simulation ----------
+# Each reply is checkpointed (output/checkpoints/deepseek_vs_claude_*.jsonl); a stopped run can be resumed
+APP = "deepseek_vs_claude"
+CLAUDE_MODEL = "claude-3-haiku-20240307"
+
+@tracing.traced("simulate_convo")
 def simulate_convo(user_input, turns, claude_personality, deepseek_personality, deepseek_model):
+    run = checkpoint.start(APP, user_input=user_input, turns=int(turns), claude_personality=claude_personality,
+                           deepseek_personality=deepseek_personality, deepseek_model=deepseek_model)
+    transcripts.get().conversation(APP, title=user_input, conversation_id=run.id).add("User", user_input)
+    return continue_convo(run)
+
+@tracing.traced("resume_convo")
+def resume_convo(run_id):
+    """Continue a checkpointed run after its last completed reply."""
+    if not run_id:
+        return [{"role": "user", "content": "⚠️ Pick an unfinished run to resume."}]
+    return continue_convo(checkpoint.load(run_id))
+
+def continue_convo(run):
+    p = run.params
+    user_input, claude_personality = p["user_input"], p["claude_personality"]
+    deepseek_personality, deepseek_model = p["deepseek_personality"], p["deepseek_model"]
     try:
         deepseek = init_deepseek()
     except Exception as e:
         return [{"role": "user", "content": f"❌ DeepSeek Init Error: {e}"}]
 
-    convo = [(None, user_input)]
-    claude_msgs = [("User", user_input)]
-    deepseek_msgs = ["Hi"]
-
-    def call_claude():
+    # `seen` holds each bot's replies from the checkpoint that this call may read
+    def call_claude(seen):
+        """(reply, output tokens)"""
+        claude_msgs = [user_input] + seen["claude"]
+        deepseek_msgs = ["Hi"] + seen["deepseek"]
         messages = []
-        for u, c in zip(deepseek_msgs, [m[1] for m in claude_msgs]):
+        for u, c in zip(deepseek_msgs, claude_msgs):
             messages.append({"role": "user", "content": u})
             messages.append({"role": "assistant", "content": c})
         messages.append({"role": "user", "content": deepseek_msgs[-1]})
-        try:
-            response = claude_client.messages.create(
-                model="claude-3-haiku-20240307",
-                system=PERSONALITIES[claude_personality],
-                messages=messages,
-                max_tokens=512
-            )
-            return response.content[0].text.strip()
-        except Exception as e:
-            return f"⚠️ Claude Error: {e}"
-
-    def call_deepseek():
+        response = claude_client.messages.create(
+            model=CLAUDE_MODEL,
+            system=PERSONALITIES[claude_personality],
+            messages=messages,
+            max_tokens=512
+        )
+        return response.content[0].text.strip(), transcripts.output_tokens(response)
+
+    def call_deepseek(seen):
         messages = [{"role": "system", "content": PERSONALITIES[deepseek_personality]}]
-        for c in claude_msgs:
-            messages.append({"role": "assistant", "content": c[1]})
-        for d in deepseek_msgs:
+        for c in [user_input] + seen["claude"]:
+            messages.append({"role": "assistant", "content": c})
+        for d in ["Hi"] + seen["deepseek"]:
             messages.append({"role": "user", "content": d})
-        try:
-            response = deepseek.chat.completions.create(
-                model=deepseek_model,
-                messages=messages,
-                max_tokens=500
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            return f"⚠️ DeepSeek Error: {e}"
-
-    for _ in range(turns):
-        claude_reply = call_claude()
-        deepseek_reply = call_deepseek()
-
-        claude_msgs.append(("Claude 😇", claude_reply))
-        deepseek_msgs.append(deepseek_reply)
+        response = deepseek.chat.completions.create(
+            model=deepseek_model,
+            messages=messages,
+            max_tokens=500
+        )
+        return response.choices[0].message.content.strip(), transcripts.output_tokens(response)
+
+    # DeepSeek answers the conversation as it stood when the round began, so both calls run at once
+    bots = [
+        turns.Bot("claude", "Claude 😇", call_claude),
+        turns.Bot("deepseek", "DeepSeek 😈", call_deepseek),
+    ]
+    models = {"claude": (CLAUDE_MODEL, claude_personality), "deepseek": (deepseek_model, deepseek_personality)}
+    convo = [(None, user_input)] + [(turn["speaker"], turn["content"]) for turn in turns.transcript(run, bots)]
+    record = transcripts.get().conversation(APP, title=user_input, conversation_id=run.id, seq=len(convo))
+
+    def on_reply(bot, reply, latency_ms, tokens):
+        convo.append((bot.speaker, reply))
+        model, personality = models[bot.name]
+        record.add(bot.speaker, reply, model=model, personality=personality, latency_ms=latency_ms, tokens=tokens)
 
-        convo.append(("Claude 😇", claude_reply))
-        convo.append(("DeepSeek 😈", deepseek_reply))
-
-    save_convo(convo)
+    try:
+        turns.play(run, bots, p["turns"], on_reply)
+    except turns.Stopped as e:
+        print(f"⚠️ Run {run.id} stopped: {e}")
+        convo.append((e.bot.speaker, f"⚠️ {e.bot.speaker.split()[0]} Error: {e.error}. Resume this run to continue."))
+    else:
+        path = save_convo(convo)
+        record.saved_as(path)
+        run.finish(path=path)
 
     return [{"role": "user" if speaker is None else "assistant", "content": f"{speaker or 'User'}: {msg}"} for speaker, msg in convo]
 
@@ -120,13 +154,23 @@ with gr.Blocks() as demo:
         turn_slider = gr.Slider(minimum=1, maximum=10, value=5, step=1, label="Conversation Turns")
         run_btn = gr.Button("Run Showdown")
 
+    with gr.Row():
+        resume_choice = gr.Dropdown(label="Unfinished Runs", choices=checkpoint.choices(APP), scale=3)
+        resume_btn = gr.Button("Resume Run")
+
     chat_ui = gr.Chatbot(label="Conversation Log", height=600, type="messages")
 
+    def refresh_runs():
+        return gr.update(choices=checkpoint.choices(APP), value=None)
+
     run_btn.click(
         fn=simulate_convo,
         inputs=[user_input, turn_slider, claude_p, deepseek_p, deepseek_model],
         outputs=chat_ui
-    )
+    ).then(refresh_runs, outputs=resume_choice)
+    resume_btn.click(fn=resume_convo, inputs=resume_choice, outputs=chat_ui).then(refresh_runs, outputs=resume_choice)
+    demo.load(refresh_runs, outputs=resume_choice)
 
 if __name__ == "__main__":
+    telemetry.serve()
     demo.launch(share=True)
@@ -1,10 +1,14 @@
 import os
+import sys
 from datetime import datetime
 import gradio as gr
 import google.generativeai as genai
 from openai import OpenAI
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import checkpoint, sink, telemetry, tracing, transcripts, turns
+
 # ---------- Load environment variables ----------
 load_dotenv()
 
@@ -30,41 +34,57 @@ def init_deepseek():
     )
     return client
 
-# ✅ Markdown saving
+# ✅ Markdown saving (off the request thread, through the output sink)
+outputs = sink.get("output")
+
 def save_convo(convo):
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    os.makedirs("output", exist_ok=True)
-    path = f"output/test_gemini_vs_deepseek_{timestamp}.md"
-    with open(path, "w", encoding="utf-8") as f:
-        f.write("# Gemini 😇 vs DeepSeek 😈 Conversation\n\n")
-        for speaker, msg in convo:
-            if speaker is None:
-                f.write(f"**User:** {msg}\n\n")
-            else:
-                f.write(f"**{speaker}:** {msg}\n\n")
+    lines = ["# Gemini 😇 vs DeepSeek 😈 Conversation\n\n"]
+    for speaker, msg in convo:
+        if speaker is None:
+            lines.append(f"**User:** {msg}\n\n")
+        else:
+            lines.append(f"**{speaker}:** {msg}\n\n")
+    path = outputs.write(f"test_gemini_vs_deepseek_{timestamp}.md", "".join(lines), kind="transcript")
     print(f"💾 Saved to {path}")
+    return path
 
-# ✅ Conversation logic
+# ✅ Conversation logic (each reply checkpointed to output/checkpoints/gemini_vs_deepseek_*.jsonl)
+APP = "gemini_vs_deepseek"
+TURNS = 5
+
+@tracing.traced("simulate_convo")
 def simulate_convo(user_input):
+    run = checkpoint.start(APP, user_input=user_input, turns=TURNS)
+    transcripts.get().conversation(APP, title=user_input, conversation_id=run.id).add("User", user_input)
+    return continue_convo(run)
+
+# ✅ Resume: rebuild both message lists from the checkpoint and request only the missing replies
+@tracing.traced("resume_convo")
+def resume_convo(run_id):
+    if not run_id:
+        return [(None, "⚠️ Pick an unfinished run to resume.")]
+    return continue_convo(checkpoint.load(run_id))
+
+def continue_convo(run):
+    user_input = run.params["user_input"]
     try:
         deepseek = init_deepseek()
     except Exception as e:
         return [(None, f"❌ DeepSeek init error: {e}")]
 
-    gemini_msgs = [user_input]
-    deepseek_msgs = ["Hi"]
-    convo = [(None, f"User: {user_input}")]
-
-    def call_gemini():
+    # `seen` holds each bot's replies from the checkpoint that this call may read
+    def call_gemini(seen):
         history = [{"role": "user", "parts": [user_input]}]
-        for g, d in zip(gemini_msgs, deepseek_msgs):
+        for g, d in zip([user_input] + seen["gemini"], ["Hi"] + seen["deepseek"]):
             history.append({"role": "model", "parts": [g]})
             history.append({"role": "user", "parts": [d]})
-        return gemini_model.generate_content(history).text.strip()
+        response = gemini_model.generate_content(history)
+        return response.text.strip(), transcripts.output_tokens(response)
 
-    def call_deepseek():
+    def call_deepseek(seen):
         messages = [{"role": "system", "content": "You are sarcastic and love arguing."}]
-        for g, d in zip(gemini_msgs, deepseek_msgs):
+        for g, d in zip([user_input] + seen["gemini"], ["Hi"] + seen["deepseek"]):
             messages.append({"role": "assistant", "content": g})
             messages.append({"role": "user", "content": d})
         reply = deepseek.chat.completions.create(
@@ -72,26 +92,31 @@ def simulate_convo(user_input):
             messages=messages,
             max_tokens=300
         )
-        return reply.choices[0].message.content.strip()
+        return reply.choices[0].message.content.strip(), transcripts.output_tokens(reply)
 
-    for _ in range(5):
-        try:
-            g_reply = call_gemini()
-        except Exception as e:
-            g_reply = f"⚠️ Gemini error: {e}"
+    # Neither bot reads the other's reply from the same round, so both calls run at once
+    bots = [
+        turns.Bot("gemini", "Gemini 😇", call_gemini),
+        turns.Bot("deepseek", "DeepSeek 😈", call_deepseek),
+    ]
+    models = {"gemini": "gemini-1.5-flash", "deepseek": "deepseek-chat"}
+    convo = [(None, f"User: {user_input}")] + [(turn["speaker"], turn["content"]) for turn in turns.transcript(run, bots)]
+    record = transcripts.get().conversation(APP, title=user_input, conversation_id=run.id, seq=len(convo))
 
-        try:
-            d_reply = call_deepseek()
-        except Exception as e:
-            d_reply = f"⚠️ DeepSeek error: {e}"
+    def on_reply(bot, reply, latency_ms, tokens):
+        convo.append((bot.speaker, reply))
+        record.add(bot.speaker, reply, model=models[bot.name], latency_ms=latency_ms, tokens=tokens)
 
-        gemini_msgs.append(g_reply)
-        deepseek_msgs.append(d_reply)
-
-        convo.append(("Gemini 😇", g_reply))
-        convo.append(("DeepSeek 😈", d_reply))
-
-    save_convo(convo)
+    try:
+        turns.play(run, bots, run.params["turns"], on_reply)
+    except turns.Stopped as e:
+        print(f"⚠️ Run {run.id} stopped: {e}")
+        convo.append((e.bot.speaker, f"⚠️ {e.bot.speaker.split()[0]} error: {e.error}. Resume this run to continue."))
+        return convo
+
+    path = save_convo(convo)
+    record.saved_as(path)
+    run.finish(path=path)
     return convo
 
 # ✅ Gradio UI
@@ -99,10 +124,19 @@ with gr.Blocks() as demo:
     gr.Markdown("## 🤖 Gemini vs DeepSeek – Personality Battle")
     user_input = gr.Textbox(label="Start Message", placeholder="Say something...", lines=2)
     run_btn = gr.Button("Start Conversation")
+    with gr.Row():
+        resume_choice = gr.Dropdown(label="Unfinished Runs", choices=checkpoint.choices(APP), scale=3)
+        resume_btn = gr.Button("Resume Run")
     chatbox = gr.Chatbot(label="Conversation", height=600)
 
-    run_btn.click(fn=simulate_convo, inputs=user_input, outputs=chatbox)
+    def refresh_runs():
+        return gr.update(choices=checkpoint.choices(APP), value=None)
+
+    run_btn.click(fn=simulate_convo, inputs=user_input, outputs=chatbox).then(refresh_runs, outputs=resume_choice)
+    resume_btn.click(fn=resume_convo, inputs=resume_choice, outputs=chatbox).then(refresh_runs, outputs=resume_choice)
+    demo.load(refresh_runs, outputs=resume_choice)
 
 # ✅ Launch
 if __name__ == "__main__":
+    telemetry.serve()
     demo.launch(share=True)
@@ -1,11 +1,18 @@
 import os
+import sys
 from datetime import datetime
 import gradio as gr
 from openai import OpenAI
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import checkpoint, sink, telemetry, tracing, transcripts, turns
+
 # ---------- Output Directory ----------
-os.makedirs("output", exist_ok=True)
+# Transcripts are written by the output sink's background thread
+outputs = sink.get("output")
+# Each reply is checkpointed (output/checkpoints/deepseek_vs_gpt_*.jsonl); a stopped run can be resumed
+APP = "deepseek_vs_gpt"
 
 # ---------- Personalities ----------
 PERSONALITIES = {
@@ -22,7 +29,7 @@ load_dotenv()
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 if not DEEPSEEK_API_KEY:
     raise RuntimeError("❌ Missing DEEPSEEK_API_KEY. Export it or add it to your .env file.")
-DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
 
 def get_clients():
     openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -44,48 +51,84 @@ def build_message_history(gpt_msgs, deepseek_msgs, system_prompt, is_gpt):
         messages.append({"role": "user", "content": gpt_msgs[-1]})
     return messages
 
+@tracing.traced("simulate_convo")
 def simulate_convo(user_input, gpt_model, deepseek_model, num_turns, gpt_personality, deepseek_personality):
+    run = checkpoint.start(APP, user_input=user_input, gpt_model=gpt_model, deepseek_model=deepseek_model,
+                           num_turns=int(num_turns), gpt_personality=gpt_personality,
+                           deepseek_personality=deepseek_personality)
+    transcripts.get().conversation(APP, title=user_input, conversation_id=run.id).add("User", user_input)
+    return continue_convo(run)
+
+@tracing.traced("resume_convo")
+def resume_convo(run_id):
+    """Continue a checkpointed run after its last completed reply."""
+    if not run_id:
+        return [("System", "⚠️ Pick an unfinished run to resume.")]
+    return continue_convo(checkpoint.load(run_id))
+
+def continue_convo(run):
+    p = run.params
+    user_input, gpt_model, deepseek_model = p["user_input"], p["gpt_model"], p["deepseek_model"]
+    gpt_personality, deepseek_personality = p["gpt_personality"], p["deepseek_personality"]
     openai_client, deepseek_client = get_clients()
 
     gpt_system = PERSONALITIES[gpt_personality]
     deepseek_system = PERSONALITIES[deepseek_personality]
 
-    gpt_msgs = [user_input]
-    deepseek_msgs = ["Hi"]
-    convo = [("User", user_input)]
-
-    for _ in range(num_turns):
-        # GPT response
-        gpt_messages = build_message_history(gpt_msgs, deepseek_msgs, gpt_system, is_gpt=True)
-        gpt_reply = openai_client.chat.completions.create(
+    # `seen` holds each bot's replies from the checkpoint that this call may read
+    def call_gpt(seen):
+        gpt_messages = build_message_history([user_input] + seen["gpt"], ["Hi"] + seen["deepseek"], gpt_system, is_gpt=True)
+        response = openai_client.chat.completions.create(
             model=gpt_model,
             messages=gpt_messages
-        ).choices[0].message.content.strip()
-        gpt_msgs.append(gpt_reply)
-        convo.append((f"{gpt_model} ({gpt_personality})", gpt_reply))
+        )
+        return response.choices[0].message.content.strip(), transcripts.output_tokens(response)
 
-        # DeepSeek response
-        deepseek_messages = build_message_history(gpt_msgs, deepseek_msgs, deepseek_system, is_gpt=False)
-        deepseek_reply = deepseek_client.chat.completions.create(
+    def call_deepseek(seen):
+        deepseek_messages = build_message_history([user_input] + seen["gpt"], ["Hi"] + seen["deepseek"],
+                                                  deepseek_system, is_gpt=False)
+        response = deepseek_client.chat.completions.create(
             model=deepseek_model,
             messages=deepseek_messages,
             max_tokens=500
-        ).choices[0].message.content.strip()
-        deepseek_msgs.append(deepseek_reply)
-        convo.append((f"{deepseek_model} ({deepseek_personality})", deepseek_reply))
-
-    save_conversation(convo, (gpt_model, deepseek_model))
+        )
+        return response.choices[0].message.content.strip(), transcripts.output_tokens(response)
+
+    # DeepSeek answers GPT's reply from the same round, so these two strictly alternate
+    bots = [
+        turns.Bot("gpt", f"{gpt_model} ({gpt_personality})", call_gpt),
+        turns.Bot("deepseek", f"{deepseek_model} ({deepseek_personality})", call_deepseek, after="gpt"),
+    ]
+    models = {"gpt": (gpt_model, gpt_personality), "deepseek": (deepseek_model, deepseek_personality)}
+    convo = [("User", user_input)] + [(turn["speaker"], turn["content"]) for turn in turns.transcript(run, bots)]
+    record = transcripts.get().conversation(APP, title=user_input, conversation_id=run.id, seq=len(convo))
+
+    def on_reply(bot, reply, latency_ms, tokens):
+        convo.append((bot.speaker, reply))
+        model, personality = models[bot.name]
+        record.add(bot.speaker, reply, model=model, personality=personality, latency_ms=latency_ms, tokens=tokens)
+
+    try:
+        turns.play(run, bots, p["num_turns"], on_reply)
+    except turns.Stopped as e:
+        print(f"⚠️ Run {run.id} stopped: {e}")
+        convo.append(("System", f"⚠️ Stopped: {e.error}. Resume this run to continue from reply {len(run.turns) + 1}."))
+        return convo
+
+    path = save_conversation(convo, (gpt_model, deepseek_model))
+    record.saved_as(path)
+    run.finish(path=path)
     return convo
 
 # ---------- Save Markdown Output ----------
 def save_conversation(convo, model_names):
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    filename = f"output/convo_{timestamp}.md"
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(f"# {model_names[0]} vs {model_names[1]} Conversation\n\n")
-        for speaker, message in convo:
-            f.write(f"**{speaker}:** {message}\n\n")
+    lines = [f"# {model_names[0]} vs {model_names[1]} Conversation\n\n"]
+    for speaker, message in convo:
+        lines.append(f"**{speaker}:** {message}\n\n")
+    filename = outputs.write(f"convo_{timestamp}.md", "".join(lines), kind="transcript")
     print(f"💾 Chat saved to {filename}")
+    return filename
 
 # ---------- Gradio UI ----------
 with gr.Blocks() as demo:
@@ -100,23 +143,35 @@ with gr.Blocks() as demo:
         turn_slider = gr.Slider(label="Conversation Turns", minimum=1, maximum=10, value=5, step=1)
         launch_btn = gr.Button("Run Showdown")
 
+    with gr.Row():
+        resume_selector = gr.Dropdown(label="Unfinished Runs", choices=checkpoint.choices(APP), scale=3)
+        resume_btn = gr.Button("Resume Run")
+
     chat_ui = gr.Chatbot(label="Chat Log", height=600, type='messages')
 
-    def run_chat(message, gpt_model, deepseek_model, turns, gpt_personality, deepseek_personality):
-        convo = simulate_convo(message, gpt_model, deepseek_model, turns, gpt_personality, deepseek_personality)
+    def to_ui(convo):
         ui_convo = []
         for speaker, reply in convo:
             if speaker == "User":
                 ui_convo.append({"role": "user", "content": f"🧑‍💬 {speaker}: {reply}"})
             else:
                 ui_convo.append({"role": "assistant", "content": f"🤖 {speaker}: {reply}"})
-        return ui_convo
+        return ui_convo, gr.update(choices=checkpoint.choices(APP), value=None)
+
+    def run_chat(message, gpt_model, deepseek_model, turns, gpt_personality, deepseek_personality):
+        return to_ui(simulate_convo(message, gpt_model, deepseek_model, turns, gpt_personality, deepseek_personality))
+
+    def resume_chat(run_id):
+        return to_ui(resume_convo(run_id))
 
     launch_btn.click(
         fn=run_chat,
         inputs=[user_input, gpt_selector, deepseek_selector, turn_slider, gpt_personality_selector, deepseek_personality_selector],
-        outputs=chat_ui
+        outputs=[chat_ui, resume_selector]
     )
+    resume_btn.click(fn=resume_chat, inputs=resume_selector, outputs=[chat_ui, resume_selector])
+    demo.load(lambda: gr.update(choices=checkpoint.choices(APP)), outputs=resume_selector)
 
 if __name__ == "__main__":
+    telemetry.serve()
     demo.launch(share=True)
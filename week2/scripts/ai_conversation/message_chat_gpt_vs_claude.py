@@ -3,11 +3,16 @@ import os
 from dotenv import load_dotenv
 from openai import OpenAI
 import anthropic
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import telemetry, tracing
 
 load_dotenv()
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 claude_client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
+@tracing.traced("ai_conversation")
 def ai_conversation(user_input):
     gpt_model = "gpt-4o-mini"
     claude_model = "claude-3-haiku-20240307"
@@ -60,4 +65,5 @@ demo = gr.Interface(
 )
 
 if __name__ == "__main__":
+    telemetry.serve()
     demo.launch()
@@ -1,9 +1,16 @@
 import os
+import sys
+import time
 from datetime import datetime
 import gradio as gr
 from openai import OpenAI
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import sink, telemetry, tracing, transcripts
+from common.cancellation import SessionStreams, closer, estimate_tokens, guarded, metrics
+from common.conversation import session_id
+
 # ---------- Setup ----------
 load_dotenv()
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
@@ -15,6 +22,9 @@ if not DEEPSEEK_API_KEY or not OPENAI_KEY:
 
 os.makedirs("output", exist_ok=True)
 
+# Stop / tab close ends the upstream streams instead of letting all turns run out
+streams = SessionStreams()
+
 PERSONALITIES = {
     "Polite": "You are a very polite chatbot who tries to agree and calm things down.",
     "Snarky": "You are a chatbot who is very argumentative; you challenge everything in a snarky way.",
@@ -37,7 +47,13 @@ def build_history(gpt_msgs, deepseek_msgs, system_msg, is_gpt=True):
     return messages
 
 # ---------- Streaming Function ----------
-def run_chat_stream(message, history):
+@tracing.traced("run_chat_stream")
+def run_chat_stream(message, history, request: gr.Request = None):
+    with streams.track(session_id(request)) as token:
+        yield from _run_turns(message, token)
+
+
+def _run_turns(message, token):
     gpt_model = "gpt-4o-mini"
     deepseek_model = "deepseek-chat"
     gpt_personality = "Snarky"
@@ -50,49 +66,69 @@ def run_chat_stream(message, history):
     gpt_msgs = [message]
     deepseek_msgs = ["Hi"]
     convo_log = [("User", message)]
+    # turns are recorded as they finish, so a stopped run keeps what it streamed
+    record = transcripts.get().conversation("streaming_deepseek_vs_gpt", title=message)
+    record.add("User", message)
 
     yield "🧑‍💬 User: " + message
 
     for _ in range(num_turns):
         # GPT streams first
         gpt_response = ""
+        started = time.perf_counter()
         stream = openai_client.chat.completions.create(
             model=gpt_model,
             messages=build_history(gpt_msgs, deepseek_msgs, PERSONALITIES[gpt_personality], is_gpt=True),
             stream=True,
         )
-        for chunk in stream:
-            delta = chunk.choices[0].delta.content or ""
+        deltas = (chunk.choices[0].delta.content or "" for chunk in stream)
+        for delta in guarded(deltas, gpt_model, close=closer(stream), token=token):
             gpt_response += delta
             yield f"🤖 {gpt_model} ({gpt_personality}): {gpt_response}"
+        if token.cancelled:
+            return
         gpt_msgs.append(gpt_response)
         convo_log.append((f"{gpt_model} ({gpt_personality})", gpt_response))
+        record.add(convo_log[-1][0], gpt_response, model=gpt_model, personality=gpt_personality,
+                   latency_ms=1000 * (time.perf_counter() - started), tokens=estimate_tokens(gpt_response))
 
         # DeepSeek streams back
         deepseek_response = ""
+        started = time.perf_counter()
         stream = deepseek_client.chat.completions.create(
             model=deepseek_model,
             messages=build_history(gpt_msgs, deepseek_msgs, PERSONALITIES[deepseek_personality], is_gpt=False),
             stream=True,
         )
-        for chunk in stream:
-            delta = chunk.choices[0].delta.content or ""
+        deltas = (chunk.choices[0].delta.content or "" for chunk in stream)
+        for delta in guarded(deltas, deepseek_model, close=closer(stream), token=token):
             deepseek_response += delta
             yield f"🤖 {deepseek_model} ({deepseek_personality}): {deepseek_response}"
+        if token.cancelled:
+            return
         deepseek_msgs.append(deepseek_response)
         convo_log.append((f"{deepseek_model} ({deepseek_personality})", deepseek_response))
+        record.add(convo_log[-1][0], deepseek_response, model=deepseek_model, personality=deepseek_personality,
+                   latency_ms=1000 * (time.perf_counter() - started), tokens=estimate_tokens(deepseek_response))
 
-    save_conversation(convo_log, gpt_model, deepseek_model)
+    record.saved_as(save_conversation(convo_log, gpt_model, deepseek_model))
 
 # ---------- Markdown Output ----------
+# Queued to the output sink; the stream's last update doesn't wait on the disk
+outputs = sink.get("output")
+
 def save_conversation(convo, gpt_model, deepseek_model):
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    filename = f"output/convo_{timestamp}.md"
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(f"# {gpt_model} vs {deepseek_model} Chat\n\n")
-        for speaker, msg in convo:
-            f.write(f"**{speaker}:** {msg.strip()}\n\n")
+    lines = [f"# {gpt_model} vs {deepseek_model} Chat\n\n"]
+    for speaker, msg in convo:
+        lines.append(f"**{speaker}:** {msg.strip()}\n\n")
+    filename = outputs.write(f"convo_{timestamp}.md", "".join(lines), kind="transcript")
     print(f"💾 Conversation saved to {filename}")
+    return filename
+
+def cancel_session(request: gr.Request):
+    if streams.cancel(session_id(request)):
+        print(metrics.report())
 
 # ---------- Launch UI ----------
 demo = gr.ChatInterface(
@@ -100,6 +136,8 @@ demo = gr.ChatInterface(
     title="🤖 GPT vs DeepSeek – Streaming AI Personality Showdown",
     description="Enter a message. Watch GPT-4o (Snarky) and DeepSeek (Polite) go back and forth for 5 turns.",
 )
+demo.unload(cancel_session)
 
 if __name__ == "__main__":
+    telemetry.serve()
     demo.launch(share=True)
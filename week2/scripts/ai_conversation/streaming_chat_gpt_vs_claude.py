@@ -3,6 +3,10 @@ from dotenv import load_dotenv
 import gradio as gr
 from openai import OpenAI
 import anthropic
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import telemetry, tracing
 
 # Load keys
 load_dotenv()
@@ -16,6 +20,7 @@ gpt_system = "You are a chatbot who is very argumentative; you challenge everyth
 claude_system = "You are a very polite chatbot who tries to agree and calm things down."
 
 # Streaming conversation
+@tracing.traced("ai_conversation_stream")
 def ai_conversation_stream(user_input):
     gpt_msgs = [user_input]
     claude_msgs = ["Hi"]
@@ -63,4 +68,5 @@ demo = gr.Interface(
 )
 
 if __name__ == "__main__":
+    telemetry.serve()
     demo.launch()
@@ -0,0 +1,339 @@
+"""
+Headless personality tournament: every provider × personality pairing, played on
+a set of opening prompts, with no Gradio involved.
+
+The showdown apps play one hand-picked pairing per button press. This plays the
+whole matrix. For every ordered pair of providers and every ordered pair of
+personalities, each opening prompt is a match of --rounds rounds. The first bot
+opens and the second answers it. Matches run --concurrency at a time. Every call
+waits its turn on the shared rate limiter (common.ratelimit) for its provider and
+model, so a wide matrix queues instead of tripping 429s.
+
+    python ai_conversation/tournament.py --providers openai,deepseek,claude --personalities Snarky,Polite \\
+        --prompts "Is pineapple on pizza acceptable?" "Cats or dogs?" [--rounds 3] [--concurrency 4]
+    python ai_conversation/tournament.py --resume <name>
+
+Providers are openai, deepseek, claude and gemini. `provider:model` overrides the
+default model. Each match is a checkpointed run under
+output/tournaments/<name>/checkpoints. After a crash, --resume skips finished
+matches and continues the others from their last reply. The aggregated report
+covers every match: per-match, per-model and per-personality latency, tokens and
+reply length. It is written to output/tournaments/<name>/report.md and
+report.json.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from itertools import product
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import checkpoint, lazy, transcripts, turns
+from common.cancellation import estimate_tokens
+from common.gemini import GeminiAdapter, chunk_text, to_contents
+from common.hedging import percentile
+from common.ratelimit import estimate_request_tokens, limiter
+
+openai = lazy.module("openai")
+anthropic = lazy.module("anthropic")
+
+TOURNAMENT_DIR = os.path.join("output", "tournaments")
+APP = "tournament"
+
+PERSONALITIES = {
+    "Polite": "You are a very polite chatbot who tries to agree and calm things down.",
+    "Snarky": "You are a chatbot who is very argumentative; you challenge everything in a snarky way.",
+    "Helpful": "You are a helpful assistant that gives concise and accurate answers.",
+    "Motivational": "You are a highly energetic motivational coach who inspires confidence."
+}
+
+# name -> (rate-limiter provider, default model)
+PROVIDERS = {
+    "openai": ("openai", "gpt-4o-mini"),
+    "deepseek": ("deepseek", "deepseek-chat"),
+    "claude": ("anthropic", "claude-3-haiku-20240307"),
+    "gemini": ("google", "gemini-1.5-flash"),
+}
+MAX_TOKENS = 400
+
+
+# ---------- Provider calls ----------
+class Clients:
+    """One SDK client per provider, created on first use and shared by every match."""
+
+    def __init__(self):
+        load_dotenv(override=True)
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._clients:
+                self._clients[name] = self._create(name)
+            return self._clients[name]
+
+    def _create(self, name):
+        # responses feed the rate limiter's buckets through the httpx hook
+        if name == "openai":
+            return openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=limiter.http_client("openai"))
+        if name == "deepseek":
+            return openai.OpenAI(api_key=os.getenv("DEEPSEEK_API_KEY"),
+                                 base_url=os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com"),
+                                 http_client=limiter.http_client("deepseek"))
+        if name == "claude":
+            return anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"),
+                                       http_client=limiter.http_client("anthropic"))
+        return GeminiAdapter(os.getenv("GOOGLE_API_KEY"))
+
+    def complete(self, name, model, system, messages, match):
+        """(reply, output tokens) for one call, after waiting for rate-limit capacity."""
+        request = [{"role": "system", "content": system}] + messages
+        reservation = limiter.acquire(PROVIDERS[name][0], model, estimate_request_tokens(request, MAX_TOKENS),
+                                      client=match, max_tokens=MAX_TOKENS)
+        used = reservation.prompt_tokens   # a failed call still hands back the completion it reserved
+        try:
+            client = self.get(name)
+            if name == "claude":
+                response = client.messages.create(model=model, system=system, messages=messages, max_tokens=MAX_TOKENS)
+                reply = response.content[0].text
+            elif name == "gemini":
+                system, contents = to_contents(request)
+                response = client.model(model, system).generate_content(
+                    contents, generation_config={"max_output_tokens": MAX_TOKENS})
+                reply = chunk_text(response)
+            else:
+                response = client.chat.completions.create(model=model, messages=request, max_tokens=MAX_TOKENS)
+                reply = response.choices[0].message.content
+            tokens = transcripts.output_tokens(response)
+            used += tokens or estimate_tokens(reply)
+        finally:
+            reservation.settle(used)
+        return reply.strip(), tokens
+
+
+def perspective(opening, mine, theirs, opens):
+    """The conversation from one bot's side: its replies are assistant turns, the other bot's are user turns."""
+    if opens:
+        messages = [{"role": "user", "content": opening}]
+        for own, other in zip(mine, theirs):
+            messages += [{"role": "assistant", "content": own}, {"role": "user", "content": other}]
+        return messages
+    messages = [{"role": "user", "content": f"Topic: {opening}\n\n{theirs[0]}"}]
+    for own, other in zip(mine, theirs[1:]):
+        messages += [{"role": "assistant", "content": own}, {"role": "user", "content": other}]
+    return messages
+
+
+# ---------- Matrix ----------
+def parse_provider(spec):
+    name, _, model = spec.partition(":")
+    if name not in PROVIDERS:
+        raise argparse.ArgumentTypeError(f"unknown provider '{name}' (choose from {', '.join(PROVIDERS)})")
+    return name, model or PROVIDERS[name][1]
+
+
+def build_matches(config):
+    matches = []
+    providers = [parse_provider(p) for p in config["providers"]]
+    pairs = [(a, b) for a, b in product(providers, repeat=2) if a != b] or [(providers[0], providers[0])]
+    for (a, b), (pa, pb), (i, prompt) in product(pairs, product(config["personalities"], repeat=2),
+                                                 enumerate(config["prompts"])):
+        matches.append({
+            "match": f"{a[0]}:{a[1]}/{pa} vs {b[0]}:{b[1]}/{pb} #{i + 1}",
+            "a": {"provider": a[0], "model": a[1], "personality": pa},
+            "b": {"provider": b[0], "model": b[1], "personality": pb},
+            "prompt": prompt,
+            "rounds": config["rounds"],
+        })
+    return matches
+
+
+def play_match(clients, match, run):
+    """Play (or finish) one match; returns its status."""
+    opening = match["prompt"]
+    sides = {"a": match["a"], "b": match["b"]}
+
+    def caller(side, other):
+        me = sides[side]
+
+        def call(seen):
+            messages = perspective(opening, seen[side], seen[other], opens=side == "a")
+            return clients.complete(me["provider"], me["model"], PERSONALITIES[me["personality"]], messages,
+                                    match["match"])
+        return call
+
+    bots = [
+        turns.Bot("a", f"{match['a']['model']} ({match['a']['personality']})", caller("a", "b")),
+        turns.Bot("b", f"{match['b']['model']} ({match['b']['personality']})", caller("b", "a"), after="a"),
+    ]
+    record = transcripts.get().conversation(APP, title=match["match"], conversation_id=run.id,
+                                            seq=len(run.turns) + 1 if run.turns else 0)
+    if not run.turns:
+        record.add("User", opening)
+
+    def on_reply(bot, reply, latency_ms, tokens):
+        side = sides[bot.name]
+        record.add(bot.speaker, reply, model=side["model"], personality=side["personality"],
+                   latency_ms=latency_ms, tokens=tokens)
+
+    started = time.perf_counter()
+    try:
+        turns.play(run, bots, match["rounds"], on_reply)
+    except turns.Stopped as e:
+        print(f"⚠️ {match['match']}: {e}")
+        return "stopped"
+    run.finish(wall_s=round(time.perf_counter() - started, 2))
+    return "finished"
+
+
+# ---------- Report ----------
+def summarize(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return {"n": 0}
+    return {"n": len(values), "mean": round(sum(values) / len(values), 1),
+            "p50": percentile(values, 50), "p95": percentile(values, 95)}
+
+
+def build_report(config, matches, runs):
+    rows = []
+    by_model, by_personality = {}, {}
+    for match in matches:
+        run = runs.get(match["match"])
+        turns_played = run.turns if run else []
+        row = {"match": match["match"], "prompt": match["prompt"],
+               "status": "finished" if run and run.finished else ("stopped" if turns_played else "not played"),
+               "replies": len(turns_played), "sides": {}}
+        for side in ("a", "b"):
+            replies = [t for t in turns_played if t["bot"] == side]
+            info = match[side]
+            row["sides"][side] = {
+                **info,
+                "latency_ms": summarize([t.get("latency_ms") for t in replies]),
+                "tokens": sum(t.get("tokens") or 0 for t in replies),
+                "words": summarize([len(t["content"].split()) for t in replies]),
+            }
+            by_model.setdefault(f"{info['provider']}:{info['model']}", []).extend(replies)
+            by_personality.setdefault(info["personality"], []).extend(replies)
+        rows.append(row)
+
+    def group(replies):
+        return {"replies": len(replies),
+                "latency_ms": summarize([t.get("latency_ms") for t in replies]),
+                "tokens": summarize([t.get("tokens") for t in replies]),
+                "words": summarize([len(t["content"].split()) for t in replies]),
+                "chars": summarize([len(t["content"]) for t in replies])}
+
+    statuses = [r["status"] for r in rows]
+    return {
+        "name": config["name"], "generated": datetime.now().isoformat(timespec="seconds"), "config": config,
+        "matches": {s: statuses.count(s) for s in ("finished", "stopped", "not played")},
+        "by_model": {k: group(v) for k, v in sorted(by_model.items())},
+        "by_personality": {k: group(v) for k, v in sorted(by_personality.items())},
+        "results": rows,
+    }
+
+
+def _ms(stats):
+    return f"{stats['p50']:.0f} / {stats['p95']:.0f}" if stats.get("n") else "-"
+
+
+def report_markdown(report):
+    counts = report["matches"]
+    lines = [f"# Tournament {report['name']}", "",
+             f"{counts['finished']} finished, {counts['stopped']} stopped, {counts['not played']} not played "
+             f"· generated {report['generated']}", ""]
+    for title, groups in (("Models", report["by_model"]), ("Personalities", report["by_personality"])):
+        lines += [f"## {title}", "", "| | replies | latency p50 / p95 ms | tokens (mean) | words (mean) |",
+                  "|---|---:|---:|---:|---:|"]
+        for name, g in groups.items():
+            lines.append(f"| {name} | {g['replies']} | {_ms(g['latency_ms'])} | {g['tokens'].get('mean', '-')} "
+                         f"| {g['words'].get('mean', '-')} |")
+        lines.append("")
+    lines += ["## Matches", "", "| match | status | replies | A latency p50 ms | B latency p50 ms | A / B tokens "
+              "| A / B words (mean) |", "|---|---|---:|---:|---:|---:|---:|"]
+    for r in report["results"]:
+        a, b = r["sides"]["a"], r["sides"]["b"]
+        lines.append(f"| {r['match']} | {r['status']} | {r['replies']} | {a['latency_ms'].get('p50', '-')} "
+                     f"| {b['latency_ms'].get('p50', '-')} | {a['tokens']} / {b['tokens']} "
+                     f"| {a['words'].get('mean', '-')} / {b['words'].get('mean', '-')} |")
+    return "\n".join(lines) + "\n"
+
+
+# ---------- Main ----------
+def main():
+    parser = argparse.ArgumentParser(description="Play every provider × personality pairing headlessly")
+    parser.add_argument("--providers", default="openai,deepseek", help="comma-separated, provider[:model]")
+    parser.add_argument("--personalities", default=",".join(PERSONALITIES), help="comma-separated")
+    parser.add_argument("--prompts", nargs="+", default=["Is it ever OK to put pineapple on pizza?"])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=4, help="matches in flight at once")
+    parser.add_argument("--name", help="tournament name (default: a timestamp)")
+    parser.add_argument("--resume", metavar="NAME", help="continue a tournament from its checkpoints")
+    args = parser.parse_args()
+
+    if args.resume:
+        directory = os.path.join(TOURNAMENT_DIR, args.resume)
+        with open(os.path.join(directory, "tournament.json"), encoding="utf-8") as f:
+            config = json.load(f)
+    else:
+        config = {"name": args.name or datetime.now().strftime("%Y%m%d_%H%M%S"),
+                  "providers": args.providers.split(","), "personalities": args.personalities.split(","),
+                  "prompts": args.prompts, "rounds": args.rounds}
+        unknown = [p for p in config["personalities"] if p not in PERSONALITIES]
+        if unknown:
+            parser.error(f"unknown personalities {unknown} (choose from {', '.join(PERSONALITIES)})")
+        try:
+            build_matches(config)
+        except argparse.ArgumentTypeError as e:
+            parser.error(str(e))
+        directory = os.path.join(TOURNAMENT_DIR, config["name"])
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "tournament.json"), "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2)
+
+    # every match's checkpoint lives with its tournament
+    os.environ["CHECKPOINT_DIR"] = os.path.join(directory, "checkpoints")
+    matches = build_matches(config)
+    runs = {run.params["match"]: run for run in checkpoint.runs(APP, include_finished=True)}
+    todo = [m for m in matches if not (m["match"] in runs and runs[m["match"]].finished)]
+    print(f"🏆 {config['name']}: {len(matches)} matches, {len(matches) - len(todo)} already finished, "
+          f"{args.concurrency} at a time")
+
+    clients = Clients()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="match") as pool:
+        futures = {}
+        for match in todo:
+            run = runs.get(match["match"]) or checkpoint.start(APP, **match)
+            runs[match["match"]] = run
+            futures[pool.submit(play_match, clients, match, run)] = match
+        for done, future in enumerate(as_completed(futures), 1):
+            match = futures[future]
+            try:
+                status = future.result()
+            except Exception as e:
+                status = f"failed: {e}"
+            print(f"  [{done}/{len(futures)}] {'✅' if status == 'finished' else '⚠️'} {match['match']} {status}")
+    print(f"⏱️ {time.perf_counter() - started:.1f}s")
+    print(limiter.report())
+
+    report = build_report(config, matches, runs)
+    with open(os.path.join(directory, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    with open(os.path.join(directory, "report.md"), "w", encoding="utf-8") as f:
+        f.write(report_markdown(report))
+    print(f"💾 Report saved to {os.path.join(directory, 'report.md')}")
+    if report["matches"]["stopped"] or report["matches"]["not played"]:
+        print(f"↩️ Some matches are unfinished: python {os.path.relpath(__file__)} --resume {config['name']}")
+
+
+if __name__ == "__main__":
+    main()
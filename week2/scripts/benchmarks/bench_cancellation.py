@@ -0,0 +1,151 @@
+"""
+How fast a cancelled stream lets go of its worker, against the local stand-in
+server (no API keys needed).
+
+    python benchmarks/bench_cancellation.py [--ttft 3] [--cancel-after 0.3]
+
+Every stream here is stuck before its first token (the moment a hedge fires or
+a user gives up). The token is cancelled from another thread, as tab close and
+a beaten hedge leg do, and the time until the worker returns is measured. With
+a real response `close` (common.cancellation.closer) that is milliseconds; a
+bare generator can only stop when the next chunk arrives. The script exits
+non-zero if a stream with a `close` holds its worker for more than --limit.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.bench_handlers import point_sdks_at
+from common import hedging, lazy
+from common.cancellation import CancelToken, closer, guarded
+from common.mock_server import MockLLMServer
+from common.ollama import OllamaClient
+from common.singleflight import SingleFlight
+
+openai = lazy.module("openai")
+anthropic = lazy.module("anthropic")
+
+MESSAGES = [{"role": "user", "content": "How much is a ticket to Paris?"}]
+
+
+def open_openai(base_url):
+    stream = openai.OpenAI(base_url=f"{base_url}/v1").chat.completions.create(
+        model="gpt-4o-mini", messages=MESSAGES, stream=True)
+    return (chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices), closer(stream)
+
+
+def open_claude(base_url):
+    stream = anthropic.Anthropic(base_url=base_url).messages.create(
+        model="claude-3-haiku-20240307", max_tokens=200, messages=MESSAGES, stream=True)
+    return (e.delta.text for e in stream if e.type == "content_block_delta"), closer(stream)
+
+
+def open_ollama(base_url):
+    return OllamaClient(base_url).open_chat("llama3", MESSAGES)
+
+
+def open_generator_only(base_url):
+    deltas, _ = open_openai(base_url)
+    return deltas, None
+
+
+def released_after(consume, cancel, cancel_after):
+    """Seconds from cancel() to `consume` returning, run on a worker thread."""
+    returned = {}
+
+    def worker():
+        try:
+            consume()
+        except Exception:
+            pass
+        returned["at"] = time.perf_counter()
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    time.sleep(cancel_after)
+    cancelled = time.perf_counter()
+    cancel()
+    thread.join(timeout=60)
+    return returned.get("at", float("inf")) - cancelled
+
+
+def direct(opener, base_url, cancel_after):
+    token = CancelToken()
+
+    def consume():
+        deltas, close = opener(base_url)
+        for _ in guarded(deltas, opener.__name__, close=close, token=token):
+            pass
+    return released_after(consume, token.cancel, cancel_after)
+
+
+def hedged_pair(base_url, cancel_after):
+    """Both legs started (the hedge fired), neither has a first token yet."""
+    token = CancelToken()
+
+    def consume():
+        for _ in hedging.hedged("openai", lambda: open_openai(base_url), "claude", lambda: open_claude(base_url),
+                                token=token, delay=0.05):
+            pass
+    return released_after(consume, token.cancel, cancel_after)
+
+
+def singleflight_pump(chunk_seconds):
+    """
+    The last subscriber leaves between chunks (subscribers only stop at a chunk);
+    the pump, blocked waiting for the next one, has to let go of the upstream too.
+    """
+    with MockLLMServer(load_seconds=0.0, ttft=0.05, tokens_per_second=1 / chunk_seconds) as server:
+        flights = SingleFlight("bench")
+        pumps = []
+
+        def start():
+            pumps.append(threading.current_thread())
+            return open_openai(server.base_url)
+
+        subscriber = flights.stream("key", start)
+        next(subscriber)
+        time.sleep(0.1)
+        left = time.perf_counter()
+        subscriber.close()
+        pumps[0].join(timeout=60)
+        return time.perf_counter() - left
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ttft", type=float, default=3.0, help="seconds before the mock's first token")
+    parser.add_argument("--cancel-after", type=float, default=0.3)
+    parser.add_argument("--limit", type=float, default=0.5, help="max seconds a closable stream may hold on")
+    args = parser.parse_args()
+
+    cases = [
+        ("openai + closer", lambda url: direct(open_openai, url, args.cancel_after), True),
+        ("anthropic + closer", lambda url: direct(open_claude, url, args.cancel_after), True),
+        ("ollama open_chat", lambda url: direct(open_ollama, url, args.cancel_after), True),
+        ("hedged, both legs", lambda url: hedged_pair(url, args.cancel_after), True),
+        ("singleflight pump", lambda url: singleflight_pump(args.ttft), True),
+        ("generator only", lambda url: direct(open_generator_only, url, args.cancel_after), False),
+    ]
+    failed = []
+    openai.OpenAI, anthropic.Anthropic   # import the SDKs before anything is timed
+    with MockLLMServer(load_seconds=0.0, ttft=args.ttft) as server:
+        point_sdks_at(server.base_url)
+        for name, run, closable in cases:
+            seconds = run(server.base_url)
+            ok = seconds <= args.limit or not closable
+            mark = ("✅" if ok else "❌") if closable else "➖"   # no close: expected to wait for a chunk
+            print(f"{mark} {name:<20} worker released {seconds:6.3f}s after cancel")
+            if not ok:
+                failed.append(name)
+    if failed:
+        print(f"❌ still holding their worker after cancel: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark the fare engine at ~100k routes.
+
+Builds a synthetic SQLite fare file (317 cities, every city pair = 100,172
+routes), loads it, and times exact, alias and fuzzy (misspelled) lookups.
+
+    python benchmarks/bench_fares.py [--cities 317] [--queries 20000]
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.fares import FareEngine, build_db
+
+
+def synthetic_cities(n, rng):
+    names = set()
+    while len(names) < n:
+        names.add("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 10))))
+    return sorted(names)
+
+
+def misspell(name, rng):
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]
+
+
+def timed(label, fn, queries):
+    start = time.perf_counter()
+    for q in queries:
+        fn(*q)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {1e6 * elapsed / len(queries):8.2f} µs/query  ({len(queries)} queries)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cities", type=int, default=317)
+    parser.add_argument("--queries", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    cities = synthetic_cities(args.cities, rng)
+    routes = [(o, d, rng.randint(99, 2500)) for o in cities for d in cities if o != d]
+    aliases = [(f"{c[:3]}{i}", c) for i, c in enumerate(cities)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "fares.sqlite")
+
+        start = time.perf_counter()
+        build_db(db_path, routes, aliases)
+        label = f"build {len(routes):,} routes"
+        print(f"{label:<28} {time.perf_counter() - start:8.3f} s  ({os.path.getsize(db_path) / 1e6:.1f} MB on disk)")
+
+        start = time.perf_counter()
+        engine = FareEngine(db_path)
+        print(f"{'load + index':<28} {time.perf_counter() - start:8.3f} s")
+
+        pairs = [tuple(rng.sample(cities, 2)) for _ in range(args.queries)]
+        timed("fare(origin, dest)", engine.fare, pairs)
+        timed("price() exact names", lambda o, d: engine.price(d, o), pairs)
+        alias_of = dict((c, a) for a, c in aliases)
+        timed("price() via alias", lambda o, d: engine.price(alias_of[d], alias_of[o]), pairs)
+        fuzzy = [(misspell(o, rng), misspell(d, rng)) for o, d in pairs[:args.queries // 10]]
+        timed("price() misspelled names", lambda o, d: engine.price(d, o), fuzzy)
+
+        resolved = [(engine.resolve_city(misspell(c, rng))[0], c) for c in cities]
+        hits = sum(city == c for city, c in resolved)
+        wrong = sum(city not in (None, c) for city, c in resolved)
+        print(f"{'fuzzy resolution accuracy':<28} {hits}/{len(cities)} single-typo names, {wrong} resolved to the wrong city")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+End-to-end benchmark of the apps' own handlers, against the local mock server.
+
+Every provider SDK is pointed at common.mock_server (OPENAI_BASE_URL,
+ANTHROPIC_BASE_URL, DEEPSEEK_BASE_URL, OLLAMA_HOST), so the numbers are the
+handlers' own overhead on top of a known, fixed model speed. Each handler is
+warmed up once, then driven `--requests` times from `--concurrency` threads.
+
+    python benchmarks/bench_handlers.py [--requests 20] [--concurrency 4] [--only chat,multi_model_chat]
+                                        [--ttft 0.05] [--tokens-per-second 200] [--error-rate 0]
+                                        [--baseline latest]
+
+    python benchmarks/bench_handlers.py --record cassettes/handlers.jsonl.gz    # once, with live keys
+    python benchmarks/bench_handlers.py --replay cassettes/handlers.jsonl.gz [--speed 0]
+
+Reported per handler: p50/p99 latency, p50/p99 time to first UI update (streaming
+handlers), throughput, and peak Python heap while `--concurrency` requests run
+(a separate pass under tracemalloc, so tracing doesn't skew the timings).
+Results are saved to benchmarks/results/; `--baseline` compares with an earlier
+file (or the latest one) and flags regressions. Gemini and Cohere have no mock
+endpoint, so only OpenAI, Anthropic, DeepSeek and Ollama paths are covered.
+
+With `--record`/`--replay` the mock is replaced by real provider traffic through
+common.cassette: recorded once, then replayed offline with the original chunk
+cadence (or `--speed` times faster). `--metrics` also saves the counters and
+histograms the apps serve on /metrics (common.telemetry) with the results.
+"""
+
+import argparse
+import contextlib
+import glob
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(SCRIPTS)
+from common import cassette, telemetry
+from common.hedging import percentile
+from common.mock_server import MockLLMServer
+
+RESULTS_DIR = os.path.join(SCRIPTS, "benchmarks", "results")
+REGRESSION_THRESHOLD = 0.10   # flag changes more than 10% worse than the baseline
+ERROR_MARKERS = ("❌", "⚠️", "Error:")
+TOOL_CALLS = [{"name": "get_ticket_price", "arguments": {"destination_city": "Paris"}}]
+LIVE_SITE = "https://example.com/"   # scraped when recording/replaying real traffic
+
+
+# ---------- Pointing the apps at the mock ----------
+def point_sdks_at(base_url):
+    """Route every provider the handlers call to the mock server (before the apps are imported)."""
+    os.environ.update({
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "ANTHROPIC_BASE_URL": base_url,
+        "DEEPSEEK_BASE_URL": base_url,
+        "OLLAMA_HOST": base_url,
+    })
+    use_placeholder_keys()
+
+
+def use_placeholder_keys():
+    for key in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "DEEPSEEK_API_KEY", "GOOGLE_API_KEY", "COHERE_API_KEY"):
+        os.environ.setdefault(key, "mock-key")
+
+
+_modules = {}
+
+
+def load_app(relative_path):
+    """Import an app script by path (some names aren't valid module names); its UI is built but not launched."""
+    if relative_path not in _modules:
+        name = "bench_" + os.path.splitext(os.path.basename(relative_path))[0].replace("-", "_")
+        spec = importlib.util.spec_from_file_location(name, os.path.join(SCRIPTS, relative_path))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[relative_path] = module
+    return _modules[relative_path]
+
+
+# ---------- Scenarios ----------
+# name -> (app script, streaming?, leading status yields to skip for TTFT, call(app, i, site)),
+# where `site` is the landing page the brochure scenarios scrape
+FLIGHTAI = "day5/flightai_tts_safe_multi_modal.py"
+BROCHURE = "day2/multi_model_brochure_generator.py"
+AIRLINE = "day4/airline_multi_model.py"
+CONVO = "ai_conversation/message_chat_deepseek_vs_gpt.py"
+
+
+def _question(i):
+    # distinct per request, so identical in-flight requests aren't coalesced
+    return f"What should I pack for a long weekend in Paris? (#{i})"
+
+
+SCENARIOS = {
+    "chat": (FLIGHTAI, True, 0,
+             lambda app, i, site: app.chat([{"role": "user", "content": _question(i)}], False, False)),
+    "process_chat": (FLIGHTAI, True, 0,
+                     lambda app, i, site: app.process_chat([{"role": "user", "content": _question(i)}],
+                                                          False, False, "French")),
+    "stream_brochure[GPT]": (BROCHURE, True, 1,
+                             lambda app, i, site: app.stream_brochure(f"Mock Co {i}", site, "GPT")),
+    "stream_brochure[Claude]": (BROCHURE, True, 1,
+                                lambda app, i, site: app.stream_brochure(f"Mock Co {i}", site, "Claude")),
+    "multi_model_chat[openai]": (AIRLINE, True, 0,
+                                 lambda app, i, site: app.multi_model_chat(_question(i), [], "openai", f"bench-{i}")),
+    "multi_model_chat[claude]": (AIRLINE, True, 0,
+                                 lambda app, i, site: app.multi_model_chat(_question(i), [], "claude", f"bench-{i}")),
+    "multi_model_chat[deepseek]": (AIRLINE, True, 0,
+                                   lambda app, i, site: app.multi_model_chat(_question(i), [], "deepseek", f"bench-{i}")),
+    "multi_model_chat[ollama]": (AIRLINE, True, 0,
+                                 lambda app, i, site: app.multi_model_chat(_question(i), [], "ollama", f"bench-{i}")),
+    "simulate_convo": (CONVO, False, 0,
+                       lambda app, i, site: app.simulate_convo(_question(i), "gpt-4o-mini", "deepseek-chat", 2,
+                                                              "Snarky", "Polite")),
+}
+
+
+# ---------- Measuring ----------
+def measure(scenario, i, site):
+    """One request: (latency, ttft or None, failed)."""
+    path, streaming, skip, call = scenario
+    app = load_app(path)
+    start = time.perf_counter()
+    ttft, last = None, None
+    try:
+        if streaming:
+            for n, last in enumerate(call(app, i, site)):
+                if ttft is None and n >= skip:
+                    ttft = time.perf_counter() - start
+        else:
+            last = call(app, i, site)
+    except Exception:
+        return time.perf_counter() - start, ttft, True
+    failed = any(marker in str(last) for marker in ERROR_MARKERS)
+    return time.perf_counter() - start, ttft, failed
+
+
+def run_scenario(scenario, requests, concurrency, site):
+    measure(scenario, -1, site)   # warm-up: imports, connection pools, caches
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        start = time.perf_counter()
+        samples = list(pool.map(lambda i: measure(scenario, i, site), range(requests)))
+        wall = time.perf_counter() - start
+
+    tracemalloc.start()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda i: measure(scenario, requests + i, site), range(concurrency)))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = [s[0] for s in samples]
+    ttfts = [s[1] for s in samples if s[1] is not None]
+
+    def ms(value):
+        return round(1000 * value, 2) if value is not None else None
+
+    return {
+        "runs": len(samples),
+        "errors": sum(s[2] for s in samples),
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "ttft_p50_ms": ms(percentile(ttfts, 50)),
+        "ttft_p99_ms": ms(percentile(ttfts, 99)),
+        "throughput_rps": round(len(samples) / wall, 2),
+        "peak_mb": round(peak / 1e6, 2),
+    }
+
+
+# ---------- Reporting ----------
+def format_table(handlers):
+    def cell(value, unit=""):
+        return f"{value}{unit}" if value is not None else "–"
+
+    lines = [f"{'handler':<28} {'runs':>4} {'err':>4} {'p50':>10} {'p99':>10} {'TTFT p50':>10} "
+             f"{'TTFT p99':>10} {'req/s':>7} {'peak MB':>8}"]
+    for name, r in handlers.items():
+        lines.append(f"{name:<28} {r['runs']:>4} {r['errors']:>4} {cell(r['p50_ms'], 'ms'):>10} "
+                     f"{cell(r['p99_ms'], 'ms'):>10} {cell(r['ttft_p50_ms'], 'ms'):>10} "
+                     f"{cell(r['ttft_p99_ms'], 'ms'):>10} {r['throughput_rps']:>7} {r['peak_mb']:>8}")
+    return "\n".join(lines)
+
+
+def compare(handlers, baseline, threshold=REGRESSION_THRESHOLD):
+    """Lines describing changes vs `baseline`; ⚠️ marks regressions beyond `threshold`."""
+    lines = []
+    for name, r in handlers.items():
+        old = baseline["handlers"].get(name)
+        if not old:
+            continue
+        for metric in ("p50_ms", "p99_ms", "ttft_p50_ms", "throughput_rps", "peak_mb"):
+            before, after = old.get(metric), r.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = -change if metric == "throughput_rps" else change
+            flag = "⚠️" if worse > threshold else "  "
+            lines.append(f"{flag} {name:<28} {metric:<15} {before:>10} -> {after:<10} ({change:+.0%})")
+    return "\n".join(lines) or "no overlapping handlers to compare"
+
+
+def latest_results():
+    files = sorted(glob.glob(os.path.join(RESULTS_DIR, "handlers_*.json")))
+    return files[-1] if files else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--only", help="comma-separated handler names (default: all)")
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--baseline", help="results file to compare with, or 'latest'")
+    parser.add_argument("--record", metavar="CASSETTE", help="drive the live providers and record their traffic")
+    parser.add_argument("--replay", metavar="CASSETTE", help="replay recorded traffic instead of the mock server")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up (0 = no waiting)")
+    parser.add_argument("--metrics", action="store_true",
+                        help="collect the apps' /metrics.json counters too (turns spans on, so adds their cost)")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown handlers {unknown}; choose from {list(SCENARIOS)}")
+    baseline_path = latest_results() if args.baseline == "latest" else args.baseline
+
+    if args.record or args.replay:
+        # real (or recorded real) provider traffic: no mock server, SDKs keep their normal URLs
+        mode, tape = ("record", args.record) if args.record else ("replay", args.replay)
+        config = {"cassette": tape, "mode": mode, "speed": args.speed}
+        os.environ.setdefault("GEMINI_TRANSPORT", "rest")
+        if mode == "replay":
+            use_placeholder_keys()
+        cassette.install(tape, mode, args.speed)
+        source = contextlib.nullcontext()
+    else:
+        config = {"ttft": args.ttft, "tokens_per_second": args.tokens_per_second, "latency": args.latency,
+                  "error_rate": args.error_rate}
+        source = MockLLMServer(load_seconds=0.0, tool_calls=TOOL_CALLS, seed=0, **config)
+    if args.metrics:
+        telemetry.enable()
+    handlers = {}
+    # the apps write transcripts/brochures relative to cwd (some to ../output), so run two levels deep
+    workdir = os.path.join(tempfile.mkdtemp(prefix="bench_handlers_"), "run")
+    os.makedirs(workdir)
+    with source as server:
+        if server:
+            point_sdks_at(server.base_url)
+        site = f"{server.base_url}/" if server else LIVE_SITE
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            for name in names:
+                print(f"⏱️ {name} ...", flush=True)
+                # the handlers log every chunk; keep that out of the report (the printing cost stays in)
+                try:
+                    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                        handlers[name] = run_scenario(SCENARIOS[name], args.requests, args.concurrency, site)
+                except ImportError as e:
+                    print(f"⚠️ skipping {name}: {e}")
+        finally:
+            os.chdir(cwd)
+    if cassette.active():
+        print(cassette.active().report())
+        cassette.uninstall()
+
+    print()
+    print(format_table(handlers))
+
+    results = {"timestamp": datetime.now().isoformat(timespec="seconds"), "requests": args.requests,
+               "concurrency": args.concurrency, "source": config, "handlers": handlers}
+    if args.metrics:
+        results["metrics"] = telemetry.snapshot()
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"handlers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results saved to {os.path.relpath(path, SCRIPTS)}")
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n📊 Compared with {os.path.relpath(baseline_path, SCRIPTS)}:")
+        print(compare(handlers, baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Cold-start vs warm latency for the Ollama integration, against the local
+stand-in server (no real model needed).
+
+    python benchmarks/bench_ollama.py [--load-seconds 2] [--requests 20]
+
+1. cold:   first message with no warm-up pays the model load
+2. warm:   warm_up() at startup, then the first message
+3. pooled: OllamaClient's shared session vs a new requests.post per message
+   (on loopback the connection cost is tiny; the gap grows with a remote host)
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.mock_server import MockLLMServer
+from common.ollama import OllamaClient
+
+MODEL = "llama3"
+MESSAGES = [{"role": "user", "content": "How much is a ticket to Paris?"}]
+
+
+def time_to_first_token(deltas):
+    start = time.perf_counter()
+    ttft = None
+    for _ in deltas:
+        if ttft is None:
+            ttft = time.perf_counter() - start
+    return ttft, time.perf_counter() - start
+
+
+def unpooled_chat(base_url):
+    """What chat_llama_demo.py used to do: a fresh requests.post per message."""
+    response = requests.post(f"{base_url}/api/chat", json={"model": MODEL, "messages": MESSAGES, "stream": True},
+                             stream=True)
+    for line in response.iter_lines():
+        if line and json.loads(line).get("done"):
+            break
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--load-seconds", type=float, default=2.0)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    with MockLLMServer(load_seconds=args.load_seconds) as server:
+        ttft, total = time_to_first_token(OllamaClient(server.base_url).stream_chat(MODEL, MESSAGES))
+        print(f"{'cold first message':<24} TTFT {ttft:6.3f}s  total {total:6.3f}s")
+
+    with MockLLMServer(load_seconds=args.load_seconds) as server:
+        client = OllamaClient(server.base_url, keep_alive={MODEL: "30m"})
+        start = time.perf_counter()
+        client.warm_up([MODEL], background=False)
+        warm_up = time.perf_counter() - start
+        ttft, total = time_to_first_token(client.stream_chat(MODEL, MESSAGES))
+        print(f"{'warm first message':<24} TTFT {ttft:6.3f}s  total {total:6.3f}s  (warm-up at startup {warm_up:.3f}s)")
+
+    with MockLLMServer(load_seconds=0, ttft=0, tokens_per_second=1e6) as server:
+        client = OllamaClient(server.base_url)
+        for label, run in [("pooled session", lambda: client.chat(MODEL, MESSAGES)),
+                           ("new connection each", lambda: unpooled_chat(server.base_url))]:
+            times = []
+            for _ in range(args.requests):
+                start = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start)
+            print(f"{label:<24} mean {1000 * statistics.mean(times):7.2f} ms  "
+                  f"p50 {1000 * statistics.median(times):7.2f} ms  ({args.requests} requests)")
+
+
+if __name__ == "__main__":
+    main()
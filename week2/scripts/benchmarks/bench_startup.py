@@ -0,0 +1,187 @@
+"""
+Cold-start benchmark: how long each Gradio app takes to build its UI, and which
+provider SDKs it loads to get there.
+
+Every run is a fresh interpreter with Gradio's `launch()` stubbed out, so the time
+is imports plus UI construction, i.e. what a user waits for before the page can
+load. One extra run under `python -X importtime` is aggregated per top-level
+package to show where the import time goes.
+
+    python benchmarks/bench_startup.py [--apps day4/airline_multi_model.py,day5/day5.py]
+                                       [--runs 3] [--allowance 0.5] [--top 10]
+
+Each app's budget is a bare `import gradio` (timed the same way) plus
+`--allowance` seconds for the one provider the user picks first. Apps over
+budget are flagged and the exit status is 1, so the check can gate CI. Results
+are saved to benchmarks/results/startup_<timestamp>.json.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(SCRIPTS, "benchmarks", "results")
+GRADIO_BASELINE = "import gradio"
+
+# (the day2 message_* apps call every provider before launching, so they can't start offline)
+APPS = [
+    "day2/multi_model_brochure_generator.py",
+    "day2/streaming_multi_model_chat.py",
+    "day2/streaming_multi_model_news_chat.py",
+    "day4/airline_multi_model.py",
+    "day5/day5.py",
+    "day5/airline_multi-modal.py",
+    "day5/flightai_tts_safe_multi_modal.py",
+]
+# loaded at startup = paid for before the UI appears (reported beyond what gradio loads itself)
+WATCHED = ["openai", "anthropic", "cohere", "google.generativeai", "pydub", "PIL", "bs4"]
+PLACEHOLDER_KEYS = ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "DEEPSEEK_API_KEY", "GOOGLE_API_KEY", "COHERE_API_KEY")
+MARKER = "@@startup@@"
+
+# Runs in the child interpreter: argv = [path or "-", watched modules as JSON]
+BOOT = f"""
+import json, os, runpy, sys
+path, watched = sys.argv[1], json.loads(sys.argv[2])
+import gradio
+if path != "-":
+    gradio.Blocks.launch = lambda self, *args, **kwargs: None   # build the UI, don't serve it
+    sys.argv = [path]
+    sys.path.insert(0, os.path.dirname(path))
+    runpy.run_path(path, run_name="__main__")
+print("{MARKER}" + json.dumps([m for m in watched if m in sys.modules]), flush=True)
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    for key in PLACEHOLDER_KEYS:
+        env.setdefault(key, "placeholder-key")
+    env.update({
+        "METRICS_PORT": "off",
+        "GRADIO_ANALYTICS_ENABLED": "False",
+        "OLLAMA_HOST": "http://127.0.0.1:9",   # warm-ups fail fast instead of loading a model
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    return env
+
+
+def run_once(path, workdir, importtime=False):
+    """Wall-clock seconds for one cold start, the watched modules it loaded, and stderr."""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else [])
+    command += ["-c", BOOT, path, json.dumps(WATCHED)]
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=workdir, env=child_env(), capture_output=True, text=True, timeout=300)
+    seconds = time.perf_counter() - started
+    marker = [line for line in result.stdout.splitlines() if line.startswith(MARKER)]
+    if result.returncode != 0 or not marker:
+        tail = (result.stderr.strip().splitlines() or ["no output"])[-1]
+        raise RuntimeError(f"{path} failed to start: {tail}")
+    return seconds, json.loads(marker[-1][len(MARKER):]), result.stderr
+
+
+def import_profile(stderr):
+    """`-X importtime` output -> {top-level package: self seconds}."""
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, _, name = (part.strip() for part in line[len("import time:"):].split("|"))
+            totals[name.split(".")[0]] += int(self_us) / 1e6
+        except ValueError:
+            continue
+    return dict(sorted(totals.items(), key=lambda kv: -kv[1]))
+
+
+def measure(path, runs, workdir, top):
+    times = []
+    loaded = []
+    for _ in range(runs):
+        seconds, loaded, _ = run_once(path, workdir)
+        times.append(seconds)
+    _, _, stderr = run_once(path, workdir, importtime=True)
+    profile = import_profile(stderr)
+    return {
+        "best_s": round(min(times), 3),
+        "median_s": round(sorted(times)[len(times) // 2], 3),
+        "loaded": loaded,
+        "import_s": round(sum(profile.values()), 3),
+        "top_imports": {name: round(s, 3) for name, s in list(profile.items())[:top]},
+    }
+
+
+def format_table(results, budget, baseline):
+    lines = [f"{'app':<42} {'best':>7} {'median':>7} {'budget':>7}  SDKs loaded beyond gradio"]
+    for app, r in results.items():
+        flag = "⚠️" if r["best_s"] > budget else "✅"
+        extra = [m for m in r["loaded"] if m not in baseline["loaded"]]
+        lines.append(f"{app:<42} {r['best_s']:>6.2f}s {r['median_s']:>6.2f}s {budget:>6.2f}s  "
+                     f"{flag} {', '.join(extra) or '-'}")
+    return "\n".join(lines)
+
+
+def format_profile(app, r):
+    rows = "\n".join(f"    {name:<28} {s * 1000:8.0f}ms" for name, s in r["top_imports"].items())
+    return f"🔎 {app}: {r['import_s']:.2f}s of imports\n{rows}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--apps", help="comma-separated script paths relative to scripts/ (default: all Gradio apps)")
+    parser.add_argument("--runs", type=int, default=3, help="cold starts per app (the best one is compared)")
+    parser.add_argument("--allowance", type=float, default=0.5,
+                        help="seconds on top of a bare gradio import (one provider SDK)")
+    parser.add_argument("--top", type=int, default=10, help="packages listed per import profile")
+    args = parser.parse_args()
+
+    apps = args.apps.split(",") if args.apps else APPS
+    missing = [a for a in apps if not os.path.exists(os.path.join(SCRIPTS, a))]
+    if missing:
+        parser.error(f"no such scripts: {missing}")
+
+    # the apps write output relative to cwd (some to ../output), so run two levels deep
+    workdir = os.path.join(tempfile.mkdtemp(prefix="bench_startup_"), "run")
+    os.makedirs(workdir)
+
+    print("⏱️ gradio baseline ...", flush=True)
+    baseline = measure("-", args.runs, workdir, args.top)
+    budget = baseline["best_s"] + args.allowance
+    print(f"   bare `import gradio`: {baseline['best_s']:.2f}s -> budget {budget:.2f}s per app\n")
+
+    results = {}
+    for app in apps:
+        print(f"⏱️ {app} ...", flush=True)
+        try:
+            results[app] = measure(os.path.join(SCRIPTS, app), args.runs, workdir, args.top)
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            print(f"⚠️ skipping {app}: {e}")
+
+    print()
+    print(format_table(results, budget, baseline))
+    for app, r in results.items():
+        print()
+        print(format_profile(app, r))
+
+    report = {"timestamp": datetime.now().isoformat(timespec="seconds"), "runs": args.runs,
+              "baseline": {GRADIO_BASELINE: baseline}, "budget_s": round(budget, 3), "apps": results}
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"startup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved to {os.path.relpath(path, SCRIPTS)}")
+
+    over = [app for app, r in results.items() if r["best_s"] > budget]
+    if over:
+        print(f"\n⚠️ Over the startup budget: {', '.join(over)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Shared helpers for the week 2 scripts (FlightAI, multi-model chat, AI showdowns).
+
+Scripts live in sibling folders (day4/, day5/, ai_conversation/...), so they add
+the parent `scripts/` folder to `sys.path` before importing from here.
+"""
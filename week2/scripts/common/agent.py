@@ -0,0 +1,114 @@
+"""
+Streaming tool-calling loop for OpenAI-compatible chat completions.
+
+`stream_chat_with_tools()` streams assistant text token by token, assembles
+tool-call deltas as they arrive, runs *every* tool the model asked for, feeds the
+results back and repeats until the model answers in plain text (or the round
+limit is hit, in which case the last round is made without tools so the model
+has to answer).
+
+It is a generator of small event tuples so each Gradio app can decide what to
+render:
+
+    ("round", n)                 a completion request is about to be sent
+    ("text", delta)              a piece of assistant text
+    ("tool_call_delta", call)    a tool call is being streamed (partial arguments)
+    ("tool_result", call, msg)   a tool finished; `msg` is the role="tool" message
+    ("done", reply)              final assistant text
+"""
+
+import json
+import time
+from types import SimpleNamespace
+
+from common import tracing
+from common.cancellation import estimate_tokens
+
+MAX_TOOL_ROUNDS = 5
+
+
+def _as_tool_call(slot):
+    """Give an assembled call the same shape as the SDK object (`.id`, `.function.name`...)."""
+    return SimpleNamespace(
+        id=slot["id"],
+        type="function",
+        function=SimpleNamespace(name=slot["name"], arguments=slot["arguments"] or "{}"),
+    )
+
+
+def _assistant_message(content, slots):
+    return {
+        "role": "assistant",
+        "content": content,
+        "tool_calls": [
+            {
+                "id": slot["id"],
+                "type": "function",
+                "function": {"name": slot["name"], "arguments": slot["arguments"] or "{}"},
+            }
+            for slot in slots
+        ],
+    }
+
+
+def _error_result(call, error):
+    return {"role": "tool", "tool_call_id": call.id, "content": json.dumps({"error": str(error)})}
+
+
+def stream_chat_with_tools(client, model, messages, tools, run_tools, max_rounds=MAX_TOOL_ROUNDS, **kwargs):
+    """
+    Run the streaming agent loop. `messages` is extended in place with the
+    assistant/tool messages of each round.
+
+    `run_tools(tool_calls)` receives every call of one model turn (objects shaped
+    like the SDK's tool calls) and returns their role="tool" messages in the same
+    order, e.g. `ToolRegistry.run_all`.
+    """
+    for round_number in range(max_rounds + 1):
+        yield ("round", round_number)
+        request = dict(model=model, messages=messages, stream=True, **kwargs)
+        if tools and round_number < max_rounds:
+            request["tools"] = tools
+
+        content = ""
+        slots = {}
+        with tracing.span("llm.round", model=model, round=round_number) as span:
+            started = time.perf_counter()
+            stream = client.chat.completions.create(**request)
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                if started is not None:
+                    span.set(ttft_ms=round(1000 * (time.perf_counter() - started), 1))
+                    started = None
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content += delta.content
+                    yield ("text", delta.content)
+                for tc in delta.tool_calls or []:
+                    slot = slots.setdefault(tc.index, {"id": "", "name": "", "arguments": ""})
+                    if tc.id:
+                        slot["id"] = tc.id
+                    if tc.function is not None:
+                        slot["name"] += tc.function.name or ""
+                        slot["arguments"] += tc.function.arguments or ""
+                    yield ("tool_call_delta", slot)
+            span.set(output_tokens=estimate_tokens(content), tool_calls=len(slots))
+
+        if not slots:
+            yield ("done", content)
+            return
+
+        ordered = [slots[i] for i in sorted(slots)]
+        messages.append(_assistant_message(content, ordered))
+        calls = [_as_tool_call(slot) for slot in ordered]
+        try:
+            results = run_tools(calls)
+        except Exception as e:
+            results = [_error_result(call, e) for call in calls]
+        for call, result in zip(calls, results):
+            messages.append(result)
+            yield ("tool_result", call, result)
+
+    # the tool-less final round still produced tool calls; nothing more we can do
+    yield ("done", content)
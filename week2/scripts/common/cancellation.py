@@ -0,0 +1,210 @@
+"""
+Cooperative cancellation of upstream LLM streams.
+
+When a user hits stop or closes the tab, Gradio stops pulling from the event's
+generator, but the provider's HTTP stream keeps generating (and billing) tokens
+until it finishes. Two hooks end it early:
+
+    - `guarded()` wraps a provider stream; its `finally` closes the HTTP response
+      when the generator is closed (Gradio's stop button) or abandoned.
+    - `SessionStreams` hands each event a `CancelToken`; `demo.unload(...)` cancels
+      every token of a session whose tab was closed, which closes the responses
+      from Gradio's thread and lets the blocked worker return straight away.
+
+    with streams.track(session_id(request)) as token:
+        stream = client.chat.completions.create(..., stream=True)
+        for delta in guarded(openai_deltas(stream), "openai", close=closer(stream), token=token):
+            ...
+
+Cancelling from another thread needs the response itself: a generator can't be
+closed while the worker is inside it, and closing a socket doesn't wake a thread
+blocked reading it. `closer()` shuts the connection down first, so the blocked
+read returns at once.
+
+`metrics` counts cancelled streams and estimates the tokens they did not generate.
+"""
+
+import socket
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token), good enough for savings estimates."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            _quietly(callback)
+
+    def on_cancel(self, callback):
+        """Run `callback` on cancellation (now, if already cancelled); returns an unregister function."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        _quietly(callback)
+        return lambda: None
+
+    def _remove(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+class StreamMetrics:
+    """Per-provider counts of finished vs cancelled streams and the tokens cancellation saved."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.completed = defaultdict(int)
+        self.cancelled = defaultdict(int)
+        self.completion_tokens = defaultdict(int)   # tokens of streams that ran to the end
+        self.tokens_saved = defaultdict(int)
+
+    def expected_tokens(self, provider, max_tokens=None):
+        """What a stream from `provider` usually produces: the running average, else max_tokens."""
+        if self.completed[provider]:
+            return self.completion_tokens[provider] / self.completed[provider]
+        return max_tokens or 0
+
+    def record_complete(self, provider, tokens):
+        with self._lock:
+            self.completed[provider] += 1
+            self.completion_tokens[provider] += tokens
+
+    def record_cancel(self, provider, tokens, max_tokens=None):
+        with self._lock:
+            saved = max(0, int(self.expected_tokens(provider, max_tokens)) - tokens)
+            self.cancelled[provider] += 1
+            self.tokens_saved[provider] += saved
+        return saved
+
+    def report(self):
+        lines = ["provider   completed  cancelled  ~tokens saved"]
+        for provider in sorted(set(self.completed) | set(self.cancelled)):
+            lines.append(f"{provider:<10} {self.completed[provider]:>9}  {self.cancelled[provider]:>9}  "
+                         f"{self.tokens_saved[provider]:>13}")
+        lines.append(f"total tokens saved by cancellation: ~{sum(self.tokens_saved.values())}")
+        return "\n".join(lines)
+
+
+metrics = StreamMetrics()
+
+
+def closer(stream):
+    """
+    A `close` for guarded() that works from any thread. `stream` is an SDK stream
+    (OpenAI/Anthropic keep the httpx response as `.response`) or an httpx/requests
+    response; its socket is shut down so a reader blocked waiting for the next
+    chunk gets EOF now, then the response is closed.
+    """
+    def close():
+        sock = _socket_of(getattr(stream, "response", stream))
+        if sock is not None:
+            _quietly(lambda: sock.shutdown(socket.SHUT_RDWR))
+        stream.close()
+    return close
+
+
+def _socket_of(response):
+    network = (getattr(response, "extensions", None) or {}).get("network_stream")   # httpx
+    if network is not None:
+        return network.get_extra_info("socket")
+    raw = getattr(response, "raw", None)                                            # requests (urllib3)
+    return getattr(getattr(raw, "connection", None), "sock", None)
+
+
+def guarded(deltas, provider, close=None, token=None, max_tokens=None):
+    """
+    Yield text deltas from a provider stream until it ends, the consumer stops, or
+    `token` is cancelled. `close` (e.g. `closer(stream)`) releases the HTTP
+    response; it runs on cancellation from any thread and whenever the stream
+    didn't finish. Without it, a cancelled stream stops at its next chunk.
+    """
+    unregister = token.on_cancel(close) if token and close else (lambda: None)
+    received, state = 0, "cancelled"
+    try:
+        for delta in deltas:
+            if token and token.cancelled:
+                break
+            received += estimate_tokens(delta)
+            yield delta
+        else:
+            state = "done"
+    except Exception:
+        if token and token.cancelled:
+            return   # the response was closed under us: that's the cancellation, not an error
+        state = "error"
+        raise
+    finally:
+        unregister()
+        if state == "done":
+            metrics.record_complete(provider, received)
+        else:
+            if close:
+                _quietly(close)
+            if hasattr(deltas, "close"):
+                _quietly(deltas.close)   # the consumer's thread: runs the generator's own cleanup
+            if state == "cancelled":
+                saved = metrics.record_cancel(provider, received, max_tokens)
+                print(f"🛑 {provider} stream cancelled after ~{received} tokens (~{saved} saved)")
+
+
+class SessionStreams:
+    """Cancel tokens of the events currently streaming, grouped by Gradio session."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = defaultdict(set)
+
+    @contextmanager
+    def track(self, session):
+        token = CancelToken()
+        with self._lock:
+            self._tokens[session].add(token)
+        try:
+            yield token
+        finally:
+            with self._lock:
+                self._tokens[session].discard(token)
+                if not self._tokens[session]:
+                    del self._tokens[session]
+
+    def cancel(self, session):
+        """Cancel every stream of `session` (tab closed); returns how many were running."""
+        with self._lock:
+            tokens = list(self._tokens.get(session, ()))
+        for token in tokens:
+            token.cancel()
+        return len(tokens)
+
+    def cancel_all(self):
+        with self._lock:
+            tokens = [t for group in self._tokens.values() for t in group]
+        for token in tokens:
+            token.cancel()
+
+
+def _quietly(fn):
+    try:
+        fn()
+    except Exception:
+        pass   # closing a half-read response from another thread may raise once it is already shut
@@ -0,0 +1,376 @@
+"""
+Record/replay of provider HTTP traffic ("cassettes"), for offline, deterministic runs.
+
+Every provider the scripts call goes through one of two HTTP stacks: httpx (the
+OpenAI, DeepSeek, Anthropic and Cohere SDKs) or requests (Ollama, the website
+scrapers, and Gemini on its REST transport). `install()` wraps both at the
+transport level, so no app code changes:
+
+  - record: requests go out as usual; each request/response pair is appended to
+    the cassette with the time to headers and the gap before every body chunk.
+  - replay: nothing touches the network; responses come from the cassette with
+    the original chunk cadence, or `speed` times faster (0 = no waiting).
+
+Requests are matched on method, URL and body (JSON canonicalised, multipart
+boundaries normalised); identical requests replay their recordings in order.
+Cassettes are JSON lines, gzipped when the name ends in .gz.
+
+    cassette.install("cassettes/brochure.jsonl.gz", mode="replay", speed=10)
+
+or around any script, from scripts/:
+
+    python -m common.cassette record cassettes/brochure.jsonl.gz day2/multi_model_brochure_generator.py
+    python -m common.cassette replay cassettes/brochure.jsonl.gz --speed 0 day2/multi_model_brochure_generator.py
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import runpy
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+IGNORED_HOSTS = {"api.gradio.app"}           # UI telemetry, not provider traffic
+LOCAL_HOSTS = {"127.0.0.1", "localhost", "0.0.0.0"}
+OLLAMA_PORT = 11434                          # the only local service worth recording
+DROPPED_HEADERS = {"set-cookie", "transfer-encoding"}
+
+
+class CassetteMiss(LookupError):
+    """Replay found no recording for a request."""
+
+
+def passthrough(url):
+    """Gradio's own traffic (telemetry, its local server) is never recorded or replayed."""
+    parts = urlsplit(url)
+    if parts.hostname in IGNORED_HOSTS:
+        return True
+    return parts.hostname in LOCAL_HOSTS and parts.port != OLLAMA_PORT
+
+
+def request_key(method, url, body=b"", content_type=""):
+    if isinstance(body, str):
+        body = body.encode()
+    body = body or b""
+    if "boundary=" in content_type:
+        boundary = content_type.split("boundary=", 1)[1].split(";")[0].strip('"')
+        body = body.replace(boundary.encode(), b"BOUNDARY")
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True).encode()
+    except (ValueError, UnicodeDecodeError):
+        pass
+    digest = hashlib.sha256(f"{method.upper()} {url}\n".encode() + body)
+    return digest.hexdigest()[:24]
+
+
+def _encode(data):
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(data).decode()}
+
+
+def _decode(data):
+    return base64.b64decode(data["b64"]) if isinstance(data, dict) else data.encode("utf-8")
+
+
+class Cassette:
+    def __init__(self, path, mode="replay", speed=1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode '{mode}'")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._interactions = defaultdict(list)   # key -> recordings, in recording order
+        self._cursor = defaultdict(int)
+        self._lock = threading.Lock()
+        self._file = None
+        self._open = gzip.open if path.endswith(".gz") else open
+        if os.path.exists(path):
+            with self._open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        interaction = json.loads(line)
+                        self._interactions[interaction["key"]].append(interaction)
+        elif mode == "replay":
+            raise FileNotFoundError(f"No cassette at {path}; record one first")
+
+    def __len__(self):
+        return sum(len(v) for v in self._interactions.values())
+
+    # ---------- Replay ----------
+    def next(self, key, url=""):
+        """The next recording for `key` (complete ones first), cycling when they run out."""
+        with self._lock:
+            recordings = self._interactions.get(key)
+            if not recordings:
+                self.misses += 1
+                raise CassetteMiss(f"No recording in {self.path} for {url or key}")
+            complete = [r for r in recordings if not r.get("partial")] or recordings
+            interaction = complete[self._cursor[key] % len(complete)]
+            self._cursor[key] += 1
+            self.hits += 1
+            return interaction
+
+    def wait(self, seconds):
+        if self.speed > 0 and seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    def replay_chunks(self, interaction):
+        for gap, data in interaction["chunks"]:
+            self.wait(gap)
+            yield _decode(data)
+
+    # ---------- Record ----------
+    def add(self, key, method, url, status, headers, latency, chunks, partial=False):
+        interaction = {
+            "key": key, "method": method, "url": url, "status": status,
+            "headers": [[k, v] for k, v in headers if k.lower() not in DROPPED_HEADERS],
+            "latency": round(latency, 4),
+            "chunks": [[round(gap, 4), _encode(data)] for gap, data in chunks],
+        }
+        if partial:
+            interaction["partial"] = True
+        line = json.dumps(interaction, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = self._open(self.path, "at", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+            self._interactions[key].append(interaction)
+            self.recorded += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def report(self):
+        if self.mode == "record":
+            return f"📼 {self.path}: recorded {self.recorded} interactions ({len(self)} total)"
+        return f"📼 {self.path}: replayed {self.hits}, missing {self.misses} (speed {self.speed or 'max'})"
+
+
+class _ChunkLog:
+    """Gaps between body chunks as the client reads them; saved once, on exhaustion or close."""
+
+    def __init__(self, save):
+        self.save = save
+        self.chunks = []
+        self.last = time.perf_counter()
+        self.saved = False
+
+    def add(self, data):
+        now = time.perf_counter()
+        if data:
+            self.chunks.append((now - self.last, data))
+        self.last = now
+
+    def finish(self, partial):
+        if not self.saved:
+            self.saved = True
+            self.save(self.chunks, partial)
+
+
+# ---------- httpx (OpenAI, DeepSeek, Anthropic, Cohere SDKs) ----------
+class _HttpxRecording(httpx.SyncByteStream):
+    def __init__(self, stream, log):
+        self._stream = stream
+        self._log = log
+
+    def __iter__(self):
+        for data in self._stream:
+            self._log.add(data)
+            yield data
+        self._log.finish(partial=False)
+
+    def close(self):
+        self._stream.close()
+        self._log.finish(partial=True)   # no-op when the body was read to the end
+
+
+class _HttpxReplay(httpx.SyncByteStream):
+    def __init__(self, cassette, interaction):
+        self._chunks = cassette.replay_chunks(interaction)
+
+    def __iter__(self):
+        yield from self._chunks
+
+
+def _httpx_handler(cassette, original):
+    def handle_request(transport, request):
+        url = str(request.url)
+        if passthrough(url):
+            return original(transport, request)
+        key = request_key(request.method, url, request.read(), request.headers.get("content-type", ""))
+
+        if cassette.mode == "replay":
+            interaction = cassette.next(key, url)
+            cassette.wait(interaction["latency"])
+            return httpx.Response(interaction["status"], headers=interaction["headers"],
+                                  stream=_HttpxReplay(cassette, interaction), request=request)
+
+        started = time.perf_counter()
+        response = original(transport, request)
+        latency = time.perf_counter() - started
+        # the raw (possibly compressed) bytes are kept with their content-encoding header
+        log = _ChunkLog(lambda chunks, partial: cassette.add(
+            key, request.method, url, response.status_code, response.headers.multi_items(), latency, chunks, partial))
+        response.stream = _HttpxRecording(response.stream, log)
+        return response
+
+    return handle_request
+
+
+# ---------- requests (Ollama, scrapers, Gemini over REST) ----------
+class _RawRecording:
+    """Wraps urllib3's response; requests reads the body through `stream()`."""
+
+    def __init__(self, raw, log):
+        self._raw = raw
+        self._log = log
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        for data in self._raw.stream(amt, decode_content=True):
+            self._log.add(data)
+            yield data
+        self._log.finish(partial=False)
+
+    def read(self, amt=None, decode_content=None, **kwargs):
+        data = self._raw.read(amt, decode_content=True, **kwargs)
+        self._log.add(data)
+        if not data or amt is None:
+            self._log.finish(partial=False)
+        return data
+
+    def close(self):
+        self._raw.close()
+        self._log.finish(partial=True)
+
+    def release_conn(self):
+        self._raw.release_conn()
+        self._log.finish(partial=True)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class _RawReplay:
+    def __init__(self, cassette, interaction):
+        self._chunks = cassette.replay_chunks(interaction)
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        yield from self._chunks
+
+    def read(self, amt=None, decode_content=None, **kwargs):
+        return b"".join(self._chunks)
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+def _requests_handler(cassette, original):
+    def send(adapter, request, **kwargs):
+        url = request.url
+        if passthrough(url):
+            return original(adapter, request, **kwargs)
+        body = request.body if isinstance(request.body, (bytes, str)) else b""
+        key = request_key(request.method, url, body, request.headers.get("Content-Type", ""))
+
+        if cassette.mode == "replay":
+            interaction = cassette.next(key, url)
+            cassette.wait(interaction["latency"])
+            response = requests.Response()
+            response.status_code = interaction["status"]
+            response.headers = CaseInsensitiveDict(interaction["headers"])
+            response.encoding = get_encoding_from_headers(response.headers)
+            response.url, response.request, response.connection = url, request, adapter
+            response.reason = ""
+            response.raw = _RawReplay(cassette, interaction)
+            return response
+
+        started = time.perf_counter()
+        response = original(adapter, request, **kwargs)
+        latency = time.perf_counter() - started
+        # the body is stored decoded, so its encoding/length headers no longer apply
+        headers = [(k, v) for k, v in response.headers.items()
+                   if k.lower() not in ("content-encoding", "content-length")]
+        log = _ChunkLog(lambda chunks, partial: cassette.add(
+            key, request.method, url, response.status_code, headers, latency, chunks, partial))
+        response.raw = _RawRecording(response.raw, log)
+        return response
+
+    return send
+
+
+# ---------- Installing ----------
+_installed = {}
+
+
+def install(path, mode="replay", speed=1.0):
+    """Route all httpx/requests traffic through a cassette; returns the Cassette."""
+    uninstall()
+    cassette = Cassette(path, mode, speed)
+    _installed["cassette"] = cassette
+    _installed["httpx"] = httpx.HTTPTransport.handle_request
+    _installed["requests"] = HTTPAdapter.send
+    httpx.HTTPTransport.handle_request = _httpx_handler(cassette, _installed["httpx"])
+    HTTPAdapter.send = _requests_handler(cassette, _installed["requests"])
+    return cassette
+
+
+def uninstall():
+    if _installed:
+        httpx.HTTPTransport.handle_request = _installed.pop("httpx")
+        HTTPAdapter.send = _installed.pop("requests")
+        _installed.pop("cassette").close()
+
+
+def active():
+    return _installed.get("cassette")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a script with provider traffic recorded or replayed")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("cassette")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up (0 = no waiting)")
+    parser.add_argument("script")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_TRANSPORT", "rest")   # Gemini's default gRPC would bypass the cassette
+    cassette = install(args.cassette, args.mode, args.speed)
+    sys.argv = [args.script] + args.args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    try:
+        runpy.run_path(args.script, run_name="__main__")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(cassette.report())
+        uninstall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Turn-level checkpoints for long bot-vs-bot runs.
+
+The showdown scripts used to write their transcript once, after the last turn.
+An error or timeout at turn 9 of 10 lost nine turns of paid API calls. A `Run`
+appends every reply to its own JSONL file, fsynced before the next call starts.
+A stopped run can then be resumed: both bots' message lists are rebuilt from
+the file, and only the missing replies are requested.
+
+    run = checkpoint.start("deepseek_vs_gpt", user_input=text, num_turns=5)
+    for i in range(len(run.turns), 2 * run.params["num_turns"]):
+        ...
+        run.record("gpt", f"{model} ({personality})", reply)
+    run.finish()
+
+    run = checkpoint.load(run_id)         # later, or after a crash
+    gpt_msgs = [run.params["user_input"]] + run.replies("gpt")
+
+Files live in CHECKPOINT_DIR (default output/checkpoints), one per run:
+
+    python -m common.checkpoint list [--all]
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+DEFAULT_DIR = os.path.join("output", "checkpoints")
+
+
+def checkpoint_dir():
+    return os.getenv("CHECKPOINT_DIR", DEFAULT_DIR)
+
+
+class Run:
+    def __init__(self, path, run_id, app, params, turns=(), finished=False):
+        self.path = path
+        self.id = run_id
+        self.app = app
+        self.params = params
+        self.turns = list(turns)    # {"bot", "speaker", "content", ...} in the order they were made
+        self.finished = finished
+        self._lock = threading.Lock()
+
+    def replies(self, bot):
+        return [turn["content"] for turn in self.turns if turn["bot"] == bot]
+
+    def record(self, bot, speaker, content, **meta):
+        """Append one completed reply; it is on disk when this returns."""
+        turn = {"bot": bot, "speaker": speaker, "content": content, **meta}
+        self._append({"type": "turn", "at": time.time(), **turn})
+        self.turns.append(turn)
+
+    def finish(self, **info):
+        self._append({"type": "finished", "at": time.time(), **info})
+        self.finished = True
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def describe(self):
+        started = datetime.fromtimestamp(self.params.get("started", 0)).strftime("%Y-%m-%d %H:%M")
+        title = str(self.params.get("user_input", ""))[:40]
+        return f"{started} · {self.app} · {len(self.turns)} replies · {title}"
+
+
+def start(app, **params):
+    """A new run for `app`; `params` must be enough to continue it (models, personalities, turns...)."""
+    directory = checkpoint_dir()
+    os.makedirs(directory, exist_ok=True)
+    run_id = f"{app}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    params = {**params, "started": time.time()}
+    run = Run(os.path.join(directory, f"{run_id}.jsonl"), run_id, app, params)
+    run._append({"type": "start", "id": run_id, "app": app, "params": params})
+    return run
+
+
+def load(run_id):
+    """Reload a run from its file. A line cut short by a crash is dropped, so appends continue cleanly."""
+    path = run_id if run_id.endswith(".jsonl") else os.path.join(checkpoint_dir(), f"{run_id}.jsonl")
+    with open(path, "rb") as f:
+        data = f.read()
+    if data and not data.endswith(b"\n"):
+        data = data[:data.rfind(b"\n") + 1]
+        with open(path, "r+b") as f:
+            f.truncate(len(data))
+    header, turns, finished = None, [], False
+    for line in data.decode("utf-8").splitlines():
+        record = json.loads(line)
+        kind = record.pop("type")
+        if kind == "start":
+            header = record
+        elif kind == "turn":
+            record.pop("at", None)
+            turns.append(record)
+        elif kind == "finished":
+            finished = True
+    if header is None:
+        raise ValueError(f"{path} is not a checkpoint (no start record)")
+    return Run(path, header["id"], header["app"], header["params"], turns, finished)
+
+
+def runs(app=None, include_finished=False):
+    """Checkpointed runs, newest first."""
+    directory = checkpoint_dir()
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith(".jsonl") or (app and not name.startswith(f"{app}_")):
+            continue
+        try:
+            run = load(os.path.join(directory, name))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Skipping checkpoint {name}: {e}")
+            continue
+        if include_finished or not run.finished:
+            found.append(run)
+    return found
+
+
+def choices(app):
+    """(label, run id) pairs of an app's unfinished runs, for a Gradio dropdown."""
+    return [(run.describe(), run.id) for run in runs(app)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkpointed bot-vs-bot runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    listing = commands.add_parser("list", help="runs that can be resumed")
+    listing.add_argument("--app")
+    listing.add_argument("--all", action="store_true", help="include finished runs")
+    args = parser.parse_args()
+
+    found = runs(args.app, include_finished=args.all)
+    for run in found:
+        status = "✅" if run.finished else "⏸️"
+        print(f"{status} {run.id}  {run.describe()}")
+    print(f"🗂️ {len(found)} runs in {checkpoint_dir()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Canonical per-session conversation with incrementally rendered provider formats.
+
+Rebuilding every provider's message list from the full Gradio history on each
+turn is O(history). `Conversation` keeps the turns once (slots-backed) and, per
+provider, a cached rendered list plus how many turns it already covers; a new
+turn only converts what was appended since the last call. `sync(history)` takes
+Gradio's history (messages or [user, assistant] pairs) and appends just the new
+entries, rebuilding only when the history was cleared or edited.
+
+Rendered lists are shared caches - pass them to SDKs, don't mutate them.
+"""
+
+import threading
+from collections import OrderedDict
+
+GEMINI_ROLES = {"user": "user", "assistant": "model"}
+COHERE_ROLES = {"user": "User", "assistant": "Chatbot"}
+
+
+class Turn:
+    __slots__ = ("role", "content")
+
+    def __init__(self, role, content):
+        self.role = role
+        self.content = content
+
+
+# ---------- Renderers: one turn -> one provider message ----------
+def _openai(turn):
+    return {"role": turn.role, "content": turn.content}
+
+
+def _gemini(turn):
+    return {"role": GEMINI_ROLES.get(turn.role, "user"), "parts": [turn.content]}
+
+
+def _cohere(turn):
+    return {"role": COHERE_ROLES.get(turn.role, "User"), "message": turn.content}
+
+
+# name -> (renderer, whether the list starts with the system message, when there is one)
+RENDERERS = {
+    "openai": (_openai, True),      # also DeepSeek and Ollama
+    "anthropic": (_openai, False),  # system prompt is a separate argument
+    "gemini": (_gemini, False),     # system_instruction is set on the model
+    "cohere": (_cohere, False),     # preamble carries the system prompt
+}
+
+
+class Conversation:
+    __slots__ = ("_system", "turns", "_rendered", "_synced", "_synced_turns", "_last_synced", "_lock")
+
+    def __init__(self, system=""):
+        self._system = system
+        self.turns = []
+        self._rendered = {}      # (provider, exclude_last) -> [list, turns covered]
+        self._synced = 0         # Gradio history entries already consumed
+        self._synced_turns = 0   # turns those entries produced
+        self._last_synced = None
+        self._lock = threading.Lock()   # hedged requests render from two threads
+
+    # ---------- System prompt ----------
+    @property
+    def system(self):
+        return self._system
+
+    @system.setter
+    def system(self, text):
+        if text == self._system:
+            return
+        had_system, self._system = bool(self._system), text
+        for key in list(self._rendered):
+            if not RENDERERS[key[0]][1]:
+                continue
+            if had_system and text:
+                self._rendered[key][0][0] = {"role": "system", "content": text}
+            else:
+                del self._rendered[key]   # system message added or removed: re-render once
+
+    # ---------- Turns ----------
+    def append(self, role, content):
+        self.turns.append(Turn(role, content or ""))
+
+    def reset(self):
+        self.turns.clear()
+        self._rendered.clear()
+        self._synced = 0
+        self._synced_turns = 0
+        self._last_synced = None
+
+    def sync(self, history):
+        """
+        Bring the turns in line with Gradio's `history` (which excludes the message
+        being answered). Only entries added since the last sync are converted, and
+        turns appended since then (the last question and reply) are kept when
+        Gradio's history agrees with them.
+        """
+        history = history or []
+        if self._synced > len(history) or (
+                self._synced and _entry_key(history[self._synced - 1]) != self._last_synced):
+            self.reset()   # cleared, undone or edited: start over
+
+        new_turns = [turn for entry in history[self._synced:] for turn in _entry_turns(entry)]
+        provisional = self.turns[self._synced_turns:]
+        keep = 0
+        while (keep < len(provisional) and keep < len(new_turns)
+               and (provisional[keep].role, provisional[keep].content) == new_turns[keep]):
+            keep += 1
+        self._truncate(self._synced_turns + keep)
+        for role, content in new_turns[keep:]:
+            self.append(role, content)
+
+        self._synced = len(history)
+        self._synced_turns = len(self.turns)
+        self._last_synced = _entry_key(history[-1]) if history else None
+
+    def _truncate(self, length):
+        """Drop turns past `length`, trimming the rendered caches to match."""
+        if length >= len(self.turns):
+            return
+        del self.turns[length:]
+        for cached in self._rendered.values():
+            rendered, covered = cached
+            if covered > length:
+                del rendered[len(rendered) - (covered - length):]
+                cached[1] = length
+
+    # ---------- Rendering ----------
+    def render(self, provider, exclude_last=False):
+        """
+        The provider's message list, extended with only the turns appended since
+        the previous call. `exclude_last` leaves out the newest turn for APIs that
+        take the current message separately (Gemini, Cohere).
+        """
+        renderer, with_system = RENDERERS[provider]
+        with self._lock:
+            upto = len(self.turns) - 1 if exclude_last else len(self.turns)
+            key = (provider, exclude_last)
+            cached = self._rendered.get(key)
+            if cached is None or cached[1] > upto:
+                cached = [[{"role": "system", "content": self._system}] if with_system and self._system else [], 0]
+                self._rendered[key] = cached
+            rendered, covered = cached
+            for turn in self.turns[covered:upto]:
+                rendered.append(renderer(turn))
+            cached[1] = upto
+            return rendered
+
+    @property
+    def last_user_message(self):
+        for turn in reversed(self.turns):
+            if turn.role == "user":
+                return turn.content
+        return ""
+
+
+def _entry_turns(entry):
+    """Gradio history entry -> [(role, content), ...] for both history formats."""
+    if isinstance(entry, dict):
+        content = entry.get("content")
+        if entry.get("role") in ("user", "assistant") and isinstance(content, str):
+            return [(entry["role"], content)]
+        return []
+    if isinstance(entry, (list, tuple)) and len(entry) == 2:
+        user, assistant = entry
+        turns = []
+        if isinstance(user, str) and user:
+            turns.append(("user", user))
+        if isinstance(assistant, str) and assistant:
+            turns.append(("assistant", assistant))
+        return turns
+    return []
+
+
+def _entry_key(entry):
+    if isinstance(entry, dict):
+        return (entry.get("role"), str(entry.get("content")))
+    return str(entry)
+
+
+# ---------- Per-session store ----------
+class ConversationStore:
+    """Conversations keyed by Gradio session hash, least recently used evicted first."""
+
+    def __init__(self, system="", max_sessions=256):
+        self.system = system
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            conversation = self._sessions.pop(session_id, None)
+            if conversation is None:
+                conversation = Conversation(self.system)
+            self._sessions[session_id] = conversation
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return conversation
+
+
+def session_id(request):
+    """Stable id for a Gradio request (falls back to one shared session outside Gradio)."""
+    return getattr(request, "session_hash", None) or "default"
@@ -0,0 +1,211 @@
+"""
+Fare data engine: route prices from an on-disk SQLite file plus an in-memory
+city index for fuzzy lookup.
+
+The seed data lives in `data/routes.csv` and `data/city_aliases.csv`; the first
+`FareEngine.open()` compiles them into `data/fares.sqlite` (rebuilt whenever a CSV
+is newer). At load time everything is pulled into plain dicts:
+
+- routes keyed by a packed (origin_id, destination_id) int -> price
+- an alias table ("londres", "nyc", "cdg" -> canonical city)
+- a trigram index over every name and alias for misspellings ("Tokio", "Londn")
+
+so price queries are a couple of dict lookups (microseconds), even with 100k
+routes. See `benchmarks/bench_fares.py`.
+"""
+
+import csv
+import difflib
+import os
+import re
+import sqlite3
+import unicodedata
+from collections import Counter, defaultdict
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_DB = os.path.join(DATA_DIR, "fares.sqlite")
+ROUTES_CSV = os.path.join(DATA_DIR, "routes.csv")
+ALIASES_CSV = os.path.join(DATA_DIR, "city_aliases.csv")
+
+DEFAULT_ORIGIN = "new york"   # FlightAI's hub; "a ticket to Paris" means from here
+FUZZY_CANDIDATES = 5          # best trigram-overlap aliases re-scored with similarity()
+FUZZY_THRESHOLD = 0.8         # similarity() needed for a fuzzy match
+FUZZY_MARGIN = 0.05           # ...and by how much it must beat the best other city
+LENGTH_PENALTY = 0.1          # per character of length difference ("bern" is not "ber" or "berlin")
+PREFIX_PENALTY = 0.1          # typos rarely hit the first letter ("nome" is not "rome")
+ID_BITS = 20                  # up to ~1M cities per packed route key
+
+SCHEMA = """
+CREATE TABLE cities  (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE aliases (alias TEXT PRIMARY KEY, city_id INTEGER NOT NULL REFERENCES cities(id));
+CREATE TABLE routes  (origin_id INTEGER NOT NULL, destination_id INTEGER NOT NULL, price INTEGER NOT NULL,
+                      PRIMARY KEY (origin_id, destination_id)) WITHOUT ROWID;
+"""
+
+
+# ---------- Text helpers ----------
+def normalize(name):
+    """'  Berlín ' -> 'berlin', 'New-York' -> 'new york'."""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return re.sub(r"[^a-z0-9]+", " ", name.lower()).strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """
+    difflib ratio, less a penalty for every character of length difference and for
+    a different first letter. A same-length typo ("tokio") keeps its ratio; a
+    shorter or longer word that happens to share most letters ("bern" vs "ber" or
+    "berlin") is more likely a different place and drops below the cutoffs.
+    """
+    if not a or not b:
+        return 0.0
+    score = difflib.SequenceMatcher(None, a, b).ratio() - LENGTH_PENALTY * abs(len(a) - len(b))
+    if a[0] != b[0]:
+        score -= PREFIX_PENALTY
+    return max(score, 0.0)
+
+
+# ---------- Building the database ----------
+def build_db(db_path, routes, aliases=()):
+    """
+    Write a fare database from iterables of (origin, destination, price) and
+    (alias, city). Cities are created as they are first seen.
+    """
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.executescript(SCHEMA)
+
+    city_ids = {}
+
+    def city_id(name):
+        name = normalize(name)
+        if name not in city_ids:
+            city_ids[name] = len(city_ids) + 1
+        return city_ids[name]
+
+    route_rows = [(city_id(o), city_id(d), int(float(p))) for o, d, p in routes]
+    alias_rows = [(normalize(a), city_id(c)) for a, c in aliases]
+
+    conn.executemany("INSERT INTO cities VALUES (?, ?)", [(i, n) for n, i in city_ids.items()])
+    conn.executemany("INSERT OR REPLACE INTO aliases VALUES (?, ?)", alias_rows)
+    conn.executemany("INSERT OR REPLACE INTO routes VALUES (?, ?, ?)", route_rows)
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, db_path)
+    return db_path
+
+
+def _read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        return [row for row in reader if row]
+
+
+def build_default_db(db_path=DEFAULT_DB):
+    return build_db(db_path, _read_csv(ROUTES_CSV), _read_csv(ALIASES_CSV))
+
+
+# ---------- Engine ----------
+class FareEngine:
+    def __init__(self, db_path=DEFAULT_DB):
+        self.db_path = db_path
+        self._city_ids = {}             # canonical name -> id
+        self._aliases = {}              # normalized alias/name -> canonical name
+        self._trigrams = defaultdict(list)  # trigram -> [alias, ...]
+        self._alias_sizes = {}          # alias -> number of trigrams
+        self._routes = {}               # packed (origin_id, destination_id) -> price
+
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            for city_id, name in conn.execute("SELECT id, name FROM cities"):
+                self._city_ids[name] = city_id
+                self._aliases[name] = name
+            id_to_name = {i: n for n, i in self._city_ids.items()}
+            for alias, city_id in conn.execute("SELECT alias, city_id FROM aliases"):
+                self._aliases[alias] = id_to_name[city_id]
+            for origin_id, destination_id, price in conn.execute("SELECT origin_id, destination_id, price FROM routes"):
+                self._routes[(origin_id << ID_BITS) | destination_id] = price
+        finally:
+            conn.close()
+
+        for alias in self._aliases:
+            grams = trigrams(alias)
+            self._alias_sizes[alias] = len(grams)
+            for gram in grams:
+                self._trigrams[gram].append(alias)
+
+    @classmethod
+    def open(cls, db_path=DEFAULT_DB):
+        """Load the default fare file, (re)building it from the seed CSVs when needed."""
+        if db_path == DEFAULT_DB:
+            seeds_mtime = max(os.path.getmtime(ROUTES_CSV), os.path.getmtime(ALIASES_CSV))
+            if not os.path.exists(db_path) or os.path.getmtime(db_path) < seeds_mtime:
+                build_default_db(db_path)
+        return cls(db_path)
+
+    # ----- City lookup -----
+    def cities(self):
+        return list(self._city_ids)
+
+    def resolve_city(self, text):
+        """
+        Map user text to a canonical city: returns (city, score) with score 1.0 for
+        an exact name/alias and similarity() for fuzzy matches, or (None, 0.0) for a
+        city we don't serve. A fuzzy match must also clearly beat the runner-up city;
+        an ambiguous typo is left to the caller. The trigram index only picks the
+        few candidates worth scoring.
+        """
+        key = normalize(text)
+        if not key:
+            return None, 0.0
+        if key in self._aliases:
+            return self._aliases[key], 1.0
+
+        grams = trigrams(key)
+        overlap = Counter()
+        for gram in grams:
+            overlap.update(self._trigrams.get(gram, ()))
+        ranked = sorted(
+            overlap.items(),
+            key=lambda item: 2 * item[1] / (len(grams) + self._alias_sizes[item[0]]),
+            reverse=True,
+        )
+        best = {}   # canonical city -> best score over its aliases
+        for alias, _ in ranked[:FUZZY_CANDIDATES]:
+            city = self._aliases[alias]
+            best[city] = max(best.get(city, 0.0), similarity(key, alias))
+        scores = sorted(best.items(), key=lambda item: item[1], reverse=True) + [(None, 0.0)] * 2
+        (city, score), (_, runner_up) = scores[0], scores[1]
+        if score < FUZZY_THRESHOLD or score - runner_up < FUZZY_MARGIN:
+            return None, 0.0
+        return city, score
+
+    # ----- Prices -----
+    def fare(self, origin, destination):
+        """Price as an int for two canonical city names, or None."""
+        origin_id = self._city_ids.get(origin)
+        destination_id = self._city_ids.get(destination)
+        if origin_id is None or destination_id is None:
+            return None
+        return self._routes.get((origin_id << ID_BITS) | destination_id)
+
+    def price(self, destination, origin=DEFAULT_ORIGIN):
+        """'$799'-style price for free-text city names (aliases and typos allowed), or None."""
+        destination, _ = self.resolve_city(destination)
+        origin, _ = self.resolve_city(origin)
+        if destination is None or origin is None:
+            return None
+        fare = self.fare(origin, destination)
+        return None if fare is None else f"${fare}"
+
+    def __len__(self):
+        return len(self._routes)
@@ -0,0 +1,113 @@
+"""
+Gemini adapter: cached model objects and true token streaming.
+
+The per-app wrappers called `genai.configure()` and built a new `GenerativeModel`
+on every request, then `start_chat(history=everything)` + `send_message(last)`,
+which sent the newest message twice, and mostly returned one final blob.
+`GeminiAdapter` configures the SDK once, keeps one model per
+(model name, system instruction), converts OpenAI-style messages to Gemini
+contents with each message exactly once, and streams with `stream=True`. The
+SDK itself is imported and configured on the first request, so apps that offer
+Gemini don't pay for it until it is picked.
+
+    gemini = GeminiAdapter(os.getenv("GOOGLE_API_KEY"))
+    for delta in gemini.stream(messages):          # OpenAI-style messages
+        ...
+    deltas, close = gemini.open_stream(contents)   # with a close for common.cancellation
+    reply = gemini.generate(messages)              # non-streaming
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from common import lazy
+from common.cancellation import closer
+from common.conversation import GEMINI_ROLES
+
+genai = lazy.module("google.generativeai")
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+
+def to_contents(messages):
+    """OpenAI-style messages -> (system instruction, Gemini contents)."""
+    system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+    contents = [
+        {"role": GEMINI_ROLES.get(m["role"], "user"), "parts": [m["content"]]}
+        for m in messages if m["role"] != "system"
+    ]
+    return system, contents
+
+
+def chunk_text(chunk):
+    # chunks without text parts (safety stops, finish markers) raise on .text
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+class GeminiAdapter:
+    def __init__(self, api_key=None, model=DEFAULT_MODEL, max_models=32, transport=None):
+        # GEMINI_TRANSPORT=rest sends Gemini over plain HTTP (requests) instead of gRPC, e.g. for cassettes
+        self.api_key = api_key
+        self.transport = transport or os.getenv("GEMINI_TRANSPORT")
+        self._configured = False
+        self.default_model = model
+        self.max_models = max_models
+        self._models = OrderedDict()   # (model name, system instruction) -> GenerativeModel
+        self._lock = threading.Lock()
+
+    def model(self, name=None, system=None):
+        """Cached GenerativeModel; system prompts that change (news) evict the oldest."""
+        key = (name or self.default_model, system or None)
+        with self._lock:
+            if not self._configured:
+                if self.api_key:
+                    genai.configure(api_key=self.api_key, transport=self.transport)
+                self._configured = True
+            model = self._models.pop(key, None)
+            if model is None:
+                model = genai.GenerativeModel(model_name=key[0], system_instruction=key[1])
+            self._models[key] = model
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+            return model
+
+    # ---------- Streaming ----------
+    def open_stream(self, contents, model=None, system=None, **generation):
+        """
+        Start streaming Gemini-format `contents` (history plus the new message);
+        returns (text deltas, close). `close` stops the call from any thread.
+        """
+        response = self.model(model, system).generate_content(
+            contents, stream=True, generation_config=generation or None
+        )
+        deltas = (text for text in map(chunk_text, response) if text)
+        return deltas, _stream_close(response)
+
+    def stream_contents(self, contents, model=None, system=None, **generation):
+        """Yield text deltas for Gemini-format `contents` (history plus the new message)."""
+        deltas, _ = self.open_stream(contents, model, system, **generation)
+        yield from deltas
+
+    def stream(self, messages, model=None, **generation):
+        system, contents = to_contents(messages)
+        yield from self.stream_contents(contents, model, system, **generation)
+
+    # ---------- Non-streaming ----------
+    def generate(self, messages, model=None, **generation):
+        system, contents = to_contents(messages)
+        response = self.model(model, system).generate_content(contents, generation_config=generation or None)
+        return chunk_text(response)
+
+
+def _stream_close(response):
+    # The SDK keeps the transport's stream privately: over REST an api_core
+    # ResponseIterator around a requests response, over gRPC a call with cancel()
+    iterator = getattr(response, "_iterator", None)
+    http = getattr(iterator, "_response", None)
+    if http is not None:
+        return closer(http)
+    return getattr(iterator, "cancel", None)
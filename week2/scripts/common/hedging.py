@@ -0,0 +1,238 @@
+"""
+Hedged requests across providers, to cut tail latency.
+
+A request pinned to one provider waits however long that provider takes. With
+hedging, the primary starts alone; if it has not produced a first token within
+its rolling p90 time-to-first-token, the same request is fired at a backup
+provider. Whichever streams first wins, and the other is cancelled: each leg
+passes its response's `close` to `common.cancellation.guarded`, so the loser's
+HTTP stream is shut even while it is still waiting for its first token. A
+primary beaten by its backup is first timed to its own first token (or to the
+end of the reply, as a lower bound), so its p90 keeps up with how slow it is.
+
+    deltas = hedged("claude", lambda: stream_claude(conv), "openai", lambda: stream_openai(conv))
+    for delta in deltas:          # stream_* return (deltas, close)
+        ...
+
+Non-streaming calls hedge the same way: `once(lambda: ask_gpt(messages))` turns
+a blocking call into a one-delta stream. It has no response to close, so a
+losing `once()` leg runs to completion in the background; only its reply is
+dropped. `stats.report()` shows per-pair hedge rates and p99 TTFT with hedging
+against the primary on its own; the per-pair counts are also on the metrics
+endpoint as `llm_hedge_requests`.
+"""
+
+import math
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+
+from common import telemetry
+from common.cancellation import CancelToken, guarded
+
+DEFAULT_HEDGE_DELAY = 2.0   # seconds, until a provider has enough TTFT samples
+MIN_SAMPLES = 10
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0-100) of `values`, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def once(call):
+    """A blocking call as a one-delta stream (with no `close`), so non-streaming wrappers can be hedged."""
+    return _once(call), None
+
+
+def _once(call):
+    yield call()
+
+
+class LatencyTracker:
+    """Rolling time-to-first-token samples per provider."""
+
+    def __init__(self, window=200, min_samples=MIN_SAMPLES, default=DEFAULT_HEDGE_DELAY):
+        self.min_samples = min_samples
+        self.default = default
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, provider, seconds):
+        with self._lock:
+            self._samples[provider].append(seconds)
+
+    def percentile(self, provider, q):
+        with self._lock:
+            samples = list(self._samples[provider])
+        return percentile(samples, q)
+
+    def hedge_delay(self, provider, q=90):
+        with self._lock:
+            samples = list(self._samples[provider])
+        if len(samples) < self.min_samples:
+            return self.default
+        return percentile(samples, q)
+
+
+class HedgeStats:
+    """
+    Per (primary, backup) pair: how often the hedge fired, how often the backup won,
+    and TTFT with hedging vs the primary alone. When the backup wins, the primary is
+    timed until its own first token; if it never gets there, the time it had taken
+    is a lower bound, which makes the reported improvement conservative.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pairs = defaultdict(lambda: {"requests": 0, "hedged": 0, "backup_wins": 0,
+                                           "ttft": [], "primary_ttft": []})
+
+    def record(self, primary, backup, hedged, backup_won, ttft, primary_ttft):
+        with self._lock:
+            pair = self._pairs[(primary, backup)]
+            pair["requests"] += 1
+            pair["hedged"] += hedged
+            pair["backup_wins"] += backup_won
+            pair["ttft"].append(ttft)
+            pair["primary_ttft"].append(primary_ttft)
+
+    def counts(self):
+        """{(primary, backup, kind): count} for the metrics endpoint; kind is requests, hedged or backup_wins."""
+        with self._lock:
+            return {(primary, backup, kind): pair[kind] for (primary, backup), pair in self._pairs.items()
+                    for kind in ("requests", "hedged", "backup_wins")}
+
+    def report(self):
+        lines = []
+        with self._lock:
+            pairs = {k: dict(v) for k, v in self._pairs.items()}
+        for (primary, backup), pair in sorted(pairs.items()):
+            p99, p99_primary = percentile(pair["ttft"], 99), percentile(pair["primary_ttft"], 99)
+            gain = 1 - p99 / p99_primary if p99_primary else 0.0
+            lines.append(
+                f"{primary} -> {backup}: {pair['requests']} requests, "
+                f"hedged {pair['hedged'] / pair['requests']:.0%}, backup won {pair['backup_wins']}, "
+                f"p99 TTFT {p99:.2f}s vs >={p99_primary:.2f}s unhedged ({gain:.0%} better)"
+            )
+        return "\n".join(lines) or "no hedged requests yet"
+
+
+tracker = LatencyTracker()
+stats = HedgeStats()
+telemetry.registry.gauge_callback("llm_hedge_requests", "Hedged requests per provider pair, by kind",
+                                  ("primary", "backup", "kind"), stats.counts)
+
+
+class _Leg:
+    """One provider's attempt, streaming into the shared event queue from its own thread."""
+
+    def __init__(self, name, start, events):
+        self.name = name
+        self.token = CancelToken()
+        self.started = time.perf_counter()
+        self.finished = False
+        thread = threading.Thread(target=self._run, args=(start, events), daemon=True)
+        thread.start()
+
+    def _run(self, start, events):
+        try:
+            deltas, close = start()
+            for delta in guarded(deltas, self.name, close=close, token=self.token):
+                if delta:
+                    events.put((self, "delta", delta))
+            events.put((self, "done", None))
+        except Exception as e:
+            events.put((self, "error", e))
+
+
+def hedged(primary, start_primary, backup, start_backup, token=None, delay=None):
+    """
+    Yield text deltas from whichever of `primary` / `backup` streams first.
+    `start_*` are zero-argument callables returning (delta iterator, close); the backup
+    is only started if the primary has no first token after `delay` (default: the
+    primary's rolling p90 TTFT) or fails first. `token` cancels both legs.
+    """
+    events = queue.Queue()
+    shadow = False
+    started = time.perf_counter()
+    legs = [_Leg(primary, start_primary, events)]
+    unregister = token.on_cancel(lambda: [leg.token.cancel() for leg in legs]) if token else (lambda: None)
+    deadline = started + (tracker.hedge_delay(primary) if delay is None else delay)
+
+    def fire_backup():
+        if len(legs) == 1:
+            print(f"⚡ Hedging {primary} with {backup}")
+            legs.append(_Leg(backup, start_backup, events))
+
+    try:
+        # ---------- Race to the first token ----------
+        winner, first, error = None, None, None
+        while winner is None:
+            if token and token.cancelled:
+                return
+            timeout = max(0.0, deadline - time.perf_counter()) if len(legs) == 1 else None
+            try:
+                leg, kind, value = events.get(timeout=timeout)
+            except queue.Empty:
+                fire_backup()
+                continue
+            if kind == "delta":
+                winner, first = leg, value
+                break
+            leg.finished = True
+            error = value if kind == "error" else error
+            if len(legs) == 1:
+                fire_backup()          # primary failed or returned nothing: go straight to the backup
+            elif all(other.finished for other in legs):
+                if error:
+                    raise error
+                return
+
+        now = time.perf_counter()
+        tracker.record(winner.name, now - winner.started)
+        primary_leg = legs[0]
+        shadow = winner is not primary_leg and not primary_leg.finished
+        for leg in legs:
+            if leg is not winner and not (shadow and leg is primary_leg):
+                leg.token.cancel()
+
+        def settle(primary_ttft):
+            stats.record(primary, backup, hedged=len(legs) > 1, backup_won=winner is not primary_leg,
+                         ttft=now - started, primary_ttft=primary_ttft)
+            if shadow:
+                # the beaten primary's TTFT (or its lower bound) feeds its p90 too; recording
+                # only winners would keep the hedge delay low and fire hedges ever more often
+                tracker.record(primary, primary_ttft)
+
+        if not shadow:
+            settle(now - started)
+
+        # ---------- Stream the winner ----------
+        # A beaten primary runs on only until its own first token (or the end of
+        # the winner's stream), so the unhedged p99 is measured, then it is cancelled.
+        yield first
+        while True:
+            leg, kind, value = events.get()
+            if leg is not winner:
+                if shadow and leg is primary_leg:
+                    settle(time.perf_counter() - started)
+                    primary_leg.token.cancel()
+                    shadow = False
+                continue
+            if kind == "delta":
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                return
+    finally:
+        if shadow:
+            settle(time.perf_counter() - started)   # lower bound: the primary still hadn't started
+        unregister()
+        for leg in legs:
+            leg.token.cancel()
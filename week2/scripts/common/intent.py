@@ -0,0 +1,199 @@
+"""
+Local intent fast path for FlightAI price questions.
+
+"How much is a ticket to Paris?" does not need two model round trips to read a
+four-entry price table. `PriceFastPath` runs a keyword/regex classifier with
+fuzzy city matching in front of the LLM: high-confidence price lookups are
+answered from a template in well under a millisecond, everything else falls
+through to the model unchanged.
+
+Run this file directly for a hit-rate / accuracy report on labelled examples:
+
+    python -m common.intent
+"""
+
+import re
+import time
+
+from common.fares import similarity
+
+# ---------- Classifier rules ----------
+PRICE_RE = re.compile(r"\b(how much|price|prices|pricing|cost|costs|fare|fares|ticket|tickets)\b")
+# anything that needs reasoning, a booking or a different product goes to the model
+BLOCK_RE = re.compile(
+    r"\b(book|booking|reserve|cancel|refund|change|baggage|luggage|upgrade|business|first class|"
+    r"one[- ]way|cheaper|cheapest|compare|discount|child|children|kids?|why|weather)\b"
+)
+WORD_RE = re.compile(r"[a-z]+")
+STOP_WORDS = {"how", "much", "is", "a", "the", "to", "for", "ticket", "tickets", "price", "cost",
+              "fare", "what", "return", "flight", "flights", "fly", "from", "does", "it", "of"}
+
+MAX_WORDS = 20          # long messages are rarely a plain lookup
+FUZZY_CUTOFF = 0.8      # fares.similarity needed to accept a misspelled city
+# an accepted fuzzy match is also answered: a stricter threshold here silently drops typo hits
+CONFIDENCE_THRESHOLD = FUZZY_CUTOFF
+
+DEFAULT_TEMPLATE = "A return ticket to {city} costs {price}."
+
+
+class Intent:
+    def __init__(self, name, city=None, confidence=0.0):
+        self.name = name
+        self.city = city
+        self.confidence = confidence
+
+    def __repr__(self):
+        return f"Intent({self.name!r}, city={self.city!r}, confidence={self.confidence:.2f})"
+
+
+def match_cities(text, cities, resolve=None):
+    """
+    Return {city: score} for every known city mentioned (exactly or fuzzily) in `text`.
+
+    `resolve(candidate) -> (city, score)` replaces the difflib lookup when a
+    FareEngine (alias + trigram index) is available.
+    """
+    words = [w for w in WORD_RE.findall(text) if w not in STOP_WORDS]
+    candidates = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    found = {}
+    for candidate in candidates:
+        if resolve is not None:
+            city, score = resolve(candidate)
+            if city and (score == 1.0 or len(candidate) >= 4):
+                found[city] = max(found.get(city, 0.0), score)
+        elif candidate in cities:
+            found[candidate] = 1.0
+        elif len(candidate) >= 4 and cities:
+            score, city = max((similarity(candidate, city), city) for city in cities)
+            if score >= FUZZY_CUTOFF:
+                found[city] = max(found.get(city, 0.0), score)
+    return found
+
+
+def classify(message, cities, resolve=None):
+    """Classify a user message as a price lookup (`Intent("price", city, confidence)`) or "other"."""
+    text = message.lower().strip()
+    if not PRICE_RE.search(text) or BLOCK_RE.search(text) or len(text.split()) > MAX_WORDS:
+        return Intent("other")
+
+    found = match_cities(text, cities, resolve)
+    if len(found) != 1:
+        # no city, or several ("London or Paris?") - let the model handle it
+        return Intent("other")
+
+    city, score = next(iter(found.items()))
+    return Intent("price", city, score)
+
+
+# ---------- Fast path ----------
+class PriceFastPath:
+    """
+    Answer simple price questions locally; count hits so the hit rate can be reported.
+
+    `prices` is either a plain {city: price} dict or a `FareEngine`.
+    """
+
+    def __init__(self, prices, template=DEFAULT_TEMPLATE, threshold=CONFIDENCE_THRESHOLD):
+        self.prices = prices
+        self.template = template
+        self.threshold = threshold
+        self.total = 0
+        self.hits = 0
+        self.seconds = 0.0
+        self.last_intent = None
+
+    def _classify(self, message):
+        if hasattr(self.prices, "resolve_city"):
+            return classify(message, None, self.prices.resolve_city)
+        return classify(message, list(self.prices))
+
+    def _lookup(self, city):
+        if hasattr(self.prices, "resolve_city"):
+            return self.prices.price(city)
+        return self.prices.get(city)
+
+    def try_answer(self, message):
+        """Return a templated answer, or None to fall through to the LLM."""
+        start = time.perf_counter()
+        self.total += 1
+        intent = self._classify(message) if isinstance(message, str) else Intent("other")
+        self.last_intent = intent
+        answer = None
+        if intent.name == "price" and intent.confidence >= self.threshold:
+            price = self._lookup(intent.city)
+            if price:  # a known city we don't fly to is the model's job
+                answer = self.template.format(city=intent.city.title(), price=price)
+                self.hits += 1
+        self.seconds += time.perf_counter() - start
+        return answer
+
+    def report(self):
+        rate = 100 * self.hits / self.total if self.total else 0.0
+        avg_ms = 1000 * self.seconds / self.total if self.total else 0.0
+        return f"⚡ Fast path: {self.hits}/{self.total} answered locally ({rate:.1f}%), avg {avg_ms:.3f} ms"
+
+
+def evaluate(examples, prices, threshold=CONFIDENCE_THRESHOLD):
+    """
+    Score the classifier on (message, expected_city_or_None) pairs against a
+    {city: price} dict or a FareEngine.
+
+    precision = correct local answers / local answers (a wrong local answer is the
+    expensive mistake), recall = correct local answers / answerable questions.
+    """
+    resolve = getattr(prices, "resolve_city", None)
+    answered = correct = answerable = 0
+    for message, expected in examples:
+        intent = classify(message, None if resolve else list(prices), resolve)
+        hit = intent.name == "price" and intent.confidence >= threshold
+        answerable += expected is not None
+        if hit:
+            answered += 1
+            correct += intent.city == expected
+    return {
+        "examples": len(examples),
+        "hit_rate": answered / len(examples) if examples else 0.0,
+        "precision": correct / answered if answered else 1.0,
+        "recall": correct / answerable if answerable else 1.0,
+    }
+
+
+LABELLED_EXAMPLES = [
+    ("How much is a ticket to Paris?", "paris"),
+    ("how much to london", "london"),
+    ("What's the price of a flight to Tokyo?", "tokyo"),
+    ("Berlin ticket price?", "berlin"),
+    ("how much is a ticket to Londn", "london"),
+    ("What does a return fare to Pariss cost?", "paris"),
+    ("ticket cost tokio", "tokyo"),
+    ("Price to Berlin please", "berlin"),
+    ("How much is a ticket to Rome?", None),
+    ("I'd like to book a flight to Paris", None),
+    ("Is Paris cheaper than London?", None),
+    ("How much is a ticket to London or Paris?", None),
+    ("What's the baggage fee to Tokyo?", None),
+    ("Tell me about Berlin", None),
+    ("Hello!", None),
+    ("Can I bring my kids to Tokyo, how much?", None),
+    # near misses: other places that share most of their letters with a served city
+    ("How much is a ticket to Bern?", None),
+    ("What's the fare to Berne?", None),
+    ("Price of a flight to Parma?", None),
+    ("How much is a ticket to Londonderry?", None),
+    ("how much to nome", None),
+]
+
+
+if __name__ == "__main__":
+    from common.fares import FareEngine
+
+    sample_prices = {"london": "$799", "paris": "$899", "tokyo": "$1400", "berlin": "$499"}
+    for backend, prices in (("dict", sample_prices), ("FareEngine", FareEngine.open())):
+        scores = evaluate(LABELLED_EXAMPLES, prices)
+        print(f"[{backend}] examples {scores['examples']}, hit rate {scores['hit_rate']:.1%}, "
+              f"precision {scores['precision']:.1%}, recall {scores['recall']:.1%}")
+
+    fast_path = PriceFastPath(sample_prices)
+    for message, _ in LABELLED_EXAMPLES * 100:
+        fast_path.try_answer(message)
+    print(fast_path.report())
@@ -0,0 +1,53 @@
+"""
+Deferred imports for provider SDKs.
+
+The multi-provider apps used to import every SDK (openai, anthropic, cohere and
+google.generativeai) before the UI appeared, even though a user usually talks
+to one provider. `lazy.module()` returns a stand-in that imports the real module
+on first attribute access, so each SDK is paid for when its provider is first
+picked:
+
+    anthropic = lazy.module("anthropic")           # nothing imported yet
+    client = anthropic.Anthropic(api_key=key)       # imported here
+
+`python benchmarks/bench_startup.py` checks which SDKs an app loads at startup.
+"""
+
+import importlib
+import sys
+import threading
+import types
+
+_lock = threading.RLock()
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with _lock:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def module(name):
+    """The module itself if something already imported it, else a lazy stand-in."""
+    return sys.modules.get(name) or LazyModule(name)
+
@@ -0,0 +1,454 @@
+"""
+Local stand-in for LLM servers, for tests and benchmarks without real models.
+
+Speaks three wire formats on one port:
+  - Ollama's native API (/api/chat, /api/generate, /api/ps)
+  - OpenAI chat completions (/v1/chat/completions, and /chat/completions for
+    DeepSeek-style base URLs), plus /v1/images/generations
+  - Anthropic messages (/v1/messages)
+
+and simulates the things that matter for latency: network latency before the
+response, a model load delay when an Ollama model is cold or its keep_alive has
+expired, time to first token, and a steady token rate. Tool calls and error
+injection (a share of requests failing with 429/500) are configurable, and
+OpenAI/Anthropic-style rate limit headers are sent with every response.
+
+    with MockLLMServer(load_seconds=2.0) as server:
+        client = OllamaClient(server.base_url)
+        ...
+
+    with MockLLMServer(tool_calls=[{"name": "get_ticket_price", "arguments": {"destination_city": "Paris"}}]) as server:
+        client = OpenAI(api_key="mock", base_url=server.base_url + "/v1")
+        ...
+
+or standalone, in place of a real server:
+
+    python -m common.mock_server --port 11434 --load-seconds 3 --error-rate 0.05
+"""
+
+import argparse
+import base64
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = "Hello from the mock server! FlightAI flies to London, Paris, Tokyo and Berlin."
+
+# 1x1 PNG, returned by the image endpoint
+TINY_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+)
+LANDING_PAGE = """<html><head><title>Mock Co</title></head><body>
+<h1>Mock Co</h1><p>We build dependable stand-ins for expensive services.</p>
+<h2>Careers</h2><p>We are hiring engineers who like fast feedback loops.</p>
+</body></html>"""
+
+
+def parse_keep_alive(value, default=300.0):
+    """Ollama durations: 300, "5m", "1h", "30s", -1 (forever), 0 (unload now)."""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float("inf") if value < 0 else float(value)
+    match = re.fullmatch(r"(-?\d+(?:\.\d+)?)\s*([smh]?)", str(value).strip())
+    if not match:
+        return default
+    number = float(match.group(1))
+    if number < 0:
+        return float("inf")
+    return number * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+
+class MockConfig:
+    def __init__(self, load_seconds=2.0, ttft=0.05, tokens_per_second=50.0, reply=DEFAULT_REPLY,
+                 latency=0.0, tool_calls=None, error_rate=0.0, error_status=500, seed=None,
+                 rpm=10_000, tpm=10_000_000):
+        self.load_seconds = load_seconds
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.reply = reply
+        self.latency = latency              # seconds before any response bytes
+        self.tool_calls = tool_calls or []  # [{"name": ..., "arguments": {...}}], made when offered
+        self.error_rate = error_rate        # share of chat requests that fail
+        self.error_status = error_status    # 429 (with retry-after) or 5xx
+        self.seed = seed
+        self.rpm = rpm                      # advertised in rate limit headers
+        self.tpm = tpm
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients hanging up mid-stream (cancellation, shutdown) are expected here
+        if not isinstance(sys.exc_info()[1], (ConnectionError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class MockLLMServer:
+    def __init__(self, host="127.0.0.1", port=0, **config):
+        self.config = MockConfig(**config)
+        self.loaded = {}          # model -> expiry timestamp
+        self.requests = 0
+        self.cold_loads = 0
+        self.errors = 0
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._httpd = _QuietHTTPServer((host, port), _make_handler(self))
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def begin(self):
+        """Count a request and wait out the network latency; True if it should fail."""
+        with self._lock:
+            self.requests += 1
+            fail = self._random.random() < self.config.error_rate
+            self.errors += fail
+        if self.config.latency:
+            time.sleep(self.config.latency)
+        return fail
+
+    def tool_calls_for(self, offered):
+        """The configured tool calls whose tools the request actually offers."""
+        return [call for call in self.config.tool_calls if call["name"] in offered]
+
+    def ensure_loaded(self, model, keep_alive):
+        """Sleep for the load time if `model` is cold; returns the load duration."""
+        now = time.time()
+        with self._lock:
+            cold = self.loaded.get(model, 0) < now
+            if cold:
+                self.cold_loads += 1
+        load = self.config.load_seconds if cold else 0.0
+        if load:
+            time.sleep(load)
+        with self._lock:
+            self.loaded[model] = time.time() + parse_keep_alive(keep_alive)
+        return load
+
+    def tokens(self):
+        return re.findall(r"\S+\s*", self.config.reply)
+
+    def pace(self):
+        """Sleep for one token at the configured rate."""
+        time.sleep(1 / self.config.tokens_per_second)
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _prompt_tokens(body):
+    return max(1, len(json.dumps(body.get("messages", []))) // 4)
+
+
+def _last_is_user_text(messages):
+    """True when the model is answering a user turn (not a tool result), i.e. a tool call fits."""
+    if not messages or messages[-1].get("role") != "user":
+        return False
+    content = messages[-1].get("content")
+    return isinstance(content, str) or not any(
+        isinstance(block, dict) and block.get("type") == "tool_result" for block in content or [])
+
+
+def _make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive, so pooled clients reuse connections
+        disable_nagle_algorithm = True  # small streamed chunks must not wait for ACKs
+
+        def log_message(self, *args):
+            pass
+
+        # ---------- Plumbing ----------
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _send_json(self, payload, status=200, headers=None):
+            self._send_bytes(json.dumps(payload).encode(), "application/json", status, headers)
+
+        def _send_bytes(self, data, content_type, status=200, headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _start_chunked(self, content_type, headers=None):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Transfer-Encoding", "chunked")
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+
+        def _chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def _end_chunked(self):
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def _sse(self, data, event=None):
+            prefix = f"event: {event}\n" if event else ""
+            payload = data if isinstance(data, str) else json.dumps(data)
+            self._chunk(f"{prefix}data: {payload}\n\n".encode())
+
+        def _rate_limit_headers(self, anthropic=False):
+            config = server.config
+            if anthropic:
+                return {"anthropic-ratelimit-requests-limit": str(config.rpm),
+                        "anthropic-ratelimit-requests-remaining": str(config.rpm),
+                        "anthropic-ratelimit-tokens-limit": str(config.tpm),
+                        "anthropic-ratelimit-tokens-remaining": str(config.tpm)}
+            return {"x-ratelimit-limit-requests": str(config.rpm),
+                    "x-ratelimit-remaining-requests": str(config.rpm),
+                    "x-ratelimit-limit-tokens": str(config.tpm),
+                    "x-ratelimit-remaining-tokens": str(config.tpm)}
+
+        def _send_error(self, payload, anthropic=False):
+            status = server.config.error_status
+            headers = self._rate_limit_headers(anthropic)
+            if status == 429:
+                headers["retry-after"] = "1"
+            self._send_json(payload, status, headers)
+
+        # ---------- Routes ----------
+        def do_GET(self):
+            if self.path == "/api/ps":
+                now = time.time()
+                models = [{"name": m} for m, expiry in server.loaded.items() if expiry > now]
+                self._send_json({"models": models})
+            elif self.path == "/":
+                self._send_bytes(LANDING_PAGE.encode(), "text/html; charset=utf-8")
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            body = self._body()
+            path = self.path.split("?")[0]
+            if path == "/api/generate":
+                self._ollama_generate(body)
+            elif path == "/api/chat":
+                self._ollama_chat(body)
+            elif path in ("/v1/chat/completions", "/chat/completions"):
+                self._openai_chat(body)
+            elif path == "/v1/images/generations":
+                self._openai_image(body)
+            elif path == "/v1/messages":
+                self._anthropic_messages(body)
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        # ---------- Ollama ----------
+        def _ollama_generate(self, body):
+            if server.begin():
+                self._send_json({"error": "Injected mock error"}, server.config.error_status)
+                return
+            model = body.get("model", "")
+            load = server.ensure_loaded(model, body.get("keep_alive"))
+            self._send_json({"model": model, "created_at": _now(), "response": "", "done": True,
+                             "load_duration": int(load * 1e9)})
+
+        def _ollama_chat(self, body):
+            if server.begin():
+                self._send_json({"error": "Injected mock error"}, server.config.error_status)
+                return
+            model = body.get("model", "")
+            load = server.ensure_loaded(model, body.get("keep_alive"))
+            tokens = server.tokens()
+            final = {"model": model, "created_at": _now(), "message": {"role": "assistant", "content": ""},
+                     "done": True, "load_duration": int(load * 1e9), "eval_count": len(tokens)}
+
+            if not body.get("stream", True):
+                time.sleep(server.config.ttft + len(tokens) / server.config.tokens_per_second)
+                final["message"]["content"] = "".join(tokens)
+                self._send_json(final)
+                return
+
+            self._start_chunked("application/x-ndjson")
+            time.sleep(server.config.ttft)
+            for token in tokens:
+                line = {"model": model, "created_at": _now(),
+                        "message": {"role": "assistant", "content": token}, "done": False}
+                self._chunk((json.dumps(line) + "\n").encode())
+                server.pace()
+            self._chunk((json.dumps(final) + "\n").encode())
+            self._end_chunked()
+
+        # ---------- OpenAI ----------
+        def _openai_chat(self, body):
+            if server.begin():
+                error_type = "rate_limit_exceeded" if server.config.error_status == 429 else "server_error"
+                self._send_error({"error": {"message": "Injected mock error", "type": error_type, "code": error_type}})
+                return
+
+            model = body.get("model", "")
+            offered = [t.get("function", {}).get("name") for t in body.get("tools") or []]
+            calls = server.tool_calls_for(offered) if _last_is_user_text(body.get("messages")) else []
+            tokens = [] if calls else server.tokens()
+            tool_calls = [{"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                           "function": {"name": c["name"], "arguments": json.dumps(c.get("arguments", {}))}}
+                          for c in calls]
+            finish = "tool_calls" if calls else "stop"
+            usage = {"prompt_tokens": _prompt_tokens(body), "completion_tokens": len(tokens) + len(calls)}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": model}
+            headers = self._rate_limit_headers()
+
+            if not body.get("stream"):
+                time.sleep(server.config.ttft + len(tokens) / server.config.tokens_per_second)
+                message = {"role": "assistant", "content": "".join(tokens) if tokens else None}
+                if tool_calls:
+                    message["tool_calls"] = tool_calls
+                self._send_json(dict(base, object="chat.completion", usage=usage,
+                                     choices=[{"index": 0, "message": message, "finish_reason": finish}]),
+                                headers=headers)
+                return
+
+            def chunk(delta, finish_reason=None):
+                self._sse(dict(base, object="chat.completion.chunk",
+                               choices=[{"index": 0, "delta": delta, "finish_reason": finish_reason}]))
+
+            self._start_chunked("text/event-stream", headers)
+            time.sleep(server.config.ttft)
+            chunk({"role": "assistant", "content": ""})
+            for token in tokens:
+                chunk({"content": token})
+                server.pace()
+            for index, call in enumerate(tool_calls):
+                chunk({"tool_calls": [dict(call, index=index, function={"name": call["function"]["name"], "arguments": ""})]})
+                chunk({"tool_calls": [{"index": index, "function": {"arguments": call["function"]["arguments"]}}]})
+            chunk({}, finish)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                self._sse(dict(base, object="chat.completion.chunk", choices=[], usage=usage))
+            self._sse("[DONE]")
+            self._end_chunked()
+
+        def _openai_image(self, body):
+            if server.begin():
+                self._send_error({"error": {"message": "Injected mock error", "type": "server_error"}})
+                return
+            time.sleep(server.config.ttft)
+            image = base64.b64encode(TINY_PNG).decode()
+            self._send_json({"created": int(time.time()), "data": [{"b64_json": image}] * body.get("n", 1)},
+                            headers=self._rate_limit_headers())
+
+        # ---------- Anthropic ----------
+        def _anthropic_messages(self, body):
+            if server.begin():
+                error_type = "rate_limit_error" if server.config.error_status == 429 else "api_error"
+                self._send_error({"type": "error", "error": {"type": error_type, "message": "Injected mock error"}},
+                                 anthropic=True)
+                return
+
+            model = body.get("model", "")
+            offered = [t.get("name") for t in body.get("tools") or []]
+            calls = server.tool_calls_for(offered) if _last_is_user_text(body.get("messages")) else []
+            tokens = [] if calls else server.tokens()
+            blocks = [{"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:12]}", "name": c["name"],
+                       "input": c.get("arguments", {})} for c in calls]
+            stop_reason = "tool_use" if calls else "end_turn"
+            usage = {"input_tokens": _prompt_tokens(body), "output_tokens": len(tokens) + len(calls)}
+            message = {"id": f"msg_{uuid.uuid4().hex[:12]}", "type": "message", "role": "assistant",
+                       "model": model, "content": [], "stop_reason": None, "stop_sequence": None,
+                       "usage": dict(usage, output_tokens=1)}
+            headers = self._rate_limit_headers(anthropic=True)
+
+            if not body.get("stream"):
+                time.sleep(server.config.ttft + len(tokens) / server.config.tokens_per_second)
+                content = ([{"type": "text", "text": "".join(tokens)}] if tokens else []) + blocks
+                self._send_json(dict(message, content=content, stop_reason=stop_reason, usage=usage),
+                                headers=headers)
+                return
+
+            self._start_chunked("text/event-stream", headers)
+            time.sleep(server.config.ttft)
+            self._sse({"type": "message_start", "message": message}, "message_start")
+            index = 0
+            if tokens:
+                self._sse({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+                          "content_block_start")
+                for token in tokens:
+                    self._sse({"type": "content_block_delta", "index": 0,
+                               "delta": {"type": "text_delta", "text": token}}, "content_block_delta")
+                    server.pace()
+                self._sse({"type": "content_block_stop", "index": 0}, "content_block_stop")
+                index = 1
+            for offset, block in enumerate(blocks):
+                i = index + offset
+                self._sse({"type": "content_block_start", "index": i, "content_block": dict(block, input={})},
+                          "content_block_start")
+                self._sse({"type": "content_block_delta", "index": i,
+                           "delta": {"type": "input_json_delta", "partial_json": json.dumps(block["input"])}},
+                          "content_block_delta")
+                self._sse({"type": "content_block_stop", "index": i}, "content_block_stop")
+            self._sse({"type": "message_delta", "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                       "usage": {"output_tokens": usage["output_tokens"]}}, "message_delta")
+            self._sse({"type": "message_stop"}, "message_stop")
+            self._end_chunked()
+
+    return Handler
+
+
+def parse_tool_call(value):
+    """CLI form of a tool call: name or name=<json arguments>."""
+    name, _, arguments = value.partition("=")
+    return {"name": name, "arguments": json.loads(arguments) if arguments else {}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for an LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--load-seconds", type=float, default=2.0)
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--tool-call", action="append", type=parse_tool_call, default=[],
+                        help='e.g. get_ticket_price=\'{"destination_city": "Paris"}\' (repeatable)')
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    mock = MockLLMServer(args.host, args.port, load_seconds=args.load_seconds, ttft=args.ttft,
+                         tokens_per_second=args.tokens_per_second, latency=args.latency,
+                         tool_calls=args.tool_call, error_rate=args.error_rate,
+                         error_status=args.error_status, seed=args.seed)
+    print(f"🧪 Mock LLM server on {mock.base_url} (Ctrl+C to stop)")
+    try:
+        mock.serve_forever()
+    except KeyboardInterrupt:
+        mock.stop()
@@ -0,0 +1,139 @@
+"""
+Native Ollama client: model warm-up, per-model keep_alive and a pooled session.
+
+Hitting `localhost:11434` cold means the first request after idle pays the full
+model load. `OllamaClient.warm_up()` preloads the configured models when the app
+starts (an empty /api/generate loads a model without generating), every request
+carries that model's `keep_alive` so it stays resident, and all calls share one
+`requests.Session` so the TCP connection is reused. Streaming replies are parsed
+line by line from Ollama's NDJSON stream.
+"""
+
+import json
+import os
+import threading
+import time
+
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from common.cancellation import closer
+
+DEFAULT_PORT = 11434
+BIND_ALL = {"0.0.0.0", "::"}
+
+
+def host_url(host):
+    """
+    OLLAMA_HOST as a base URL. Ollama documents it as a server bind address, so
+    the usual values have no scheme: "0.0.0.0:11434" -> "http://localhost:11434",
+    "127.0.0.1" -> "http://127.0.0.1:11434"; full URLs pass through.
+    """
+    host = host.strip().rstrip("/")
+    if "://" not in host:
+        host = f"http://{host}"
+        if urlsplit(host).port is None:
+            host = f"{host}:{DEFAULT_PORT}"
+    parts = urlsplit(host)
+    if parts.hostname in BIND_ALL:
+        port = f":{parts.port}" if parts.port else ""
+        host = parts._replace(netloc=f"localhost{port}").geturl()
+    return host
+
+
+OLLAMA_URL = host_url(os.getenv("OLLAMA_HOST", f"http://localhost:{DEFAULT_PORT}"))
+DEFAULT_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+REQUEST_TIMEOUT = (5, 300)   # (connect, read) seconds; a cold model load can be slow
+
+
+class OllamaError(RuntimeError):
+    pass
+
+
+class OllamaClient:
+    def __init__(self, base_url=OLLAMA_URL, keep_alive=None, pool_size=8):
+        """
+        `keep_alive` maps model name -> Ollama duration ("30m", "1h", -1 for forever);
+        models not listed use DEFAULT_KEEP_ALIVE.
+        """
+        self.base_url = host_url(base_url)
+        self.keep_alive = dict(keep_alive or {})
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.load_times = {}     # model -> seconds the warm-up request took
+        self.last_stats = {}     # timings Ollama reports in the final stream line
+
+    def keep_alive_for(self, model):
+        return self.keep_alive.get(model, DEFAULT_KEEP_ALIVE)
+
+    # ---------- Warm-up ----------
+    def warm_up(self, models, background=True):
+        """Load `models` into memory now instead of on the first user message."""
+        def load(model):
+            start = time.perf_counter()
+            try:
+                response = self.session.post(
+                    f"{self.base_url}/api/generate",
+                    json={"model": model, "prompt": "", "keep_alive": self.keep_alive_for(model)},
+                    timeout=REQUEST_TIMEOUT,
+                )
+                response.raise_for_status()
+                self.load_times[model] = time.perf_counter() - start
+                print(f"🦙 Warmed up {model} in {self.load_times[model]:.1f}s")
+            except requests.RequestException as e:
+                print(f"⚠️ Could not warm up {model}: {e}")
+
+        threads = [threading.Thread(target=load, args=(m,), daemon=True) for m in models]
+        for t in threads:
+            t.start()
+        if not background:
+            for t in threads:
+                t.join()
+        return threads
+
+    # ---------- Chat ----------
+    def open_chat(self, model, messages, **options):
+        """Start /api/chat; returns (content deltas, close), `close` usable from any thread."""
+        payload = {"model": model, "messages": messages, "stream": True, "keep_alive": self.keep_alive_for(model)}
+        if options:
+            payload["options"] = options
+        try:
+            response = self.session.post(f"{self.base_url}/api/chat", json=payload, stream=True,
+                                         timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise OllamaError(f"Could not reach Ollama at {self.base_url}: {e}") from e
+        return self._deltas(response), closer(response)
+
+    def stream_chat(self, model, messages, **options):
+        """Yield content deltas from /api/chat, parsing the NDJSON stream as it arrives."""
+        deltas, _ = self.open_chat(model, messages, **options)
+        yield from deltas
+
+    def _deltas(self, response):
+        with response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if "error" in data:
+                    raise OllamaError(data["error"])
+                content = data.get("message", {}).get("content", "")
+                if content:
+                    yield content
+                if data.get("done"):
+                    self.last_stats = {k: v for k, v in data.items() if k.endswith(("_duration", "_count"))}
+                    return
+
+    def chat(self, model, messages, **options):
+        return "".join(self.stream_chat(model, messages, **options))
+
+    def loaded_models(self):
+        """Models currently resident in memory (/api/ps)."""
+        response = self.session.get(f"{self.base_url}/api/ps", timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return [m["name"] for m in response.json().get("models", [])]
@@ -0,0 +1,299 @@
+"""
+Client-side rate limiting: token buckets per provider and model.
+
+Each (provider, model) gets two buckets, requests per minute and tokens per
+minute. They start from conservative defaults and are corrected by the limits
+providers send back (`x-ratelimit-*` from OpenAI/DeepSeek, `anthropic-ratelimit-*`,
+`retry-after` on a 429), read by an httpx hook on the SDK clients. A request that
+would exceed a bucket waits in a queue instead of failing; waiting callers are
+served round-robin per client (e.g. per chat session), so one busy user can't
+starve the others and throughput stays at the ceiling without 429 storms.
+
+    client = OpenAI(api_key=key, http_client=limiter.http_client("openai"))
+    reservation = limiter.acquire("openai", "gpt-4", estimate_request_tokens(messages), client=session)
+    stream = client.chat.completions.create(...)
+    yield from reservation.metered(deltas)     # settles the TPM bucket with the real size
+"""
+
+import json
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+
+import httpx
+
+from common import telemetry
+from common.cancellation import estimate_tokens
+
+# (requests/min, tokens/min) until the provider's headers say otherwise; None = no token limit
+DEFAULT_LIMITS = {
+    "openai": (500, 30_000),
+    ("openai", "dall-e-3"): (5, None),
+    ("openai", "tts-1"): (50, None),
+    "anthropic": (50, 40_000),
+    "deepseek": (600, 1_000_000),
+    "cohere": (100, None),
+}
+DEFAULT_COMPLETION_TOKENS = 500
+
+
+def estimate_request_tokens(messages, max_tokens=DEFAULT_COMPLETION_TOKENS):
+    """Prompt tokens (rough) plus the completion budget, for the TPM bucket."""
+    prompt = sum(estimate_tokens(str(m.get("content") or "")) + 4 for m in messages)
+    return prompt + max_tokens
+
+
+def parse_reset(value, now=None):
+    """Seconds until a reset: "1s", "6m0s", "20ms", "12.5", or an RFC 3339 timestamp (Anthropic)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        return sum(float(n) * scale[u] for n, u in parts)
+    try:
+        reset = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0.0, reset.timestamp() - (now or time.time()))
+
+
+def limits_from_headers(headers):
+    """Normalise OpenAI-style and Anthropic-style rate limit headers."""
+    def get(*names):
+        for name in names:
+            if name in headers:
+                return headers[name]
+        return None
+
+    def number(*names):
+        value = get(*names)
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+    return {
+        "rpm": number("x-ratelimit-limit-requests", "anthropic-ratelimit-requests-limit"),
+        "tpm": number("x-ratelimit-limit-tokens", "anthropic-ratelimit-tokens-limit"),
+        "remaining_requests": number("x-ratelimit-remaining-requests", "anthropic-ratelimit-requests-remaining"),
+        "remaining_tokens": number("x-ratelimit-remaining-tokens", "anthropic-ratelimit-tokens-remaining"),
+        "reset_requests": parse_reset(get("x-ratelimit-reset-requests", "anthropic-ratelimit-requests-reset")),
+        "reset_tokens": parse_reset(get("x-ratelimit-reset-tokens", "anthropic-ratelimit-tokens-reset")),
+        "retry_after": parse_reset(get("retry-after")),
+    }
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.full_at = None   # when the server said the window resets
+
+    def _refill(self, now):
+        if self.full_at is not None and now >= self.full_at:
+            self.level, self.full_at = self.capacity, None
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` can be taken (requests bigger than the bucket wait for a full one)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        wait = 0.0 if self.level >= amount else (amount - self.level) * 60 / self.capacity
+        if self.full_at is not None:
+            wait = min(wait, self.full_at - now)
+        return max(wait, self.paused_until - now)
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= amount
+
+    def set_limit(self, per_minute, now):
+        self._refill(now)
+        self.capacity = float(per_minute)
+        self.level = min(self.level, self.capacity)
+
+    def sync(self, remaining, reset, now):
+        """The server's view wins when it is stricter than ours."""
+        self._refill(now)
+        if remaining is not None and remaining < self.level:
+            self.level = remaining
+        if reset is not None:
+            self.full_at = now + reset
+
+    def pause(self, seconds, now):
+        self.paused_until = max(self.paused_until, now + seconds)
+
+
+class ModelLimits:
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.queue = OrderedDict()   # client -> deque of waiting tickets, served round-robin
+        self.waited = 0.0
+        self.served = 0
+
+    def wait_time(self, tokens, now):
+        wait = self.requests.wait_time(1, now)
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return wait
+
+    def take(self, tokens, now):
+        self.requests.take(1, now)
+        if self.tokens:
+            self.tokens.take(tokens, now)
+
+
+class Reservation:
+    """Capacity taken for one request; `settle()` corrects the token estimate afterwards."""
+
+    def __init__(self, limiter, key, tokens, prompt_tokens):
+        self.limiter = limiter
+        self.key = key
+        self.tokens = tokens
+        self.prompt_tokens = prompt_tokens
+
+    def settle(self, actual_tokens):
+        self.limiter._refund(self.key, self.tokens - actual_tokens)
+        self.tokens = actual_tokens
+
+    def metered(self, deltas):
+        """
+        Pass text deltas through, then settle with prompt + streamed tokens - also
+        when the stream errors or is cancelled, so an unfinished reply doesn't keep
+        its whole max_tokens budget charged.
+        """
+        streamed = 0
+        try:
+            for delta in deltas:
+                streamed += estimate_tokens(delta)
+                yield delta
+        finally:
+            self.settle(self.prompt_tokens + streamed)
+
+
+class RateLimiter:
+    def __init__(self, defaults=None):
+        self.defaults = dict(DEFAULT_LIMITS if defaults is None else defaults)
+        self._limits = {}
+        self._clients = {}
+        self._cond = threading.Condition()
+
+    def _get(self, key):
+        limits = self._limits.get(key)
+        if limits is None:
+            rpm, tpm = self.defaults.get(key) or self.defaults.get(key[0]) or (60, None)
+            limits = self._limits[key] = ModelLimits(rpm, tpm)
+        return limits
+
+    # ---------- Queueing ----------
+    def acquire(self, provider, model, tokens=0, client="default", max_tokens=DEFAULT_COMPLETION_TOKENS):
+        """
+        Block until (provider, model) has room for one request of ~`tokens` tokens,
+        taking turns fairly with other clients; returns a Reservation.
+        """
+        key = (provider, model)
+        ticket = object()
+        start = time.monotonic()
+        with self._cond:
+            limits = self._get(key)
+            limits.queue.setdefault(client, deque()).append(ticket)
+            while True:
+                now = time.monotonic()
+                head_client = next(iter(limits.queue))
+                if limits.queue[head_client][0] is ticket:
+                    wait = limits.wait_time(tokens, now)
+                    if wait <= 0:
+                        limits.take(tokens, now)
+                        break
+                    self._cond.wait(timeout=wait)
+                else:
+                    self._cond.wait()
+            # served: this client goes to the back of the rotation
+            waiting = limits.queue.pop(client)
+            waiting.popleft()
+            if waiting:
+                limits.queue[client] = waiting
+            waited = time.monotonic() - start
+            limits.waited += waited
+            limits.served += 1
+            self._cond.notify_all()
+        if waited > 0.1:
+            print(f"⏳ {provider}/{model}: waited {waited:.1f}s for rate limit capacity")
+        return Reservation(self, key, tokens, max(0, tokens - max_tokens))
+
+    def _refund(self, key, amount):
+        with self._cond:
+            limits = self._get(key)
+            if limits.tokens and amount:
+                limits.tokens.level = min(limits.tokens.capacity, limits.tokens.level + amount)
+                self._cond.notify_all()
+
+    # ---------- Feedback from responses ----------
+    def update_from_headers(self, provider, model, headers, status=200):
+        info = limits_from_headers(headers)
+        now = time.monotonic()
+        with self._cond:
+            limits = self._get((provider, model))
+            if info["rpm"]:
+                limits.requests.set_limit(info["rpm"], now)
+            if info["tpm"]:
+                if limits.tokens is None:
+                    limits.tokens = TokenBucket(info["tpm"])
+                limits.tokens.set_limit(info["tpm"], now)
+            limits.requests.sync(info["remaining_requests"], info["reset_requests"], now)
+            if limits.tokens:
+                limits.tokens.sync(info["remaining_tokens"], info["reset_tokens"], now)
+            if status == 429:
+                limits.requests.pause(info["retry_after"] or info["reset_requests"] or 1.0, now)
+            self._cond.notify_all()
+
+    def http_client(self, provider):
+        """Shared httpx client for one provider's SDK; every response feeds the limiter."""
+        if provider not in self._clients:
+            def on_response(response):
+                self.update_from_headers(provider, _request_model(response.request),
+                                         response.headers, response.status_code)
+            self._clients[provider] = httpx.Client(
+                timeout=httpx.Timeout(600.0, connect=5.0),
+                event_hooks={"response": [on_response]},
+            )
+        return self._clients[provider]
+
+    def queue_depths(self):
+        """{(provider, model): requests waiting for capacity}, for the metrics endpoint."""
+        with self._cond:
+            return {key: sum(len(q) for q in limits.queue.values()) for key, limits in self._limits.items()}
+
+    def report(self):
+        lines = []
+        with self._cond:
+            for (provider, model), limits in sorted(self._limits.items()):
+                tpm = f"{limits.tokens.capacity:.0f} TPM" if limits.tokens else "no TPM"
+                queued = sum(len(q) for q in limits.queue.values())
+                lines.append(f"{provider}/{model}: {limits.requests.capacity:.0f} RPM, {tpm}, "
+                             f"{limits.served} served, {queued} queued, {limits.waited:.1f}s waited")
+        return "\n".join(lines)
+
+
+def _request_model(request):
+    try:
+        return json.loads(request.content).get("model", "")
+    except (ValueError, AttributeError, httpx.RequestNotRead):
+        return ""
+
+
+limiter = RateLimiter()
+telemetry.registry.gauge_callback("llm_ratelimit_queue_depth", "Requests waiting for rate limit capacity",
+                                  ("provider", "model"), limiter.queue_depths)
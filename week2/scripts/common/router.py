@@ -0,0 +1,214 @@
+"""
+Latency- and error-aware "auto" provider routing.
+
+Each provider keeps exponentially decayed averages of time-to-first-token, total
+latency and error rate (one model per provider: `start(provider)` can't choose
+between models). Old observations fade with a half-life, so a provider that was
+slow or failing an hour ago gets tried again. `auto` ranks the candidates at or
+above the requested quality tier by expected TTFT (penalised by recent errors)
+and falls back down the ranking when a provider fails before its first token.
+Streams closed on purpose (a lost hedge, a closed tab, an abandoned single
+flight) count as neither a success nor an error.
+
+    router = Router([Candidate("openai", "gpt-4", "premium"), ...])
+    for delta in router.stream(lambda provider: STREAMERS[provider](messages), min_tier="standard", token=token):
+        ...                                  # STREAMERS return (deltas, close)
+    gr.Markdown(router.dashboard, every=5)   # live stats panel
+"""
+
+import threading
+import time
+
+from common import tracing
+from common.cancellation import estimate_tokens, guarded
+
+TIERS = {"local": 0, "standard": 1, "premium": 2}
+HALF_LIFE = 300.0      # seconds for an old observation to lose half its weight
+ALPHA = 0.3            # minimum weight of each new observation
+PRIOR_TTFT = 1.0       # optimistic guess for untried providers, so they get explored
+ERROR_PENALTY = 4.0    # score multiplier per unit of error rate
+
+
+class Candidate:
+    __slots__ = ("provider", "model", "tier")
+
+    def __init__(self, provider, model, tier="standard"):
+        self.provider = provider
+        self.model = model
+        self.tier = tier
+
+
+class DecayedAverage:
+    __slots__ = ("value", "updated")
+
+    def __init__(self):
+        self.value = None
+        self.updated = 0.0
+
+    def update(self, x, now, half_life=HALF_LIFE):
+        if self.value is None:
+            self.value = x
+        else:
+            keep = min(1 - ALPHA, 0.5 ** ((now - self.updated) / half_life))
+            self.value = keep * self.value + (1 - keep) * x
+        self.updated = now
+
+    def decayed(self, now, half_life=HALF_LIFE):
+        """Value faded toward zero since the last update (used for error rates)."""
+        if self.value is None:
+            return 0.0
+        return self.value * 0.5 ** ((now - self.updated) / half_life)
+
+
+class ProviderStats:
+    __slots__ = ("ttft", "latency", "errors", "requests", "failures", "last_error")
+
+    def __init__(self):
+        self.ttft = DecayedAverage()
+        self.latency = DecayedAverage()
+        self.errors = DecayedAverage()
+        self.requests = 0
+        self.failures = 0
+        self.last_error = ""
+
+
+class Router:
+    def __init__(self, candidates, half_life=HALF_LIFE):
+        self.candidates = list(candidates)
+        self.half_life = half_life
+        self.stats = {c.provider: ProviderStats() for c in self.candidates}
+        self._lock = threading.Lock()
+
+    # ---------- Recording ----------
+    def record_first_token(self, provider, seconds):
+        with self._lock:
+            self.stats[provider].ttft.update(seconds, time.time(), self.half_life)
+
+    def record_success(self, provider, seconds):
+        now = time.time()
+        with self._lock:
+            stats = self.stats[provider]
+            stats.requests += 1
+            stats.latency.update(seconds, now, self.half_life)
+            stats.errors.update(0.0, now, self.half_life)
+
+    def record_error(self, provider, error):
+        with self._lock:
+            stats = self.stats[provider]
+            stats.requests += 1
+            stats.failures += 1
+            stats.errors.update(1.0, time.time(), self.half_life)
+            stats.last_error = str(error)[:120]
+
+    # ---------- Ranking ----------
+    def score(self, provider, now=None):
+        """Expected seconds to first token, inflated by the recent error rate (lower is better)."""
+        now = now or time.time()
+        stats = self.stats[provider]
+        ttft = stats.ttft.value if stats.ttft.value is not None else PRIOR_TTFT
+        return ttft * (1 + ERROR_PENALTY * stats.errors.decayed(now, self.half_life))
+
+    def rank(self, min_tier="standard"):
+        floor = TIERS.get(min_tier, 0)
+        now = time.time()
+        with self._lock:
+            eligible = [c for c in self.candidates if TIERS[c.tier] >= floor]
+            return sorted(eligible, key=lambda c: self.score(c.provider, now))
+
+    # ---------- Routing ----------
+    def track(self, provider, start):
+        """
+        Open `start()` -> (deltas, close) and return the deltas wrapped to record
+        TTFT, latency and errors for `provider`, with a `close` that also marks the
+        stream as cancelled, so the error it causes isn't blamed on the provider.
+        """
+        started = time.perf_counter()
+        try:
+            deltas, close = start()
+        except Exception as e:
+            self.record_error(provider, e)
+            raise
+        if close is None:
+            return self._tracked(provider, deltas, started), None
+        closed = threading.Event()
+
+        def close_on_purpose():
+            closed.set()
+            close()
+        return self._tracked(provider, deltas, started, closed), close_on_purpose
+
+    def _tracked(self, provider, deltas, started, closed=None):
+        model = next((c.model for c in self.candidates if c.provider == provider), "")
+        cancelled = None   # the error a close on purpose raised: re-raised outside the span, not recorded
+        with tracing.span("llm.stream", provider=provider, model=model) as span:
+            streamed = False
+            tokens = 0
+            try:
+                for delta in deltas:
+                    if not streamed and delta:
+                        ttft = time.perf_counter() - started
+                        self.record_first_token(provider, ttft)
+                        span.set(ttft_ms=round(1000 * ttft, 1))
+                        streamed = True
+                    tokens += estimate_tokens(delta or "")
+                    yield delta
+            except Exception as e:
+                if closed is None or not closed.is_set():
+                    self.record_error(provider, e)
+                    raise
+                cancelled = e
+            finally:
+                span.set(output_tokens=tokens)
+            if closed is not None and closed.is_set():
+                span.set(cancelled=True)
+            else:
+                self.record_success(provider, time.perf_counter() - started)
+        if cancelled is not None:
+            raise cancelled
+
+    def stream(self, start, min_tier="standard", token=None):
+        """
+        Yield text deltas from the best provider; `start(provider)` returns its
+        (delta iterator, close). A failure before the first token falls back to the
+        next candidate; after it, the error is raised (the partial reply is already
+        out). `token` cancels the stream in flight.
+        """
+        ranking = self.rank(min_tier)
+        if not ranking:
+            raise ValueError(f"No providers in tier '{min_tier}' or above")
+        last_error = None
+        for candidate in ranking:
+            if token and token.cancelled:
+                return
+            print(f"🧭 auto -> {candidate.provider} ({candidate.model})")
+            streamed = False
+            try:
+                deltas, close = self.track(candidate.provider, lambda: start(candidate.provider))
+                for delta in guarded(deltas, candidate.provider, close=close, token=token):
+                    streamed = streamed or bool(delta)
+                    yield delta
+                return
+            except Exception as e:
+                if streamed:
+                    raise
+                print(f"⚠️ {candidate.provider} failed ({e}); falling back")
+                last_error = e
+        raise last_error
+
+    # ---------- Dashboard ----------
+    def dashboard(self):
+        """Markdown table of the live stats, best candidate first."""
+        now = time.time()
+        lines = [
+            "| Provider | Model | Tier | TTFT | Latency | Error rate | Requests | Score | Last error |",
+            "|---|---|---|---|---|---|---|---|---|",
+        ]
+        for c in self.rank("local"):
+            stats = self.stats[c.provider]
+            ttft = f"{stats.ttft.value:.2f}s" if stats.ttft.value is not None else "–"
+            latency = f"{stats.latency.value:.2f}s" if stats.latency.value is not None else "–"
+            lines.append(
+                f"| {c.provider} | {c.model} | {c.tier} | {ttft} | {latency} | "
+                f"{stats.errors.decayed(now, self.half_life):.0%} | {stats.requests} | {self.score(c.provider, now):.2f} | {stats.last_error or '–'} |"
+            )
+        return "\n".join(lines)
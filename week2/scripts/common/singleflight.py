@@ -0,0 +1,187 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+When several users ask for the same thing at the same moment (a DALL-E sketch
+of Paris, the same translation, the same first question), each used to pay for
+its own upstream call. `SingleFlight` keys requests like a cache would; while a
+call for a key is in flight, identical requests attach to it instead of starting
+their own, and the one result fans out to every waiter. Nothing is cached after
+the call completes - the next request starts a fresh one.
+
+    flights = SingleFlight()
+
+    @flights.wrap(lambda city: ("dall-e-3", city.strip().lower()))
+    def artist(city): ...                      # concurrent artist("Paris") -> one image call
+
+    for delta in flights.stream(key, lambda: stream_openai(messages)):
+        ...                                    # one upstream stream, replayed to every subscriber
+
+`start()` returns (deltas, close); `close` is what shuts the upstream when the
+last subscriber leaves, even while the pump is blocked waiting for a chunk. A
+subscriber counts from the moment `stream()` returns, and an abandoned stream is
+dropped (ending with `StreamAbandoned`), so nobody joins a cancelled upstream.
+"""
+
+import functools
+import hashlib
+import json
+import threading
+
+from common.cancellation import CancelToken, guarded
+
+
+def make_key(*parts):
+    """Stable digest of arbitrary JSON-able request parts (model, messages, options...)."""
+    raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class StreamAbandoned(RuntimeError):
+    """Every subscriber left, so the shared upstream stream was cancelled."""
+
+
+class _Broadcast:
+    """A token stream recorded as it arrives; every subscriber replays it from the start."""
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self.subscribers = 0   # guarded by SingleFlight._lock, like the _streams entry
+        self.cond = threading.Condition()
+        self.token = CancelToken()
+
+    def publish(self, chunk):
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            if self.finished:
+                return   # abandonment finishes first; the pump's clean end after the cancel doesn't override it
+            self.finished, self.error = True, error
+            self.cond.notify_all()
+
+    def replay(self):
+        position = 0
+        while True:
+            with self.cond:
+                while position >= len(self.chunks) and not self.finished:
+                    self.cond.wait()
+                if position < len(self.chunks):
+                    chunk = self.chunks[position]
+                    position += 1
+                elif self.error is not None:
+                    raise self.error
+                else:
+                    return
+            yield chunk
+
+
+class SingleFlight:
+    def __init__(self, name="singleflight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    # ---------- Blocking calls ----------
+    def do(self, key, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` once per in-flight `key`; concurrent callers share the result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def wrap(self, key_fn):
+        """Decorator: coalesce calls whose `key_fn(*args, **kwargs)` match."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                return self.do(make_key(fn.__name__, key_fn(*args, **kwargs)), fn, *args, **kwargs)
+            return wrapper
+        return decorator
+
+    # ---------- Streams ----------
+    def stream(self, key, start):
+        """
+        Yield the deltas of one shared upstream stream per in-flight `key`. The first
+        caller's `start()` -> (deltas, close) runs in a background thread, so a
+        subscriber leaving doesn't cut off the others; the upstream is closed once
+        all have left.
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is None:
+                broadcast = self._streams[key] = _Broadcast()
+                self.calls += 1
+                threading.Thread(target=self._pump, args=(key, broadcast, start), daemon=True).start()
+            else:
+                self.coalesced += 1
+                print(f"🔗 {self.name}: joined an identical in-flight stream")
+            # counted here, not on the first next(): a caller that hasn't pulled yet
+            # still keeps the upstream alive when the others leave
+            broadcast.subscribers += 1
+        return self._subscription(key, broadcast)
+
+    def _subscription(self, key, broadcast):
+        try:
+            yield from broadcast.replay()
+        finally:
+            with self._lock:
+                broadcast.subscribers -= 1
+                abandoned = broadcast.subscribers == 0 and not broadcast.finished
+                if abandoned and self._streams.get(key) is broadcast:
+                    del self._streams[key]   # the next caller starts afresh instead of joining a cancelled stream
+            if abandoned:
+                broadcast.finish(StreamAbandoned(f"{self.name}: every subscriber left"))
+                broadcast.token.cancel()   # nobody is listening any more: stop the upstream stream
+
+    def _pump(self, key, broadcast, start):
+        error = None
+        try:
+            deltas, close = start()
+            for chunk in guarded(deltas, self.name, close=close, token=broadcast.token):
+                broadcast.publish(chunk)
+        except Exception as e:
+            error = e
+        finally:
+            with self._lock:
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+            broadcast.finish(error)
+
+    def report(self):
+        total = self.calls + self.coalesced
+        rate = self.coalesced / total if total else 0.0
+        return f"{self.name}: {total} requests, {self.calls} upstream calls, {self.coalesced} coalesced ({rate:.0%})"
@@ -0,0 +1,271 @@
+"""
+Write-behind output sink: transcripts, brochures, images and logs saved off the
+request thread.
+
+Handlers used to open and write files inline, into output folders that only
+grew: the same image saved twice, session files with suffixed copies. An
+`OutputSink` owns one output directory. `write()` and `append()` return at once
+and a background thread does the disk work:
+
+  - payloads are content-hashed; writing bytes the sink already holds returns
+    the existing file's path instead of storing a copy
+  - append-only logs (chatlog.md, usage_log.csv) rotate past `rotate_bytes`,
+    and the rotated file is gzipped
+  - transcripts older than `compress_after` seconds are gzipped in place
+  - past `max_bytes` the oldest files are deleted
+  - manifest.json indexes every file (hash, size, kind, creation time)
+
+    outputs = sink.get("output")
+    path = outputs.write(f"convo_{timestamp}.md", markdown)   # returns immediately
+    outputs.append("chatlog.md", entry)
+
+Pending writes are flushed at interpreter exit; `flush()` waits for them sooner.
+"""
+
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+
+MANIFEST = "manifest.json"
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+DEFAULT_ROTATE_BYTES = 5 * 1024 * 1024
+DEFAULT_COMPRESS_AFTER = 24 * 3600
+MAINTENANCE_INTERVAL = 60.0            # seconds between compression/size-cap passes
+COMPRESSIBLE = (".md", ".txt", ".csv", ".json", ".jsonl")
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class OutputSink:
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES, rotate_bytes=DEFAULT_ROTATE_BYTES,
+                 compress_after=DEFAULT_COMPRESS_AFTER):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.rotate_bytes = rotate_bytes
+        self.compress_after = compress_after
+        self.entries = {}          # name (relative to root) -> {"sha256", "bytes", "kind", "created"}
+        self._by_hash = {}         # sha256 -> name
+        self.deduplicated = 0
+        self.bytes_saved = 0
+        self.compressed = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._last_maintenance = 0.0
+        self._load_manifest()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"sink:{root}")
+        self._thread.start()
+        atexit.register(self.close)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    # ---------- Request side: bookkeeping only, the worker does the I/O ----------
+    def write(self, name, data, kind="file", replace=False):
+        """
+        Queue `data` (str or bytes) for `name` under the root; returns the path it
+        will live at. Identical content already in the sink returns that file's
+        path. A different payload under a taken name gets a -1, -2... suffix,
+        unless `replace` (for "latest" files).
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        digest = _digest(data)
+        with self._lock:
+            existing = self._by_hash.get(digest)
+            if existing is not None and (not replace or existing == name):
+                self.deduplicated += 1
+                self.bytes_saved += len(data)
+                return self.path(existing)
+            if not replace:
+                name = self._free_name(name)
+            old = self.entries.get(name)
+            if old is not None and self._by_hash.get(old.get("sha256")) == name:
+                del self._by_hash[old["sha256"]]
+            self.entries[name] = {"sha256": digest, "bytes": len(data), "kind": kind, "created": time.time()}
+            if not replace:   # a file that gets overwritten can't stand in for others
+                self._by_hash[digest] = name
+        self._queue.put(("write", name, data))
+        return self.path(name)
+
+    def append(self, name, text):
+        """Queue a line/record for an append-only log; rotated by size, never deduplicated."""
+        if isinstance(text, str):
+            text = text.encode("utf-8")
+        self._queue.put(("append", name, text))
+        return self.path(name)
+
+    def _free_name(self, name):
+        stem, ext = os.path.splitext(name)
+        candidate, n = name, 0
+        while (candidate in self.entries or candidate + ".gz" in self.entries
+               or os.path.exists(self.path(candidate))):
+            n += 1
+            candidate = f"{stem}-{n}{ext}"
+        return candidate
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is on disk (True) or `timeout` passes (False)."""
+        done = threading.Event()
+        self._queue.put(("flush", done, None))
+        return done.wait(timeout)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=30)
+
+    # ---------- Background thread ----------
+    def _run(self):
+        while True:
+            op = self._queue.get()
+            if op is None:
+                self._save_manifest()
+                return
+            action, name, data = op
+            try:
+                if action == "write":
+                    self._write_file(name, data)
+                elif action == "append":
+                    self._append(name, data)
+            except OSError as e:
+                print(f"⚠️ Output sink could not {action} {name}: {e}")
+            if action == "flush" or self._queue.empty():
+                self._maintain()
+                self._save_manifest()
+            if action == "flush":
+                name.set()
+
+    def _write_file(self, name, data):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _append(self, name, data):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as f:
+            f.write(data)
+            size = f.tell()
+        with self._lock:
+            entry = self.entries.setdefault(name, {"sha256": None, "bytes": 0, "kind": "log", "created": time.time()})
+            entry["bytes"] = size
+        if size >= self.rotate_bytes:
+            self._rotate(name)
+
+    def _rotate(self, name):
+        stem, ext = os.path.splitext(name)
+        with self._lock:
+            rotated = self._free_name(f"{stem}.{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}")
+            os.replace(self.path(name), self.path(rotated))
+            entry = self.entries.pop(name)
+            entry["kind"] = "rotated"
+            self.entries[rotated] = entry
+        self._compress(rotated)
+        print(f"🗜️ Rotated {name} -> {rotated}.gz")
+
+    def _compress(self, name):
+        path = self.path(name)
+        with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+        size = os.path.getsize(path + ".gz")
+        with self._lock:
+            entry = self.entries.pop(name)
+            entry["bytes"] = size
+            self.entries[name + ".gz"] = entry
+            if entry.get("sha256") and self._by_hash.get(entry["sha256"]) == name:
+                self._by_hash[entry["sha256"]] = name + ".gz"
+        self.compressed += 1
+
+    def _maintain(self):
+        now = time.time()
+        if now - self._last_maintenance < MAINTENANCE_INTERVAL:
+            return
+        self._last_maintenance = now
+        with self._lock:
+            stale = [name for name, e in self.entries.items()
+                     if e["kind"] == "transcript" and name.endswith(COMPRESSIBLE)
+                     and now - e["created"] > self.compress_after]
+        for name in stale:
+            try:
+                self._compress(name)
+            except OSError as e:
+                print(f"⚠️ Could not compress {name}: {e}")
+        self._enforce_cap()
+
+    def _enforce_cap(self):
+        with self._lock:
+            total = sum(e["bytes"] for e in self.entries.values())
+            # live logs are still being appended to; everything else goes oldest first
+            victims = sorted((e["created"], name) for name, e in self.entries.items() if e["kind"] != "log")
+        for _, name in victims:
+            if total <= self.max_bytes:
+                break
+            with self._lock:
+                entry = self.entries.pop(name)
+                if self._by_hash.get(entry.get("sha256")) == name:
+                    del self._by_hash[entry["sha256"]]
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+            total -= entry["bytes"]
+            self.evicted += 1
+            print(f"🧹 Output cap: removed {name}")
+
+    # ---------- Manifest ----------
+    def _load_manifest(self):
+        try:
+            with open(self.path(MANIFEST), encoding="utf-8") as f:
+                entries = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            return
+        for name, entry in entries.items():
+            if os.path.exists(self.path(name)):
+                self.entries[name] = entry
+                if entry.get("sha256"):
+                    self._by_hash[entry["sha256"]] = name
+
+    def _save_manifest(self):
+        with self._lock:
+            payload = {"updated": datetime.now().isoformat(timespec="seconds"), "entries": dict(self.entries)}
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp = self.path(MANIFEST + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f, indent=1)
+            os.replace(tmp, self.path(MANIFEST))
+        except OSError as e:
+            print(f"⚠️ Could not save the output manifest: {e}")
+
+    def report(self):
+        with self._lock:
+            files, size = len(self.entries), sum(e["bytes"] for e in self.entries.values())
+        return (f"💾 {self.root}: {files} files, {size / 1e6:.1f} MB, {self.deduplicated} duplicates skipped "
+                f"({self.bytes_saved / 1e6:.1f} MB), {self.compressed} compressed, {self.evicted} evicted")
+
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+def get(root="output", **limits):
+    """The shared sink for a directory (created on first use; `limits` apply then)."""
+    key = os.path.abspath(root)
+    with _sinks_lock:
+        if key not in _sinks:
+            _sinks[key] = OutputSink(root, **limits)
+        return _sinks[key]
@@ -0,0 +1,387 @@
+"""
+Live operational metrics for the Gradio apps, in Prometheus text format or JSON.
+
+The numbers come from the tracing spans the apps already open, so load tests,
+trace waterfalls and dashboards all read the same source. A listener on the
+tracer turns each span into metrics as it starts and ends:
+
+  traced handlers   requests, in-flight requests, latency, time to first output
+  llm.* spans       requests, TTFT and latency per provider/model, tokens/second
+  tool spans        calls and latency per tool
+  cache_hit attrs   hit/miss counts per cache (e.g. the price fast path)
+  image/tts/transcription spans   media calls per kind and model
+
+plus gauges read at scrape time, such as the rate limiter's queue depth and the
+hedge counts per provider pair.
+`serve()` starts a small HTTP server next to the Gradio app:
+
+    from common import telemetry
+    telemetry.serve()         # http://127.0.0.1:9464/metrics and /metrics.json
+    ui.launch()
+
+METRICS_PORT picks another port ("off" disables the server). A Prometheus
+scrape config only needs `static_configs: [{targets: ["localhost:9464"]}]`.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common import tracing
+
+DEFAULT_PORT = os.getenv("METRICS_PORT", "9464")
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 80, 160, 320)
+MEDIA_SPANS = {"image", "tts", "transcription"}
+# model name prefixes -> provider, for spans that only know the model
+PROVIDER_PREFIXES = (
+    ("gpt", "openai"), ("dall-e", "openai"), ("tts", "openai"), ("whisper", "openai"),
+    ("claude", "anthropic"), ("gemini", "google"), ("deepseek", "deepseek"),
+    ("command", "cohere"), ("cohere", "cohere"), ("llama", "ollama"),
+)
+# the apps' own provider names -> the company, so labels agree across apps
+PROVIDER_ALIASES = {"gpt": "openai", "claude": "anthropic", "gemini": "google"}
+
+
+def provider_of(model):
+    model = (model or "").lower()
+    for prefix, provider in PROVIDER_PREFIXES:
+        if model.startswith(prefix):
+            return provider
+    return "unknown"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ---------- Metric types ----------
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return sorted(self._values.items())
+
+    def render(self):
+        return [f"{self.name}{_labels(self.labels, k)} {_number(v)}" for k, v in self.samples()]
+
+    def snapshot(self):
+        return [{"labels": dict(zip(self.labels, k)), "value": v} for k, v in self.samples()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class CallbackGauge(Gauge):
+    """Read at scrape time: `read()` returns {label values tuple: value}."""
+
+    def __init__(self, name, help, labels, read):
+        super().__init__(name, help, labels)
+        self.read = read
+
+    def samples(self):
+        try:
+            return sorted((tuple(map(str, k)), v) for k, v in self.read().items())
+        except Exception as e:
+            print(f"⚠️ Metric {self.name} unavailable: {e}")
+            return []
+
+
+class _Series:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = _Series(len(self.buckets))
+            series.counts[bisect.bisect_left(self.buckets, value)] += 1
+            series.sum += value
+            series.count += 1
+
+    def samples(self):
+        with self._lock:
+            return sorted((k, (list(s.counts), s.sum, s.count)) for k, s in self._values.items())
+
+    def quantile(self, q, counts, count):
+        """Linear interpolation inside the bucket holding the q-th observation."""
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(counts):
+            if seen + n >= rank and n:
+                upper = self.buckets[i]
+                lower = self.buckets[i - 1] if i else 0.0
+                if upper == float("inf"):
+                    return lower
+                return round(lower + (upper - lower) * (rank - seen) / n, 6)
+            seen += n
+        return None
+
+    def render(self):
+        lines = []
+        for key, (counts, total, count) in self.samples():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+    def snapshot(self):
+        out = []
+        for key, (counts, total, count) in self.samples():
+            out.append({
+                "labels": dict(zip(self.labels, key)), "count": count, "sum": round(total, 6),
+                "p50": self.quantile(0.5, counts, count), "p95": self.quantile(0.95, counts, count),
+                "buckets": {_number(b): n for b, n in zip(self.buckets, counts)},
+            })
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Gauge(name, help, labels))
+
+    def gauge_callback(self, name, help, labels, read):
+        return self._add(CallbackGauge(name, help, labels, read))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines += metric.header() + metric.render()
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: {"type": m.kind, "help": m.help, "samples": m.snapshot()} for m in metrics}
+
+
+registry = Registry()
+
+requests_total = registry.counter("app_requests_total", "Handler calls by outcome", ("handler", "status"))
+in_flight = registry.gauge("app_requests_in_flight", "Handler calls currently running", ("handler",))
+request_seconds = registry.histogram("app_request_duration_seconds", "Handler wall time", ("handler",))
+first_output_seconds = registry.histogram("app_first_output_seconds",
+                                          "Time until a streaming handler's first update", ("handler",))
+llm_requests_total = registry.counter("llm_requests_total", "Model calls by outcome",
+                                      ("provider", "model", "status"))
+llm_ttft_seconds = registry.histogram("llm_time_to_first_token_seconds", "Model time to first token",
+                                      ("provider", "model"))
+llm_seconds = registry.histogram("llm_request_duration_seconds", "Model call wall time", ("provider", "model"))
+llm_output_tokens = registry.counter("llm_output_tokens_total", "Streamed output tokens (estimated)",
+                                     ("provider", "model"))
+llm_tokens_per_second = registry.histogram("llm_output_tokens_per_second", "Output rate after the first token",
+                                           ("provider", "model"), RATE_BUCKETS)
+tool_calls_total = registry.counter("tool_calls_total", "Tool calls by outcome", ("tool", "status"))
+tool_seconds = registry.histogram("tool_duration_seconds", "Tool call wall time", ("tool",))
+cache_lookups_total = registry.counter("cache_lookups_total", "Cache lookups by result", ("cache", "result"))
+media_requests_total = registry.counter("media_requests_total", "Image, TTS and transcription calls",
+                                        ("kind", "model", "status"))
+media_seconds = registry.histogram("media_request_duration_seconds", "Image, TTS and transcription wall time",
+                                   ("kind", "model"))
+
+
+# ---------- Spans -> metrics ----------
+def _status(span):
+    if span.error:
+        return "error"
+    if span.attributes.get("cancelled"):
+        return "cancelled"
+    if span.attributes.get("skipped"):
+        return "skipped"
+    return "ok"
+
+
+class SpanMetrics:
+    def on_start(self, span):
+        if span.handler:
+            in_flight.inc(handler=span.name)
+
+    def on_end(self, span):
+        seconds = (span.end_ns - span.start_ns) / 1e9
+        attrs = span.attributes
+        status = _status(span)
+
+        if span.handler:
+            in_flight.dec(handler=span.name)
+            requests_total.inc(handler=span.name, status=status)
+            request_seconds.observe(seconds, handler=span.name)
+            if "first_output_ms" in attrs:
+                first_output_seconds.observe(attrs["first_output_ms"] / 1000, handler=span.name)
+
+        if "cache_hit" in attrs:
+            cache_lookups_total.inc(cache=span.name, result="hit" if attrs["cache_hit"] else "miss")
+
+        if span.name.startswith("llm."):
+            model = attrs.get("model", "")
+            provider = attrs.get("provider") or provider_of(model)
+            labels = {"provider": PROVIDER_ALIASES.get(provider, provider), "model": model}
+            llm_requests_total.inc(status=status, **labels)
+            llm_seconds.observe(seconds, **labels)
+            ttft = attrs.get("ttft_ms")
+            if ttft is not None:
+                llm_ttft_seconds.observe(ttft / 1000, **labels)
+            tokens = attrs.get("output_tokens")
+            if tokens:
+                llm_output_tokens.inc(tokens, **labels)
+                generating = seconds - (ttft or 0) / 1000
+                if generating > 0:
+                    llm_tokens_per_second.observe(tokens / generating, **labels)
+        elif span.name == "tool":
+            tool = attrs.get("tool", "")
+            tool_calls_total.inc(tool=tool, status=status)
+            tool_seconds.observe(seconds, tool=tool)
+        elif span.name in MEDIA_SPANS:
+            model = attrs.get("model", "")
+            media_requests_total.inc(kind=span.name, model=model, status=status)
+            if status != "skipped":
+                media_seconds.observe(seconds, kind=span.name, model=model)
+
+
+_listener = SpanMetrics()
+
+
+def enable():
+    """Start collecting from spans (implied by `serve()`; also used by the benchmarks)."""
+    tracing.tracer.add_listener(_listener)
+
+
+def render():
+    return registry.render()
+
+
+def snapshot():
+    return registry.snapshot()
+
+
+# ---------- HTTP endpoint ----------
+def _make_handler():
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, body, content_type, status=200):
+            data = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/metrics":
+                self._send(render(), "text/plain; version=0.0.4; charset=utf-8")
+            elif path == "/metrics.json":
+                payload = {"time": time.time(), "metrics": snapshot()}
+                self._send(json.dumps(payload, indent=2), "application/json")
+            else:
+                self._send("try /metrics or /metrics.json\n", "text/plain", 404)
+
+    return Handler
+
+
+_server = {}
+
+
+def serve(port=None, host="127.0.0.1"):
+    """Collect metrics and serve them in a background thread; returns the base URL (or None)."""
+    enable()
+    port = DEFAULT_PORT if port is None else port
+    if str(port).lower() == "off":
+        return None
+    if "httpd" not in _server:
+        try:
+            httpd = ThreadingHTTPServer((host, int(port)), _make_handler())
+        except OSError as e:
+            print(f"⚠️ Metrics endpoint not started on port {port}: {e}")
+            return None
+        httpd.daemon_threads = True
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        _server["httpd"] = httpd
+        host, port = httpd.server_address[:2]
+        print(f"📈 Metrics at http://{host}:{port}/metrics (JSON: /metrics.json)")
+    host, port = _server["httpd"].server_address[:2]
+    return f"http://{host}:{port}"
@@ -0,0 +1,104 @@
+"""
+Streaming detection of simulated tool calls (`TOOL:get_ticket_price("Paris")`).
+
+Providers without native tool calling (Ollama, Cohere, Gemini, ...) are told to
+answer with a `TOOL:` marker. Matching that with a regex over the *complete*
+response forces every provider to be non-streaming. `ToolMarkerParser` instead
+scans token deltas with a small state machine:
+
+    TEXT    pass characters straight through; hold back only a possible "TOOL:" prefix
+    CALL    after "TOOL:", buffer until `name("arg")` is complete, then run the tool
+            and emit its result in place of the marker
+
+A false alarm ("TOOLS are great", a marker that never closes) is released as
+plain text, so nothing the model says is lost.
+"""
+
+import re
+
+MARKER = "TOOL:"
+CALL_RE = re.compile(r'\s*(\w+)\("([^"]*)"\)')
+MAX_CALL_CHARS = 200   # give up on a marker that never closes
+
+TEXT, CALL = "text", "call"
+
+
+class ToolMarkerParser:
+    """
+    `tools` maps a tool name to `fn(argument) -> str`; the returned text replaces
+    the marker in the output stream.
+    """
+
+    def __init__(self, tools):
+        self.tools = tools
+        self.state = TEXT
+        self.held = ""
+        self.calls = []   # (name, argument) of every executed tool
+
+    def feed(self, delta):
+        """Consume one token delta and return the text that is safe to show now."""
+        out = []
+        for char in delta or "":
+            if self.state == TEXT:
+                self._feed_text(char, out)
+            else:
+                self._feed_call(char, out)
+        return "".join(out)
+
+    def flush(self):
+        """End of stream: release anything still held back."""
+        text = self.held if self.state == TEXT else MARKER + self.held
+        self.held = ""
+        self.state = TEXT
+        return text
+
+    # ---------- States ----------
+    def _feed_text(self, char, out):
+        candidate = self.held + char
+        if MARKER.startswith(candidate):
+            if candidate == MARKER:
+                self.state, self.held = CALL, ""
+            else:
+                self.held = candidate
+            return
+        # not a marker after all: release what we held and re-check this char
+        out.append(self.held)
+        self.held = ""
+        if MARKER.startswith(char):
+            self.held = char
+        else:
+            out.append(char)
+
+    def _feed_call(self, char, out):
+        self.held += char
+        if char == ")":
+            match = CALL_RE.fullmatch(self.held)
+            if match:
+                out.append(self._run(match.group(1), match.group(2)))
+                self.state, self.held = TEXT, ""
+                return
+        if char == "\n" or len(self.held) > MAX_CALL_CHARS:
+            out.append(MARKER + self.held)
+            self.state, self.held = TEXT, ""
+
+    def _run(self, name, argument):
+        fn = self.tools.get(name)
+        if fn is None:
+            return f'{MARKER}{name}("{argument}")'
+        self.calls.append((name, argument))
+        return fn(argument)
+
+
+def stream_with_tools(deltas, tools):
+    """Wrap an iterator of token deltas; yields the cumulative reply with tool markers resolved."""
+    parser = ToolMarkerParser(tools)
+    reply = ""
+    for delta in deltas:
+        text = parser.feed(delta)
+        if text:
+            reply += text
+            yield reply
+    tail = parser.flush()
+    if tail:
+        reply += tail
+        yield reply
@@ -0,0 +1,160 @@
+"""
+Decorator-based tool registry for OpenAI tool calling.
+
+    tools = ToolRegistry()
+
+    @tools.register("Get the price of a return ticket to the destination city.",
+                    destination_city="The city the customer wants to fly to.")
+    def get_ticket_price(destination_city: str):
+        ...
+
+The JSON schema for each tool is generated from the function signature once, at
+import time, and `tools.schemas` hands the same cached list to every request.
+`tools.run_all(tool_calls)` validates the arguments and runs the calls of one
+model turn concurrently on a thread pool, recording how long each tool took.
+"""
+
+import contextvars
+import inspect
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import tracing
+
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+
+
+class ToolError(ValueError):
+    """Raised when the model calls an unknown tool or sends bad arguments."""
+
+
+class Tool:
+    def __init__(self, fn, description, param_descriptions):
+        self.fn = fn
+        self.name = fn.__name__
+        self.params = {}
+        self.required = []
+
+        properties = {}
+        for name, param in inspect.signature(fn).parameters.items():
+            py_type = param.annotation if param.annotation in JSON_TYPES else str
+            self.params[name] = py_type
+            properties[name] = {"type": JSON_TYPES[py_type]}
+            if name in param_descriptions:
+                properties[name]["description"] = param_descriptions[name]
+            if param.default is inspect.Parameter.empty:
+                self.required.append(name)
+
+        function = {
+            "name": self.name,
+            "description": description or (inspect.getdoc(fn) or "").split("\n")[0],
+            "parameters": {"type": "object", "properties": properties, "required": self.required},
+        }
+        self.schema = {"type": "function", "function": function}
+
+    def validate(self, arguments):
+        """Parse the JSON arguments string, check required fields and coerce types."""
+        try:
+            args = json.loads(arguments or "{}")
+        except json.JSONDecodeError as e:
+            raise ToolError(f"{self.name}: arguments are not valid JSON ({e})")
+        if not isinstance(args, dict):
+            raise ToolError(f"{self.name}: arguments must be a JSON object")
+
+        missing = [name for name in self.required if args.get(name) in (None, "")]
+        if missing:
+            raise ToolError(f"{self.name}: missing required argument(s) {', '.join(missing)}")
+
+        clean = {}
+        for name, value in args.items():
+            if name not in self.params:
+                continue  # models sometimes invent extra fields; ignore them
+            py_type = self.params[name]
+            if py_type is str:
+                value = str(value).strip()
+            elif py_type in (int, float) and not isinstance(value, bool):
+                try:
+                    value = py_type(value)
+                except (TypeError, ValueError):
+                    raise ToolError(f"{self.name}: {name} must be a {JSON_TYPES[py_type]}")
+            elif not isinstance(value, py_type):
+                raise ToolError(f"{self.name}: {name} must be a {JSON_TYPES[py_type]}")
+            clean[name] = value
+        return clean
+
+
+class ToolRegistry:
+    def __init__(self, max_workers=4):
+        self._tools = {}
+        self._schemas = []
+        self._latency = {}
+        self._lock = threading.Lock()
+        self._max_workers = max_workers
+        self._pool = None
+
+    # ---------- Registration ----------
+    def register(self, description=None, **param_descriptions):
+        """Decorator: add a function as a tool. The function itself is returned unchanged."""
+        def decorator(fn):
+            tool = Tool(fn, description, param_descriptions)
+            self._tools[tool.name] = tool
+            self._schemas.append(tool.schema)
+            return fn
+        return decorator
+
+    @property
+    def schemas(self):
+        """Cached `tools=[...]` list for chat.completions.create()."""
+        return self._schemas
+
+    def names(self):
+        return list(self._tools)
+
+    # ---------- Execution ----------
+    def call(self, tool_call):
+        """Run one tool call and return the role="tool" message for it."""
+        name = tool_call.function.name
+        start = time.perf_counter()
+        with tracing.span("tool", tool=name) as span:
+            try:
+                tool = self._tools.get(name)
+                if tool is None:
+                    raise ToolError(f"Unknown tool: {name}")
+                result = tool.fn(**tool.validate(tool_call.function.arguments))
+                content = result if isinstance(result, str) else json.dumps(result)
+            except Exception as e:
+                content = json.dumps({"error": str(e)})
+                span.record_error(e)
+            finally:
+                self._record(name, time.perf_counter() - start)
+            span.set(bytes=len(content))
+        return {"role": "tool", "tool_call_id": tool_call.id, "content": content}
+
+    def run_all(self, tool_calls):
+        """Run every tool call from one model turn concurrently; results keep the call order."""
+        if len(tool_calls) <= 1:
+            return [self.call(tc) for tc in tool_calls]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="tool")
+        # each call gets a copy of the caller's context, so its span nests under the current one
+        contexts = [contextvars.copy_context() for _ in tool_calls]
+        return list(self._pool.map(lambda ctx, tc: ctx.run(self.call, tc), contexts, tool_calls))
+
+    # ---------- Latency stats ----------
+    def _record(self, name, seconds):
+        with self._lock:
+            self._latency.setdefault(name, []).append(seconds)
+
+    def latency_report(self):
+        """{tool: {"calls": n, "avg_ms": ..., "max_ms": ...}}"""
+        with self._lock:
+            return {
+                name: {
+                    "calls": len(times),
+                    "avg_ms": round(1000 * sum(times) / len(times), 2),
+                    "max_ms": round(1000 * max(times), 2),
+                }
+                for name, times in self._latency.items()
+            }
@@ -0,0 +1,344 @@
+"""
+Stage-level tracing: where each second of a slow turn goes.
+
+Handlers are wrapped with `@tracing.traced()`; the stages inside open spans and
+attach what they learn along the way (model, tokens, bytes, cache hits...):
+
+    @tracing.traced("stream_brochure")
+    def stream_brochure(company_name, url, model):
+        with tracing.span("scrape", url=url) as span:
+            website = Website(url)
+            span.set(bytes=len(website.text))
+        ...
+
+Spans nest through a context variable. A traced generator keeps its own context
+across yields, so streaming handlers trace correctly even when Gradio steps them
+on different threads; the tool registry copies the context into its pool.
+
+When a request's root span ends, the trace goes to the exporters named in
+TRACE_EXPORT (comma-separated):
+  console          a waterfall per request on stdout
+  file[:path]      OTLP/JSON lines (default output/traces.jsonl), the format the
+                   OpenTelemetry collector's otlpjsonfile receiver reads
+Unset or "off" turns spans into no-ops, unless a listener (e.g. common.telemetry)
+wants every span as it starts and ends. Waterfalls from a trace file:
+
+    python -m common.tracing output/traces.jsonl --last 5
+"""
+
+import argparse
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+
+DEFAULT_TRACE_FILE = os.path.join("output", "traces.jsonl")
+BAR_WIDTH = 30
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self.lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "trace", "span_id", "parent", "attributes", "error",
+                 "start_ns", "end_ns", "handler", "_started", "_previous")
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.parent = _current.get()
+        self.trace = self.parent.trace if self.parent else Trace()
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes)
+        self.error = None
+        self.start_ns = self.end_ns = None
+        self.handler = False   # a request entering the app (set by traced), not a stage inside one
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def record_error(self, error):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter_ns()
+        self._previous = _current.get()
+        _current.set(self)
+        self.tracer.notify("on_start", self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = self.start_ns + time.perf_counter_ns() - self._started
+        if exc_type is GeneratorExit:
+            self.attributes["cancelled"] = True     # the consumer stopped reading
+        elif exc is not None and self.error is None:
+            self.record_error(exc)
+        # restore by value: a span may close in a different context than it opened in
+        _current.set(self._previous)
+        with self.trace.lock:
+            self.trace.spans.append(self)
+        self.tracer.notify("on_end", self)
+        if self.parent is None:
+            self.tracer.export(self.trace)
+        return False
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        return self
+
+    def record_error(self, error):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP = _NoopSpan()
+
+
+class Tracer:
+    def __init__(self, exporters=(), service="week2-scripts"):
+        self.exporters = list(exporters)
+        self.listeners = []
+        self.service = service
+
+    @classmethod
+    def from_env(cls, value=None, service="week2-scripts"):
+        value = os.getenv("TRACE_EXPORT", "") if value is None else value
+        exporters = []
+        for part in filter(None, (p.strip() for p in value.split(","))):
+            kind, _, target = part.partition(":")
+            if kind == "console":
+                exporters.append(ConsoleExporter())
+            elif kind == "file":
+                exporters.append(FileExporter(target or DEFAULT_TRACE_FILE, service))
+            elif kind != "off":
+                print(f"⚠️ Unknown TRACE_EXPORT entry '{part}' ignored")
+        return cls(exporters, service)
+
+    @property
+    def enabled(self):
+        return bool(self.exporters or self.listeners)
+
+    def add_listener(self, listener):
+        """`listener.on_start(span)` / `listener.on_end(span)` are called for every span."""
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def notify(self, event, span):
+        for listener in self.listeners:
+            try:
+                getattr(listener, event)(span)
+            except Exception as e:
+                print(f"⚠️ Span listener failed: {e}")
+
+    def span(self, name, **attributes):
+        """Context manager for one stage; a child of the current span, or a new trace."""
+        return Span(self, name, attributes) if self.enabled else NOOP
+
+    def _handler_span(self, name, attributes):
+        span = self.span(name, **attributes)
+        if span is not NOOP:
+            span.handler = span.parent is None
+        return span
+
+    def traced(self, name=None, **attributes):
+        """Decorator: run a function (or every step of a generator) inside a root span."""
+        def decorator(fn):
+            span_name = name or fn.__name__
+
+            if inspect.isgeneratorfunction(fn):
+                @functools.wraps(fn)
+                def generator(*args, **kwargs):
+                    if not self.enabled:
+                        return (yield from fn(*args, **kwargs))
+                    context = contextvars.copy_context()
+                    span = context.run(self._handler_span, span_name, attributes)
+                    context.run(span.__enter__)
+                    started = time.perf_counter()
+                    steps = fn(*args, **kwargs)
+                    try:
+                        while True:
+                            try:
+                                item = context.run(next, steps)
+                            except StopIteration as stop:
+                                return stop.value
+                            if started is not None:
+                                span.set(first_output_ms=round(1000 * (time.perf_counter() - started), 1))
+                                started = None
+                            yield item
+                    except GeneratorExit:
+                        span.set(cancelled=True)
+                        raise
+                    except Exception as e:
+                        span.record_error(e)
+                        raise
+                    finally:
+                        context.run(steps.close)
+                        context.run(span.__exit__, None, None, None)
+                return generator
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self._handler_span(span_name, attributes):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def export(self, trace):
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception as e:
+                print(f"⚠️ Trace export failed: {e}")
+
+
+def current_span():
+    """The innermost open span (or a no-op), for adding attributes from deep inside a stage."""
+    return _current.get() or NOOP
+
+
+# ---------- OTLP/JSON ----------
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _plain_value(value):
+    if "intValue" in value:
+        return int(value["intValue"])
+    return next(iter(value.values()))
+
+
+def to_otlp(trace, service):
+    spans = []
+    for span in trace.spans:
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent.span_id if span.parent else "",
+            "name": span.name,
+            "kind": 1,   # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]},
+        "scopeSpans": [{"scope": {"name": "common.tracing"}, "spans": spans}],
+    }]}
+
+
+def records_from_trace(trace):
+    return [{"id": s.span_id, "parent": s.parent.span_id if s.parent else "", "name": s.name,
+             "start": s.start_ns, "end": s.end_ns, "attributes": s.attributes, "error": s.error}
+            for s in trace.spans]
+
+
+def records_from_otlp(payload):
+    records = []
+    for resource in payload.get("resourceSpans", []):
+        for scope in resource.get("scopeSpans", []):
+            for s in scope.get("spans", []):
+                records.append({
+                    "id": s["spanId"], "parent": s.get("parentSpanId", ""), "name": s["name"],
+                    "start": int(s["startTimeUnixNano"]), "end": int(s["endTimeUnixNano"]),
+                    "attributes": {a["key"]: _plain_value(a["value"]) for a in s.get("attributes", [])},
+                    "error": s.get("status", {}).get("message") if s.get("status", {}).get("code") == 2 else None,
+                })
+    return records
+
+
+# ---------- Waterfall ----------
+def waterfall(records):
+    """Text waterfall of one trace: a row per span, indented by depth, bars on a shared time axis."""
+    ids = {r["id"] for r in records}
+    children = {}
+    for r in records:
+        parent = r["parent"] if r["parent"] in ids else ""
+        children.setdefault(parent, []).append(r)
+    roots = sorted(children.get("", []), key=lambda r: r["start"])
+    if not roots:
+        return ""
+    origin = min(r["start"] for r in records)
+    total = max(max(r["end"] for r in records) - origin, 1)
+
+    lines = [f"🧭 {roots[0]['name']}  {total / 1e9:.3f}s"]
+
+    def row(r, depth):
+        start = (r["start"] - origin) / total * BAR_WIDTH
+        width = (r["end"] - r["start"]) / total * BAR_WIDTH
+        bar = " " * int(start) + ("█" * max(1, round(width)) if width >= 0.5 else "▏")
+        attrs = " ".join(f"{k}={v}" for k, v in r["attributes"].items())
+        status = f"  ❌ {r['error']}" if r["error"] else ""
+        label = "  " * depth + r["name"]
+        lines.append(f"  {label:<28} {(r['end'] - r['start']) / 1e6:9.1f}ms |{bar:<{BAR_WIDTH}}| {attrs}{status}")
+        for child in sorted(children.get(r["id"], []), key=lambda c: c["start"]):
+            row(child, depth + 1)
+
+    for root in roots:
+        row(root, 0)
+    return "\n".join(lines)
+
+
+class ConsoleExporter:
+    def export(self, trace):
+        print(waterfall(records_from_trace(trace)))
+
+
+class FileExporter:
+    def __init__(self, path=DEFAULT_TRACE_FILE, service="week2-scripts"):
+        self.path = path
+        self.service = service
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        line = json.dumps(to_otlp(trace, self.service), ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+tracer = Tracer.from_env()
+span = tracer.span
+traced = tracer.traced
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Waterfalls from an OTLP/JSON trace file")
+    parser.add_argument("path", nargs="?", default=DEFAULT_TRACE_FILE)
+    parser.add_argument("--last", type=int, default=10, help="how many of the most recent traces")
+    args = parser.parse_args()
+
+    with open(args.path, encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+    for line in lines[-args.last:]:
+        print(waterfall(records_from_otlp(json.loads(line))))
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Incremental (streaming) speech-to-text for the FlightAI microphone.
+
+Gradio's streaming `gr.Audio` hands us small numpy chunks while the user is still
+talking. `StreamingTranscriber` buffers them into fixed-size windows, ships each
+window to a background worker that calls Whisper, and stitches the partial
+transcripts together. When recording stops only the last (short) window is still
+in flight, so the final transcript is ready almost immediately.
+"""
+
+import io
+import queue
+import re
+import threading
+import time
+import wave
+
+# ---------- Tunables ----------
+CHUNK_SECONDS = 2.0      # audio per Whisper request
+OVERLAP_SECONDS = 0.3    # carried into the next window so words are not cut in half
+PROMPT_CHARS = 200       # tail of the transcript passed to Whisper as context
+MAX_OVERLAP_WORDS = 6    # how far back stitch() looks for duplicated words
+
+
+# ---------- Audio helpers ----------
+def to_pcm16(samples):
+    """Convert a numpy chunk from Gradio (int16 or float in [-1, 1]) to int16."""
+    if samples.dtype.kind == "f":
+        samples = (samples.clip(-1.0, 1.0) * 32767)
+    return samples.astype("int16")
+
+
+def pcm_to_wav(pcm, sample_rate, channels):
+    """Wrap raw int16 PCM bytes in a WAV container the transcription API accepts."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    buffer.seek(0)
+    buffer.name = "chunk.wav"  # the OpenAI SDK uses the name to detect the format
+    return buffer
+
+
+# ---------- Transcript stitching ----------
+def _normalize(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def stitch(previous, new):
+    """
+    Append `new` to `previous`, dropping words repeated because of the window overlap.
+
+    >>> stitch("I want to fly to", "fly to Paris please")
+    'I want to fly to Paris please'
+    """
+    new = new.strip()
+    if not previous:
+        return new
+    if not new:
+        return previous
+
+    prev_words = previous.split()
+    new_words = new.split()
+    max_k = min(MAX_OVERLAP_WORDS, len(prev_words), len(new_words))
+    for k in range(max_k, 0, -1):
+        tail = [_normalize(w) for w in prev_words[-k:]]
+        head = [_normalize(w) for w in new_words[:k]]
+        if tail == head:
+            new_words = new_words[k:]
+            break
+
+    return " ".join(prev_words + new_words)
+
+
+# ---------- Streaming transcriber ----------
+class StreamingTranscriber:
+    """
+    Feed microphone chunks in, read partial text out.
+
+    `transcribe_fn(wav_file, prompt)` does the actual API call and returns text.
+    Windows are processed in order by a single worker thread, so each request can
+    use the transcript so far as its prompt.
+    """
+
+    def __init__(self, transcribe_fn, chunk_seconds=CHUNK_SECONDS, overlap_seconds=OVERLAP_SECONDS):
+        self.transcribe_fn = transcribe_fn
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+
+        self.sample_rate = None
+        self.channels = 1
+        self._buffer = bytearray()
+        self._text = ""
+        self._lock = threading.Lock()
+        self._errors = []
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+        self.started_at = time.time()
+        self.chunks_sent = 0
+        self.seconds_sent = 0.0
+
+    # ----- producer side (Gradio stream event) -----
+    def feed(self, sample_rate, samples):
+        """Add one chunk from the microphone; dispatch full windows to the worker."""
+        if samples is None or len(samples) == 0:
+            return
+        if self.sample_rate is None:
+            self.sample_rate = sample_rate
+            self.channels = samples.shape[1] if samples.ndim == 2 else 1
+
+        self._buffer.extend(to_pcm16(samples).tobytes())
+
+        frame_bytes = 2 * self.channels
+        window = int(self.chunk_seconds * self.sample_rate) * frame_bytes
+        overlap = int(self.overlap_seconds * self.sample_rate) * frame_bytes
+        while len(self._buffer) >= window:
+            self._dispatch(bytes(self._buffer[:window]))
+            # keep a little audio so a word split across windows is heard twice
+            del self._buffer[:window - overlap]
+
+    def finish(self, timeout=30):
+        """Flush the remaining audio and wait for the worker; returns the final transcript."""
+        if self._buffer and self.sample_rate:
+            self._dispatch(bytes(self._buffer))
+        self._buffer.clear()
+        self._queue.put(None)
+        self._worker.join(timeout)
+        return self.partial_text()
+
+    # ----- consumer side -----
+    def partial_text(self):
+        with self._lock:
+            return self._text
+
+    @property
+    def errors(self):
+        return list(self._errors)
+
+    @property
+    def elapsed(self):
+        return time.time() - self.started_at
+
+    def _dispatch(self, pcm):
+        self.chunks_sent += 1
+        self.seconds_sent += len(pcm) / (2 * self.channels * self.sample_rate)
+        self._queue.put(pcm)
+
+    def _run(self):
+        while True:
+            pcm = self._queue.get()
+            if pcm is None:
+                return
+            prompt = self.partial_text()[-PROMPT_CHARS:]
+            try:
+                text = self.transcribe_fn(pcm_to_wav(pcm, self.sample_rate, self.channels), prompt)
+            except Exception as e:
+                self._errors.append(e)
+                continue
+            with self._lock:
+                self._text = stitch(self._text, text or "")
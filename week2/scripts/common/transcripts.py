@@ -0,0 +1,483 @@
+"""
+Searchable transcript store: every conversation turn the apps produce, indexed
+in one SQLite file with an FTS5 full-text index.
+
+The markdown outputs (claude_vs_deepseek_*.md, convo_*.md, jokes_*.md,
+session_*.md, brochures...) are one file per run. Finding anything meant grepping
+the whole tree. Apps now also record each turn here, together with the model,
+personality, latency and tokens:
+
+    chat = transcripts.get().conversation("deepseek_vs_gpt", title=user_input)
+    chat.add("User", user_input)
+    chat.add(f"{model} ({personality})", reply, model=model, personality=personality,
+             latency_ms=elapsed_ms, tokens=usage.completion_tokens)
+    chat.saved_as(path)        # the markdown copy, so the importer skips it
+
+The store is append-only. Inserts go through a background thread that commits in
+batches, so recording a turn never waits on the disk. Searches read the index
+directly:
+
+    python -m common.transcripts search "refund policy" [--model deepseek-chat] [--app convo] [--recent]
+    python -m common.transcripts show <conversation id>
+    python -m common.transcripts import output day1/output day5/flightai_output
+    python -m common.transcripts stats
+    python -m common.transcripts ui [--port 7870]
+
+Ranking has to score every match. For a term that appears in most turns, only the
+newest RANK_WINDOW matches are ranked. `--recent` skips ranking and walks the
+index backwards, stopping at --limit. Both stay in milliseconds at millions of
+turns. The database is TRANSCRIPT_DB (default output/transcripts.db).
+"""
+
+import argparse
+import atexit
+import glob
+import gzip
+import hashlib
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+DEFAULT_DB = os.path.join("output", "transcripts.db")
+BATCH_SIZE = 500
+RANK_WINDOW = 20000   # ranked searches score at most this many of the newest matches
+MAX_SESSIONS = 256    # open chat sessions kept per store (the oldest start a new conversation)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    app TEXT,
+    title TEXT,
+    source TEXT,
+    digest TEXT UNIQUE,
+    started REAL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    speaker TEXT,
+    model TEXT,
+    personality TEXT,
+    content TEXT NOT NULL,
+    latency_ms REAL,
+    tokens INTEGER,
+    created REAL
+);
+CREATE INDEX IF NOT EXISTS turns_by_conversation ON turns (conversation_id, seq);
+CREATE INDEX IF NOT EXISTS turns_by_model ON turns (model);
+CREATE INDEX IF NOT EXISTS conversations_by_source ON conversations (source);
+CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5 (
+    content, content='turns', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS turns_index AFTER INSERT ON turns BEGIN
+    INSERT INTO turns_fts (rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+TURN_COLUMNS = ("conversation_id", "seq", "speaker", "model", "personality", "content",
+                "latency_ms", "tokens", "created")
+INSERT_TURN = f"INSERT INTO turns ({', '.join(TURN_COLUMNS)}) VALUES ({', '.join('?' * len(TURN_COLUMNS))})"
+INSERT_CONVERSATION = ("INSERT OR IGNORE INTO conversations (id, app, title, source, digest, started) "
+                       "VALUES (?, ?, ?, ?, ?, ?)")
+
+SEARCH = """
+SELECT t.id, t.conversation_id, t.seq, t.speaker, t.model, t.personality, t.latency_ms, t.tokens,
+       t.created, c.app, c.title, snippet(turns_fts, 0, '**', '**', ' … ', 16)
+FROM turns_fts
+JOIN turns t ON t.id = turns_fts.rowid
+JOIN conversations c ON c.id = t.conversation_id
+WHERE turns_fts MATCH ? AND turns_fts.rowid >= ? {filters}
+ORDER BY {order}
+LIMIT ?
+"""
+RESULT_FIELDS = ("turn_id", "conversation_id", "seq", "speaker", "model", "personality", "latency_ms",
+                 "tokens", "created", "app", "title", "snippet")
+
+# "**gpt-4o-mini (Snarky):** text" or "**GPT**: text" at the start of a line
+SPEAKER_LINE = re.compile(r"^\*\*([^*\n]{1,80}?)(?::\*\*|\*\*:)\s?(.*)$")
+MODEL_AND_PERSONALITY = re.compile(r"^([\w.:/-]+) \((\w+)\)$")
+TIMESTAMP_SUFFIX = re.compile(r"[_-]?\d{4}-?\d{2}-?\d{2}[_-]\d{2}-?\d{2}-?\d{2}(-\d+)?$")
+# inline payloads (chatlog.md embeds its DALL-E sketches): base64 is search noise, not text
+DATA_URI = re.compile(r"data:(\w+)/[\w.+-]+(?:;[\w.+-]+=[\w.+-]+)*;base64,[A-Za-z0-9+/=]+")
+MARKDOWN_IMAGE = re.compile(r"!\[([^\]\n]*)\]\(\s*data:[^)\s]*\)")
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+def fts_query(text):
+    """User text -> FTS5 query: each word quoted, so punctuation can't break the syntax."""
+    words = re.findall(r"\w+\*?", text)
+    return " ".join(f'"{w.rstrip("*")}"' + ("*" if w.endswith("*") else "") for w in words)
+
+
+def output_tokens(response):
+    """Completion tokens from an OpenAI/DeepSeek, Anthropic or Gemini response (None if absent)."""
+    usage = getattr(response, "usage", None)
+    for attr in ("completion_tokens", "output_tokens"):
+        if getattr(usage, attr, None) is not None:
+            return getattr(usage, attr)
+    return getattr(getattr(response, "usage_metadata", None), "candidates_token_count", None)
+
+
+def split_speaker(speaker):
+    """'gpt-4o-mini (Snarky)' -> ('gpt-4o-mini', 'Snarky'); anything else has no model."""
+    match = MODEL_AND_PERSONALITY.match(speaker or "")
+    return (match.group(1), match.group(2)) if match else (None, None)
+
+
+class Conversation:
+    """One run of an app; `add()` queues a turn and returns at once."""
+
+    def __init__(self, store, conversation_id, seq=0):
+        self.store = store
+        self.id = conversation_id
+        self._seq = seq
+        self._lock = threading.Lock()
+
+    def add(self, speaker, content, model=None, personality=None, latency_ms=None, tokens=None):
+        with self._lock:
+            seq = self._seq
+            self._seq += 1
+        if latency_ms is not None:
+            latency_ms = round(latency_ms, 1)
+        self.store._queue.put(("turn", (self.id, seq, speaker, model, personality, content or "",
+                                        latency_ms, tokens, time.time())))
+
+    def saved_as(self, path):
+        """Link the markdown copy of this conversation (the importer skips linked files)."""
+        self.store._queue.put(("source", (os.path.abspath(path), self.id)))
+
+
+class TranscriptStore:
+    def __init__(self, path=DEFAULT_DB):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with _connect(self.path) as connection:
+            connection.executescript(SCHEMA)
+        self._reader = _connect(self.path)
+        self._read_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._sessions = OrderedDict()   # (app, session id) -> Conversation
+        self._sessions_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"transcripts:{path}")
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---------- Writes (queued) ----------
+    def conversation(self, app, title=None, conversation_id=None, seq=0):
+        """A new conversation, or more turns for an existing one (pass its id and the next `seq`)."""
+        conversation_id = conversation_id or uuid.uuid4().hex
+        self._queue.put(("conversation", (conversation_id, app, (title or "")[:200], None, None, time.time())))
+        return Conversation(self, conversation_id, seq)
+
+    def session(self, app, session_id, title=None):
+        """The conversation for a chat session: one per (app, session), continued across turns."""
+        key = (app, session_id)
+        with self._sessions_lock:
+            conversation = self._sessions.pop(key, None)
+            if conversation is None:
+                conversation = self.conversation(app, title)
+            self._sessions[key] = conversation
+            while len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+            return conversation
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is committed (True) or `timeout` passes (False)."""
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=30)
+
+    def _run(self):
+        connection = _connect(self.path)
+        while True:
+            ops = [self._queue.get()]
+            while len(ops) < BATCH_SIZE:
+                try:
+                    ops.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in ops
+            try:
+                with connection:   # one transaction per batch
+                    for op in ops:
+                        if op is None or op[0] == "flush":
+                            continue
+                        kind, row = op
+                        if kind == "turn":
+                            connection.execute(INSERT_TURN, row)
+                        elif kind == "conversation":
+                            connection.execute(INSERT_CONVERSATION, row)
+                        elif kind == "source":
+                            connection.execute("UPDATE conversations SET source = ? WHERE id = ?", row)
+            except sqlite3.Error as e:
+                print(f"⚠️ Transcript store could not save {len(ops)} records: {e}")
+            for op in ops:
+                if op is not None and op[0] == "flush":
+                    op[1].set()
+            if stop:
+                connection.close()
+                return
+
+    # ---------- Reads ----------
+    def _query(self, sql, params=()):
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    def search(self, text, limit=20, model=None, app=None, speaker=None, recent=False):
+        """Matching turns as dicts (best first, or newest first with `recent`), each with a snippet."""
+        query = fts_query(text)
+        if not query:
+            return []
+        # bm25 has to score every match; past RANK_WINDOW of them only the newest are ranked
+        cutoff = 0
+        if not recent:
+            row = self._query("SELECT rowid FROM turns_fts WHERE turns_fts MATCH ? ORDER BY rowid DESC "
+                              "LIMIT 1 OFFSET ?", (query, RANK_WINDOW))
+            cutoff = row[0][0] if row else 0
+        filters, params = [], [query, cutoff]
+        for column, value in (("t.model", model), ("c.app", app), ("t.speaker", speaker)):
+            if value:
+                filters.append(f"AND {column} = ?")
+                params.append(value)
+        sql = SEARCH.format(filters=" ".join(filters), order="turns_fts.rowid DESC" if recent else "rank")
+        return [dict(zip(RESULT_FIELDS, row)) for row in self._query(sql, params + [limit])]
+
+    def turns(self, conversation_id):
+        rows = self._query(f"SELECT {', '.join(TURN_COLUMNS)} FROM turns WHERE conversation_id = ? ORDER BY seq",
+                           (conversation_id,))
+        return [dict(zip(TURN_COLUMNS, row)) for row in rows]
+
+    def info(self, conversation_id):
+        rows = self._query("SELECT id, app, title, source, started FROM conversations WHERE id = ?",
+                           (conversation_id,))
+        return dict(zip(("id", "app", "title", "source", "started"), rows[0])) if rows else None
+
+    def markdown(self, conversation_id):
+        """A conversation rendered the way the apps write their markdown files."""
+        info = self.info(conversation_id)
+        if info is None:
+            return f"❌ No conversation {conversation_id}"
+        started = datetime.fromtimestamp(info["started"]).strftime("%Y-%m-%d %H:%M:%S")
+        lines = [f"# {info['title'] or info['app']}", f"_{info['app']} · {started}_"]
+        for turn in self.turns(conversation_id):
+            stats = [f"{turn['latency_ms']:.0f}ms" if turn["latency_ms"] is not None else "",
+                     f"{turn['tokens']} tokens" if turn["tokens"] is not None else ""]
+            stats = " · ".join(s for s in stats if s)
+            lines.append(f"**{turn['speaker']}:** {turn['content']}" + (f"  \n_{stats}_" if stats else ""))
+        return "\n\n".join(lines) + "\n"
+
+    def choices(self, column):
+        """Distinct values for a filter dropdown (`model` or `app`)."""
+        table, name = {"model": ("turns", "model"), "app": ("conversations", "app")}[column]
+        return [row[0] for row in self._query(f"SELECT DISTINCT {name} FROM {table} WHERE {name} IS NOT NULL "
+                                              f"ORDER BY {name}")]
+
+    def stats(self):
+        conversations, = self._query("SELECT COUNT(*) FROM conversations")[0]
+        turns, = self._query("SELECT COUNT(*) FROM turns")[0]
+        models = self._query("SELECT model, COUNT(*), AVG(latency_ms), SUM(tokens) FROM turns "
+                             "WHERE model IS NOT NULL GROUP BY model ORDER BY COUNT(*) DESC")
+        return {"conversations": conversations, "turns": turns,
+                "models": {m: {"turns": n, "avg_latency_ms": round(l, 1) if l is not None else None,
+                               "tokens": t} for m, n, l, t in models}}
+
+    # ---------- Import ----------
+    def import_markdown(self, paths):
+        """
+        Load existing markdown outputs (files or directories, .md or sink-compressed
+        .md.gz). A file is stored once: re-imports and files an app already recorded
+        live are skipped. Returns (files imported, turns imported, files skipped).
+        """
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files += sorted(glob.glob(os.path.join(path, "**", "*.md"), recursive=True))
+                files += sorted(glob.glob(os.path.join(path, "**", "*.md.gz"), recursive=True))
+            else:
+                files.append(path)
+
+        imported = turn_count = skipped = 0
+        connection = _connect(self.path)
+        try:
+            with connection:
+                for path in files:
+                    source = os.path.abspath(path[:-3] if path.endswith(".gz") else path)
+                    opener = gzip.open if path.endswith(".gz") else open
+                    with opener(path, "rb") as f:
+                        data = f.read()
+                    digest = hashlib.sha256(data).hexdigest()
+                    known = connection.execute("SELECT 1 FROM conversations WHERE digest = ? OR source = ?",
+                                               (digest, source)).fetchone()
+                    if known:
+                        skipped += 1
+                        continue
+                    title, turns = parse_markdown(data.decode("utf-8", errors="replace"))
+                    conversation_id = uuid.uuid4().hex
+                    started = os.path.getmtime(path)
+                    connection.execute(INSERT_CONVERSATION, (conversation_id, app_from_filename(source), title,
+                                                             source, digest, started))
+                    for seq, (speaker, content) in enumerate(turns):
+                        model, personality = split_speaker(speaker)
+                        connection.execute(INSERT_TURN, (conversation_id, seq, speaker, model, personality, content,
+                                                         None, None, started))
+                    imported += 1
+                    turn_count += len(turns)
+        finally:
+            connection.close()
+        return imported, turn_count, skipped
+
+
+def strip_payloads(text):
+    """'![Sketch of Paris](data:image/png;base64,...)' -> '[image: Sketch of Paris]'; other data URIs -> '[image]' etc."""
+    text = MARKDOWN_IMAGE.sub(lambda m: f"[image: {m.group(1)}]" if m.group(1) else "[image]", text)
+    return DATA_URI.sub(lambda m: f"[{m.group(1)}]", text)
+
+
+def parse_markdown(text):
+    """
+    (title, [(speaker, content)]); a file without speaker lines is one 'document'
+    turn. Inline base64 payloads are replaced by placeholders (see strip_payloads).
+    """
+    text = strip_payloads(text)
+    title = None
+    turns = []
+    body = []
+    for line in text.splitlines():
+        if title is None and line.startswith("# "):
+            title = line[2:].strip()
+            continue
+        match = SPEAKER_LINE.match(line)
+        if match:
+            turns.append([match.group(1).strip(), [match.group(2)]])
+        elif turns:
+            turns[-1][1].append(line)
+        else:
+            body.append(line)
+    if not turns:
+        return title, [("document", text.strip())] if text.strip() else []
+    return title, [(speaker, "\n".join(lines).strip()) for speaker, lines in turns]
+
+
+def app_from_filename(path):
+    """'output/claude_vs_deepseek_2025-04-21_16-14-33.md' -> 'claude_vs_deepseek'."""
+    stem = os.path.basename(path).split(".")[0]
+    return TIMESTAMP_SUFFIX.sub("", stem) or stem
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get(path=None):
+    """The shared store for a database file (TRANSCRIPT_DB, or output/transcripts.db)."""
+    key = os.path.abspath(path or os.getenv("TRANSCRIPT_DB", DEFAULT_DB))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = TranscriptStore(key)
+        return _stores[key]
+
+
+# ---------- Browse UI ----------
+def build_ui(store):
+    import gradio as gr
+
+    def run_search(text, model, app, recent):
+        started = time.perf_counter()
+        results = store.search(text, limit=50, model=model or None, app=app or None, recent=recent)
+        elapsed = 1000 * (time.perf_counter() - started)
+        rows = [[r["app"], r["speaker"], r["model"] or "", r["snippet"],
+                 datetime.fromtimestamp(r["created"]).strftime("%Y-%m-%d %H:%M")] for r in results]
+        return rows, [r["conversation_id"] for r in results], f"🔎 {len(results)} matches in {elapsed:.1f}ms"
+
+    def open_conversation(ids, evt: gr.SelectData):
+        return store.markdown(ids[evt.index[0]]) if ids else ""
+
+    with gr.Blocks(title="Transcript search") as ui:
+        gr.Markdown("## 🔎 Transcript Search")
+        ids = gr.State([])
+        with gr.Row():
+            text = gr.Textbox(label="Search", placeholder="words to find (prefix* works)", scale=3)
+            model = gr.Dropdown([""] + store.choices("model"), value="", label="Model")
+            app = gr.Dropdown([""] + store.choices("app"), value="", label="App")
+            recent = gr.Checkbox(label="Newest first")
+        status = gr.Markdown()
+        results = gr.Dataframe(headers=["app", "speaker", "model", "match", "when"], interactive=False, wrap=True)
+        conversation = gr.Markdown()
+
+        inputs = [text, model, app, recent]
+        text.submit(run_search, inputs, [results, ids, status])
+        for control in (model, app, recent):
+            control.change(run_search, inputs, [results, ids, status])
+        results.select(open_conversation, ids, conversation)
+    return ui
+
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="Search and browse recorded conversations")
+    parser.add_argument("--db", help=f"database file (default: TRANSCRIPT_DB or {DEFAULT_DB})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    search = commands.add_parser("search", help="full-text search over every turn")
+    search.add_argument("query")
+    search.add_argument("--model")
+    search.add_argument("--app")
+    search.add_argument("--speaker")
+    search.add_argument("--limit", type=int, default=20)
+    search.add_argument("--recent", action="store_true", help="newest matches first instead of best ranked")
+    show = commands.add_parser("show", help="print one conversation")
+    show.add_argument("conversation_id")
+    importer = commands.add_parser("import", help="load existing markdown outputs")
+    importer.add_argument("paths", nargs="+")
+    commands.add_parser("stats", help="turn counts, latency and tokens per model")
+    ui = commands.add_parser("ui", help="browse in the browser")
+    ui.add_argument("--port", type=int, default=7870)
+    args = parser.parse_args()
+
+    store = get(args.db)
+    if args.command == "search":
+        started = time.perf_counter()
+        results = store.search(args.query, limit=args.limit, model=args.model, app=args.app,
+                               speaker=args.speaker, recent=args.recent)
+        elapsed = 1000 * (time.perf_counter() - started)
+        for r in results:
+            when = datetime.fromtimestamp(r["created"]).strftime("%Y-%m-%d %H:%M")
+            print(f"{r['conversation_id']}  {when}  {r['app']} · {r['speaker']}")
+            print(f"    {' '.join(r['snippet'].split())}")
+        print(f"🔎 {len(results)} matches in {elapsed:.1f}ms")
+    elif args.command == "show":
+        print(store.markdown(args.conversation_id))
+    elif args.command == "import":
+        started = time.perf_counter()
+        files, turns, skipped = store.import_markdown(args.paths)
+        print(f"📥 Imported {files} files ({turns} turns), skipped {skipped} already stored, "
+              f"in {time.perf_counter() - started:.1f}s")
+    elif args.command == "stats":
+        stats = store.stats()
+        print(f"🗂️ {stats['conversations']} conversations, {stats['turns']} turns")
+        for model, s in stats["models"].items():
+            latency = f"{s['avg_latency_ms']:.0f}ms" if s["avg_latency_ms"] is not None else "-"
+            print(f"    {model:<28} {s['turns']:>8} turns  avg {latency:>7}  {s['tokens'] or 0:>10} tokens")
+    elif args.command == "ui":
+        build_ui(store).launch(server_port=args.port)
+
+
+if __name__ == "__main__":
+    main()
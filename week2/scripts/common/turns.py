@@ -0,0 +1,110 @@
+"""
+Turn scheduler for bot-vs-bot showdowns: a round's calls run in parallel when
+neither reads the other's reply.
+
+Each showdown script used to make its two calls per round one after the other.
+In several of them the second bot only sees the conversation as it stood when
+the round began, so both calls could be in flight at once. A `Bot` declares what
+it reads: `after="gpt"` means it answers GPT's reply from the same round (strict
+alternation). Without `after`, it reads only earlier rounds and is started
+together with the round's other independent bots:
+
+    bots = [
+        turns.Bot("claude", "Claude 😇", call_claude),
+        turns.Bot("deepseek", "DeepSeek 😈", call_deepseek),              # parallel with Claude
+    ]
+    turns.play(run, bots, rounds=5, on_reply=show)
+
+`call(seen)` gets `seen[name]`, the replies of each bot that this call may read,
+and returns (reply, output tokens). Every reply goes to the run's checkpoint (see
+common.checkpoint) before the next wave starts. Replies already in the checkpoint
+are skipped, so a stopped run resumes without repeating finished calls.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Bot:
+    __slots__ = ("name", "speaker", "call", "after")
+
+    def __init__(self, name, speaker, call, after=None):
+        self.name = name          # checkpoint key ("gpt", "claude"...)
+        self.speaker = speaker    # label shown in the transcript
+        self.call = call          # call(seen) -> (reply, tokens)
+        self.after = after        # a bot whose reply from the same round this one answers
+
+
+class Stopped(Exception):
+    """A call failed; the replies that succeeded before it (and alongside it) are checkpointed."""
+
+    def __init__(self, bot, error, replies):
+        super().__init__(f"{bot.speaker} failed after {replies} replies: {error}")
+        self.bot = bot
+        self.error = error
+
+
+def rounds_of(run):
+    """(round, bot) for each checkpointed turn; older checkpoints have no round, so count per bot."""
+    counts = {}
+    keys = []
+    for turn in run.turns:
+        r = turn.get("round", counts.get(turn["bot"], 0))
+        counts[turn["bot"]] = r + 1
+        keys.append((r, turn["bot"]))
+    return keys
+
+
+def transcript(run, bots):
+    """Checkpointed turns in playing order: by round, then by the order of `bots`."""
+    order = {bot.name: i for i, bot in enumerate(bots)}
+    keyed = sorted(zip(rounds_of(run), run.turns), key=lambda item: (item[0][0], order.get(item[0][1], 0)))
+    return [turn for _, turn in keyed]
+
+
+def _seen(done, bots, r, bot):
+    seen = {}
+    for other in bots:
+        replies = [done[(k, other.name)] for k in range(r)]
+        if other.name == bot.after:
+            replies.append(done[(r, other.name)])
+        seen[other.name] = replies
+    return seen
+
+
+def _timed(call, seen):
+    started = time.perf_counter()
+    reply, tokens = call(seen)
+    return reply, tokens, 1000 * (time.perf_counter() - started)
+
+
+def play(run, bots, rounds, on_reply=None):
+    """
+    Play `rounds` rounds, skipping replies already in the checkpoint. Each wave of
+    independent calls runs concurrently, and its replies are checkpointed (in
+    `bots` order) before the next wave starts. `on_reply(bot, reply, latency_ms,
+    tokens)` is called for each new reply. Raises Stopped on the first failure.
+    """
+    done = {key: turn["content"] for key, turn in zip(rounds_of(run), run.turns)}
+    with ThreadPoolExecutor(max_workers=len(bots), thread_name_prefix="showdown") as pool:
+        for r in range(rounds):
+            pending = [bot for bot in bots if (r, bot.name) not in done]
+            while pending:
+                ready = [bot for bot in pending if bot.after is None or (r, bot.after) in done]
+                if not ready:
+                    raise ValueError(f"bots {[b.name for b in pending]} wait on each other")
+                futures = [pool.submit(_timed, bot.call, _seen(done, bots, r, bot)) for bot in ready]
+                failure = None
+                for bot, future in zip(ready, futures):
+                    try:
+                        reply, tokens, latency_ms = future.result()
+                    except Exception as e:
+                        failure = failure or (bot, e)
+                        continue
+                    run.record(bot.name, bot.speaker, reply, round=r, latency_ms=round(latency_ms, 1), tokens=tokens)
+                    done[(r, bot.name)] = reply
+                    if on_reply:
+                        on_reply(bot, reply, latency_ms, tokens)
+                if failure:
+                    raise Stopped(failure[0], failure[1], len(run.turns))
+                pending = [bot for bot in pending if bot not in ready]
@@ -1,11 +1,23 @@
 # ai_conversation_demo.py
+#
+# Every reply is checkpointed under output/checkpoints/; if a call fails mid-run,
+# continue it without repeating the finished turns:
+#   python ai_conversations.py --resume <run id>      (ids: python -m common.checkpoint list)
 
+import argparse
 import os
+import sys
 from datetime import datetime
 from dotenv import load_dotenv
 from openai import OpenAI
 import anthropic
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import checkpoint, turns
+
+APP = "gpt_vs_claude"
+TURNS = 5
+
 # Setup
 def setup_environment():
     load_dotenv(override=True)
@@ -18,28 +30,28 @@ def setup_environment():
     }
 
 # Run conversation between GPT-4o-mini and Claude-3-Haiku
-def run_conversation(openai_client, claude_client):
+def run_conversation(openai_client, claude_client, run=None):
+    """Returns the markdown log; raises turns.Stopped if a call fails (the replies so far stay checkpointed)."""
+    run = run or checkpoint.start(APP, turns=TURNS)
     gpt_model = "gpt-4o-mini"
     claude_model = "claude-3-haiku-20240307"
 
     gpt_system = "You are a chatbot who is very argumentative; you challenge everything in a snarky way."
     claude_system = "You are a very polite chatbot who tries to agree and calm things down."
 
-    gpt_msgs = ["Hi there"]
-    claude_msgs = ["Hi"]
-    conversation_log = []
-
-    def call_gpt():
+    # `seen` holds each bot's replies from the checkpoint that this call may read
+    def call_gpt(seen):
         messages = [{"role": "system", "content": gpt_system}]
-        for g, c in zip(gpt_msgs, claude_msgs):
+        for g, c in zip(["Hi there"] + seen["gpt"], ["Hi"] + seen["claude"]):
             messages.append({"role": "assistant", "content": g})
             messages.append({"role": "user", "content": c})
         reply = openai_client.chat.completions.create(model=gpt_model, messages=messages)
-        return reply.choices[0].message.content
+        return reply.choices[0].message.content, None
 
-    def call_claude():
+    def call_claude(seen):
+        gpt_msgs = ["Hi there"] + seen["gpt"]
         messages = []
-        for g, c in zip(gpt_msgs, claude_msgs):
+        for g, c in zip(gpt_msgs, ["Hi"] + seen["claude"]):
             messages.append({"role": "user", "content": g})
             messages.append({"role": "assistant", "content": c})
         messages.append({"role": "user", "content": gpt_msgs[-1]})
@@ -49,18 +61,17 @@ def run_conversation(openai_client, claude_client):
             messages=messages,
             max_tokens=500
         )
-        return reply.content[0].text
+        return reply.content[0].text, None
 
-    for _ in range(5):
-        gpt_reply = call_gpt()
-        claude_reply = call_claude()
-        gpt_msgs.append(gpt_reply)
-        claude_msgs.append(claude_reply)
+    # Claude answers GPT's message from the start of the round, so both calls run at once
+    bots = [turns.Bot("gpt", "GPT", call_gpt), turns.Bot("claude", "Claude", call_claude)]
+    conversation_log = [f"**{turn['speaker']}**: {turn['content']}\n\n" for turn in turns.transcript(run, bots)]
 
-        print(f"\nGPT: {gpt_reply}")
-        print(f"Claude: {claude_reply}")
-        conversation_log.append(f"**GPT**: {gpt_reply}\n\n**Claude**: {claude_reply}\n\n")
+    def on_reply(bot, reply, latency_ms, tokens):
+        print(f"\n{bot.speaker}: {reply}" if bot.name == "gpt" else f"{bot.speaker}: {reply}")
+        conversation_log.append(f"**{bot.speaker}**: {reply}\n\n")
 
+    turns.play(run, bots, run.params["turns"], on_reply)
     return conversation_log
 
 # Save to file
@@ -72,8 +83,19 @@ def save_conversation(log, path):
 
 # Main
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resume", metavar="RUN_ID", help="continue a checkpointed run")
+    args = parser.parse_args()
+
     keys = setup_environment()
     openai_client = OpenAI(api_key=keys["openai_key"])
     claude_client = anthropic.Anthropic(api_key=keys["anthropic_key"])
-    log = run_conversation(openai_client, claude_client)
+    run = checkpoint.load(args.resume) if args.resume else checkpoint.start(APP, turns=TURNS)
+    try:
+        log = run_conversation(openai_client, claude_client, run)
+    except turns.Stopped as e:
+        print(f"\n⚠️ {e}")
+        print(f"   Resume with: python {os.path.basename(__file__)} --resume {run.id}")
+        sys.exit(1)
     save_conversation(log, keys["output_path"])
+    run.finish(path=keys["output_path"])
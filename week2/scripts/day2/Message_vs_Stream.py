@@ -2,12 +2,17 @@ import gradio as gr
 from openai import OpenAI
 from dotenv import load_dotenv
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import telemetry, tracing
 
 # --- Load environment variables ---
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 # --- Full Response Mode (non-streaming) ---
+@tracing.traced("get_full_response")
 def get_full_response(user_message):
     messages = [
         {"role": "system", "content": "You are a helpful assistant."},
@@ -20,6 +25,7 @@ def get_full_response(user_message):
     return response.choices[0].message.content
 
 # --- Live Response Mode (streaming) ---
+@tracing.traced("get_live_response")
 def get_live_response(user_message, chat_history):
     messages = [{"role": "system", "content": "You are a helpful assistant."}]
     for user_turn, ai_turn in chat_history:
@@ -80,4 +86,5 @@ with gr.Blocks() as demo:
 
 # Launch app
 if __name__ == "__main__":
+    telemetry.serve()
     demo.launch()
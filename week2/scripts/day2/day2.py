@@ -5,6 +5,10 @@ from dotenv import load_dotenv
 import gradio as gr
 from openai import OpenAI
 import anthropic
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import telemetry, tracing
 
 # ------------------ Load Keys ------------------ #
 load_dotenv()
@@ -85,6 +89,7 @@ def stream_claude(prompt):
 
 
 # ------------------ Brochure Generator ------------------ #
+@tracing.traced("stream_brochure")
 def stream_brochure(company_name, url, model):
     website = Website(url)
     prompt = f"Please generate a company brochure for {company_name} based on the following landing page:\n\n"
@@ -124,4 +129,5 @@ demo = gr.Interface(
 # test_ui.launch()
 
 # Launch the main app
+telemetry.serve()
 demo.launch()
@@ -1,10 +1,16 @@
 import os
+import sys
 from dotenv import load_dotenv
 import gradio as gr
-from openai import OpenAI
-import anthropic
-import google.generativeai as genai
-import cohere  # ✅ Added for Cohere support
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.gemini import GeminiAdapter
+from common import hedging, lazy, telemetry, tracing
+
+# Provider SDKs are imported on first use: startup costs Gradio plus the provider picked
+openai = lazy.module("openai")
+anthropic = lazy.module("anthropic")
+cohere = lazy.module("cohere")
 
 # ---------------------- Setup ----------------------
 def setup_environment():
@@ -18,11 +24,12 @@ def setup_environment():
     }
 
 key_list = setup_environment()
+gemini = GeminiAdapter(key_list["google_key"])  # configured once, models cached
 
 # ---------------------- Model Wrappers ----------------------
 
 def ask_gpt(messages):
-    client = OpenAI(api_key=key_list["openai_key"])
+    client = openai.OpenAI(api_key=key_list["openai_key"])
     response = client.chat.completions.create(
         model="gpt-4",
         messages=messages
@@ -40,19 +47,11 @@ def ask_claude(messages):
     return response.content[0].text
 
 def ask_gemini(messages):
-    genai.configure(api_key=key_list["google_key"])
-    system_prompt = next((m["content"] for m in messages if m["role"] == "system"), "")
-    history = [{"role": m["role"], "parts": [m["content"]]} for m in messages if m["role"] != "system"]
-    model = genai.GenerativeModel(
-        model_name="gemini-2.0-flash-exp",
-        system_instruction=system_prompt
-    )
-    chat = model.start_chat(history=history)
-    response = chat.send_message(messages[-1]["content"])
-    return response.text
+    # Each message is sent once; the system prompt becomes the system instruction
+    return gemini.generate(messages, "gemini-2.0-flash-exp")
 
 def ask_deepseek(messages):
-    client = OpenAI(api_key=key_list["deepseek_key"], base_url="https://api.deepseek.com")
+    client = openai.OpenAI(api_key=key_list["deepseek_key"], base_url="https://api.deepseek.com")
     response = client.chat.completions.create(
         model="deepseek-chat",
         messages=messages,
@@ -71,31 +70,46 @@ def ask_cohere(messages):
     return response.text
 
 # ---------------------- Unified Interface ----------------------
-def ask_model(user_input, provider):
+ASKERS = {
+    "openai": ask_gpt,
+    "claude": ask_claude,
+    "gemini": ask_gemini,
+    "deepseek": ask_deepseek,
+    "cohere": ask_cohere,
+}
+
+# Backup asked when hedging is on and the primary is slower than its p90
+HEDGE_BACKUPS = {"openai": "deepseek", "claude": "openai", "gemini": "openai", "deepseek": "openai", "cohere": "openai"}
+
+def ask_hedged(provider, messages, hedge=False):
+    """Ask `provider`; with hedging on, fire its backup if the reply is slower than its p90."""
+    backup = HEDGE_BACKUPS.get(provider) if hedge else None
+    if not backup:
+        return ASKERS[provider](messages)
+    # Blocking calls race as one-delta streams; the loser's reply is discarded
+    return "".join(hedging.hedged(
+        provider, lambda: hedging.once(lambda: ASKERS[provider](messages)),
+        backup, lambda: hedging.once(lambda: ASKERS[backup](messages)),
+    ))
+
+@tracing.traced("ask_model")
+def ask_model(user_input, provider, hedge=False):
     messages = [
         {"role": "system", "content": "You are a helpful assistant."},
         {"role": "user", "content": user_input}
     ]
 
-    if provider == "openai":
-        return ask_gpt(messages)
-    elif provider == "claude":
-        return ask_claude(messages)
-    elif provider == "gemini":
-        return ask_gemini(messages)
-    elif provider == "deepseek":
-        return ask_deepseek(messages)
-    elif provider == "cohere":
-        return ask_cohere(messages)
-    else:
+    if provider not in ASKERS:
         return "❌ Unknown provider"
+    return ask_hedged(provider, messages, hedge)
 
 # ---------------------- Gradio UI ----------------------
 view = gr.Interface(
     fn=ask_model,
     inputs=[
         gr.Textbox(label="Your message:", lines=6, placeholder="Ask anything..."),
-        gr.Radio(["openai", "claude", "gemini", "deepseek", "cohere"], label="Choose a model")  # ✅ Added cohere
+        gr.Radio(["openai", "claude", "gemini", "deepseek", "cohere"], label="Choose a model"),  # ✅ Added cohere
+        gr.Checkbox(value=False, label="⚡ Hedge slow requests with a backup provider")
     ],
     outputs=gr.Textbox(label="Response:", lines=8),
     title="Multi-Model AI Chat Interface",
@@ -104,6 +118,7 @@ view = gr.Interface(
 
 # ---------------------- Main ----------------------
 if __name__ == "__main__":
+    telemetry.serve()
     for provider in ["openai", "claude", "gemini", "deepseek", "cohere"]:
         print(f"\n=== {provider.upper()} ===")
         print(ask_model("Who made you?", provider))
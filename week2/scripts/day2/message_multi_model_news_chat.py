@@ -1,14 +1,20 @@
 import os
+import sys
 from dotenv import load_dotenv
 import gradio as gr
-from openai import OpenAI
-import anthropic
-import google.generativeai as genai
 
 import requests
 from bs4 import BeautifulSoup
 from typing import List
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.gemini import GeminiAdapter
+from common import hedging, lazy, telemetry, tracing
+
+# Provider SDKs are imported on first use: startup costs Gradio plus the provider picked
+openai = lazy.module("openai")
+anthropic = lazy.module("anthropic")
+
 # ---------------------- Setup ----------------------
 def setup_environment():
     load_dotenv(override=True)
@@ -20,6 +26,7 @@ def setup_environment():
     }
 
 key_list = setup_environment()
+gemini = GeminiAdapter(key_list["google_key"])  # configured once, models cached
 
 # ---------------------- Optional News Injection ----------------------
 def fetch_headlines(url: str = "https://www.reuters.com/world/") -> List[str]:
@@ -42,7 +49,7 @@ def append_news_if_applicable(system_prompt: str, personality: str) -> str:
 
 # ---------------------- Model Wrappers ----------------------
 def ask_gpt(messages):
-    client = OpenAI(api_key=key_list["openai_key"])
+    client = openai.OpenAI(api_key=key_list["openai_key"])
     response = client.chat.completions.create(
         model="gpt-4",
         messages=messages
@@ -60,22 +67,11 @@ def ask_claude(messages):
     return response.content[0].text
 
 def ask_gemini(messages):
-    genai.configure(api_key=key_list["google_key"])
-
-    system_prompt = next((m["content"] for m in messages if m["role"] == "system"), "")
-    history = [{"role": m["role"], "parts": [m["content"]]} for m in messages if m["role"] != "system"]
-
-    model = genai.GenerativeModel(
-        model_name="gemini-2.0-flash-exp",
-        system_instruction=system_prompt
-    )
-
-    chat = model.start_chat(history=history)
-    response = chat.send_message(messages[-1]["content"])
-    return response.text
+    # Each message is sent once; the system prompt becomes the system instruction
+    return gemini.generate(messages, "gemini-2.0-flash-exp")
 
 def ask_deepseek(messages):
-    client = OpenAI(api_key=key_list["deepseek_key"], base_url="https://api.deepseek.com")
+    client = openai.OpenAI(api_key=key_list["deepseek_key"], base_url="https://api.deepseek.com")
     response = client.chat.completions.create(
         model="deepseek-chat",
         messages=messages,
@@ -84,7 +80,29 @@ def ask_deepseek(messages):
     return response.choices[0].message.content
 
 # ---------------------- Unified Interface ----------------------
-def ask_model(user_input, provider_and_personality):
+ASKERS = {
+    "openai": ask_gpt,
+    "claude": ask_claude,
+    "gemini": ask_gemini,
+    "deepseek": ask_deepseek,
+}
+
+# Backup asked when hedging is on and the primary is slower than its p90
+HEDGE_BACKUPS = {"openai": "deepseek", "claude": "openai", "gemini": "openai", "deepseek": "openai"}
+
+def ask_hedged(provider, messages, hedge=False):
+    """Ask `provider`; with hedging on, fire its backup if the reply is slower than its p90."""
+    backup = HEDGE_BACKUPS.get(provider) if hedge else None
+    if not backup:
+        return ASKERS[provider](messages)
+    # Blocking calls race as one-delta streams; the loser's reply is discarded
+    return "".join(hedging.hedged(
+        provider, lambda: hedging.once(lambda: ASKERS[provider](messages)),
+        backup, lambda: hedging.once(lambda: ASKERS[backup](messages)),
+    ))
+
+@tracing.traced("ask_model")
+def ask_model(user_input, provider_and_personality, hedge=False):
     provider, personality = provider_and_personality.split("::")
 
     system_prompt = "You are a helpful assistant."
@@ -95,16 +113,9 @@ def ask_model(user_input, provider_and_personality):
         {"role": "user", "content": user_input}
     ]
 
-    if provider == "openai":
-        return ask_gpt(messages)
-    elif provider == "claude":
-        return ask_claude(messages)
-    elif provider == "gemini":
-        return ask_gemini(messages)
-    elif provider == "deepseek":
-        return ask_deepseek(messages)
-    else:
+    if provider not in ASKERS:
         return "❌ Unknown provider"
+    return ask_hedged(provider, messages, hedge)
 
 # ---------------------- Gradio UI ----------------------
 providers = ["openai", "claude", "gemini", "deepseek"]
@@ -116,7 +127,8 @@ view = gr.Interface(
     fn=ask_model,
     inputs=[
         gr.Textbox(label="Your message:", lines=6, placeholder="Ask anything..."),
-        gr.Dropdown(combinations, label="Choose a model + personality", value="openai::Helpful")
+        gr.Dropdown(combinations, label="Choose a model + personality", value="openai::Helpful"),
+        gr.Checkbox(value=False, label="⚡ Hedge slow requests with a backup provider")
     ],
     outputs=gr.Textbox(label="Response:", lines=8),
     title="🧠 Multi-Model AI Chat + News-Enhanced Personalities",
@@ -125,6 +137,7 @@ view = gr.Interface(
 
 # ---------------------- Main ----------------------
 if __name__ == "__main__":
+    telemetry.serve()
     # Console demo
     for combo in ["openai::Helpful", "claude::Neutral"]:
         print(f"\n=== {combo.upper()} ===")
@@ -1,13 +1,22 @@
 import os
+import sys
+import time
 import requests
 from datetime import datetime
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 import gradio as gr
-from openai import OpenAI
-import anthropic
-import google.generativeai as genai
-import cohere  # ✅ Add Cohere support
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import lazy, sink, telemetry, tracing, transcripts
+from common.cancellation import SessionStreams, closer, estimate_tokens, guarded, metrics
+from common.conversation import session_id
+from common.gemini import GeminiAdapter
+
+# Provider SDKs are imported on first use: startup costs Gradio plus the provider picked
+openai = lazy.module("openai")
+anthropic = lazy.module("anthropic")
+cohere = lazy.module("cohere")
 
 # ------------------ Setup ------------------ #
 def setup_environment():
@@ -21,6 +30,8 @@ def setup_environment():
     }
 
 key_list = setup_environment()
+outputs = sink.get("output")   # brochures are saved by a background writer
+gemini = GeminiAdapter(key_list["google_key"])  # configured once, models cached
 
 # ------------------ Website Scraper ------------------ #
 class Website:
@@ -53,8 +64,21 @@ system_message = (
 )
 
 # ------------------ Model Streamers ------------------ #
-def stream_gpt(prompt):
-    client = OpenAI(api_key=key_list["openai_key"])
+# Each stream is guarded: stopping the event or closing the tab closes the
+# provider's HTTP response instead of letting it generate to the end.
+streams = SessionStreams()
+
+# The model behind each dropdown choice, for span attributes and metrics labels
+MODEL_IDS = {
+    "GPT": "gpt-4o",
+    "Claude": "claude-3-haiku-20240307",
+    "Gemini": "gemini-1.5-flash",
+    "DeepSeek": "deepseek-chat",
+    "Cohere": "command-r-plus",
+}
+
+def stream_gpt(prompt, token=None):
+    client = openai.OpenAI(api_key=key_list["openai_key"])
     messages = [
         {"role": "system", "content": system_message},
         {"role": "user", "content": prompt}
@@ -66,15 +90,15 @@ def stream_gpt(prompt):
             stream=True
         )
         result = ""
-        for chunk in stream:
-            piece = chunk.choices[0].delta.content or ""
+        deltas = (chunk.choices[0].delta.content or "" for chunk in stream)
+        for piece in guarded(deltas, "gpt", close=closer(stream), token=token):
             print("🧩 GPT Chunk:", piece)
             result += piece
             yield result
     except Exception as e:
         yield f"❌ GPT error: {e}"
 
-def stream_claude(prompt):
+def stream_claude(prompt, token=None):
     client = anthropic.Anthropic(api_key=key_list["anthropic_key"])
     try:
         result = client.messages.stream(
@@ -86,29 +110,27 @@ def stream_claude(prompt):
         )
         response = ""
         with result as stream:
-            for text in stream.text_stream:
+            for text in guarded(stream.text_stream, "claude", close=closer(stream), token=token, max_tokens=1000):
                 print("🧩 Claude Chunk:", text)
                 response += text or ""
                 yield response
     except Exception as e:
         yield f"❌ Claude error: {e}"
 
-def stream_gemini(prompt):
+def stream_gemini(prompt, token=None):
     try:
-        genai.configure(api_key=key_list["google_key"])
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash",
-            system_instruction=system_message
-        )
-        chat = model.start_chat()
-        response = chat.send_message(prompt)
-        yield response.text
+        deltas, close = gemini.open_stream([{"role": "user", "parts": [prompt]}], "gemini-1.5-flash", system_message)
+        response = ""
+        for text in guarded(deltas, "gemini", close=close, token=token):
+            print("🧩 Gemini Chunk:", text)
+            response += text
+            yield response
     except Exception as e:
         yield f"❌ Gemini error: {e}"
 
-def stream_deepseek(prompt):
+def stream_deepseek(prompt, token=None):
     try:
-        client = OpenAI(api_key=key_list["deepseek_key"], base_url="https://api.deepseek.com")
+        client = openai.OpenAI(api_key=key_list["deepseek_key"], base_url="https://api.deepseek.com")
         messages = [
             {"role": "system", "content": system_message},
             {"role": "user", "content": prompt}
@@ -119,15 +141,15 @@ def stream_deepseek(prompt):
             stream=True
         )
         result = ""
-        for chunk in response:
-            piece = chunk.choices[0].delta.content or ""
+        deltas = (chunk.choices[0].delta.content or "" for chunk in response)
+        for piece in guarded(deltas, "deepseek", close=closer(response), token=token):
             print("🧩 DeepSeek Chunk:", piece)
             result += piece
             yield result
     except Exception as e:
         yield f"❌ DeepSeek error: {e}"
 
-def stream_cohere(prompt):  # ✅ New Cohere streamer
+def stream_cohere(prompt, token=None):  # ✅ New Cohere streamer
     try:
         client = cohere.Client(api_key=key_list["cohere_key"])
         reply = ""
@@ -137,58 +159,72 @@ def stream_cohere(prompt):  # ✅ New Cohere streamer
             temperature=0.7,
             preamble=system_message
         )
-        for event in response:
-            if event.event_type == "text-generation":
-                print("🧩 Cohere Chunk:", event.text)
-                reply += event.text
-                yield reply
+        # Cohere's SDK hides the HTTP response, so a cancelled Cohere stream stops at its next event
+        deltas = (event.text for event in response if event.event_type == "text-generation")
+        for text in guarded(deltas, "cohere", token=token):
+            print("🧩 Cohere Chunk:", text)
+            reply += text
+            yield reply
     except Exception as e:
         yield f"❌ Cohere error: {e}"
 
 # ------------------ Brochure Generator ------------------ #
-def stream_brochure(company_name, url, model):
-    website = Website(url)
-    prompt = f"Please generate a company brochure for {company_name} based on the following landing page:\n\n"
-    prompt += website.get_contents()
+# Each stage is a tracing span (TRACE_EXPORT=console prints a waterfall per brochure)
+@tracing.traced("stream_brochure")
+def stream_brochure(company_name, url, model, request: gr.Request = None):
+    streamers = {
+        "GPT": stream_gpt,
+        "Claude": stream_claude,
+        "Gemini": stream_gemini,
+        "DeepSeek": stream_deepseek,
+        "Cohere": stream_cohere,  # ✅ Add Cohere
+    }
+    if model not in streamers:
+        yield "❌ Invalid model selected."
+        return
+
+    tracing.current_span().set(company=company_name, model=model)
+    with tracing.span("scrape", url=url) as span:
+        website = Website(url)
+        span.set(bytes=len(website.text), fetch_error=website.title == "Fetch Error")
+    with tracing.span("prompt.build") as span:
+        prompt = f"Please generate a company brochure for {company_name} based on the following landing page:\n\n"
+        prompt += website.get_contents()
+        span.set(chars=len(prompt), tokens=estimate_tokens(prompt))
 
     print("\n📥 Prompt sent to model:\n", prompt[:1000])
     yield "🌀 Generating brochure..."
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"output/{company_name.replace(' ', '_')}_{model}_{timestamp}.md"
+    filename = f"{company_name.replace(' ', '_')}_{model}_{timestamp}.md"
 
     content = ""
-    if model == "GPT":
-        for chunk in stream_gpt(prompt):
+    with streams.track(session_id(request)) as token, tracing.span("llm.stream", model=MODEL_IDS[model]) as span:
+        started = time.perf_counter()
+        for chunk in streamers[model](prompt, token):
+            if not content:
+                span.set(ttft_ms=round(1000 * (time.perf_counter() - started), 1))
             content = chunk
             yield chunk
-    elif model == "Claude":
-        for chunk in stream_claude(prompt):
-            content = chunk
-            yield chunk
-    elif model == "Gemini":
-        for chunk in stream_gemini(prompt):
-            content = chunk
-            yield chunk
-    elif model == "DeepSeek":
-        for chunk in stream_deepseek(prompt):
-            content = chunk
-            yield chunk
-    elif model == "Cohere":  # ✅ Add Cohere
-        for chunk in stream_cohere(prompt):
-            content = chunk
-            yield chunk
-    else:
-        yield "❌ Invalid model selected."
-        return
-
-    try:
-        os.makedirs("output", exist_ok=True)
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(content)
-        print(f"✅ Saved to {filename}")
-    except Exception as e:
-        print(f"❌ Error saving markdown: {e}")
+        span.set(output_tokens=estimate_tokens(content), cancelled=token.cancelled)
+        if token.cancelled:
+            print(f"🛑 Brochure for {company_name} cancelled; not saved")
+            return
+
+    with tracing.span("save", bytes=len(content.encode("utf-8"))) as span:
+        path = outputs.write(filename, content, kind="transcript")
+        span.set(path=path)
+        print(f"✅ Saved to {path}")
+    record = transcripts.get().conversation("brochure", title=f"{company_name} brochure ({url})")
+    record.add(model, content, model=MODEL_IDS[model], latency_ms=1000 * (time.perf_counter() - started),
+               tokens=estimate_tokens(content))
+    record.saved_as(path)
+
+
+def cancel_session(request: gr.Request):
+    """Tab closed: stop this session's brochure streams upstream."""
+    if streams.cancel(session_id(request)):
+        print(metrics.report())
 
 # ------------------ Launch Gradio ------------------ #
 demo = gr.Interface(
@@ -203,6 +239,8 @@ demo = gr.Interface(
     description="Scrape a landing page and generate a markdown brochure using your preferred LLM",
     allow_flagging="never"
 )
+demo.unload(cancel_session)
 
 if __name__ == "__main__":
+    telemetry.serve()
     demo.launch()
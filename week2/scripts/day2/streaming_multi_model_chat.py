@@ -1,10 +1,16 @@
 import os
+import sys
 from dotenv import load_dotenv
 import gradio as gr
-from openai import OpenAI
-import anthropic
-import google.generativeai as genai
-import cohere  # ✅ Cohere import
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.gemini import GeminiAdapter
+from common import lazy, telemetry, tracing
+
+# Provider SDKs are imported on first use: startup costs Gradio plus the provider picked
+openai = lazy.module("openai")
+anthropic = lazy.module("anthropic")
+cohere = lazy.module("cohere")
 
 # ---------------------- Load Keys ----------------------
 def setup_environment():
@@ -19,8 +25,10 @@ def setup_environment():
 
 key_list = setup_environment()
 DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+gemini = GeminiAdapter(key_list["google"])  # configured once, models cached
 
 # ---------------------- Streaming Chat Logic ----------------------
+@tracing.traced("chat_stream")
 def chat_stream(message, history, provider):
     messages = [{"role": "system", "content": "You are a helpful assistant."}]
     for user, assistant in history:
@@ -29,7 +37,7 @@ def chat_stream(message, history, provider):
     messages.append({"role": "user", "content": message})
 
     if provider == "openai":
-        client = OpenAI(api_key=key_list["openai"])
+        client = openai.OpenAI(api_key=key_list["openai"])
         reply = ""
         stream = client.chat.completions.create(
             model="gpt-4",
@@ -42,7 +50,7 @@ def chat_stream(message, history, provider):
             yield reply
 
     elif provider == "deepseek":
-        client = OpenAI(api_key=key_list["deepseek"], base_url=DEEPSEEK_BASE_URL)
+        client = openai.OpenAI(api_key=key_list["deepseek"], base_url=DEEPSEEK_BASE_URL)
         reply = ""
         stream = client.chat.completions.create(
             model="deepseek-chat",
@@ -67,12 +75,11 @@ def chat_stream(message, history, provider):
             yield f"❌ Claude error: {e}"
 
     elif provider == "gemini":
-        genai.configure(api_key=key_list["google"])
-        model = genai.GenerativeModel("gemini-1.5-flash")
         try:
-            chat = model.start_chat()
-            response = chat.send_message(message)
-            yield response.text
+            reply = ""
+            for delta in gemini.stream(messages, "gemini-1.5-flash"):
+                reply += delta
+                yield reply
         except Exception as e:
             yield f"❌ Gemini error: {e}"
 
@@ -106,9 +113,10 @@ demo = gr.ChatInterface(
     fn=chat_stream,
     additional_inputs=provider_selector,
     title="🧠 Simple Streaming Multi-Model Chat",
-    description="Chat with GPT-4, Claude, Gemini, DeepSeek, or Cohere. GPT & DeepSeek stream live.",
+    description="Chat with GPT-4, Claude, Gemini, DeepSeek, or Cohere. GPT, DeepSeek, Gemini & Cohere stream live.",
 )
 
 # ---------------------- Launch ----------------------
 if __name__ == "__main__":
+    telemetry.serve()
     demo.launch(share=True)
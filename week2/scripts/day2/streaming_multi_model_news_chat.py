@@ -1,14 +1,23 @@
 import os
+import sys
 import time
 from dotenv import load_dotenv
 import gradio as gr
-from openai import OpenAI
-import anthropic
-import google.generativeai as genai
 import requests
 from bs4 import BeautifulSoup
 from typing import List
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.cancellation import SessionStreams, closer, guarded, metrics
+from common.conversation import session_id
+from common.gemini import GeminiAdapter, to_contents
+from common import hedging, lazy, telemetry, tracing
+from common.router import Candidate, Router
+
+# Provider SDKs are imported on first use: startup costs Gradio plus the provider picked
+openai = lazy.module("openai")
+anthropic = lazy.module("anthropic")
+
 # -------------------- Setup --------------------
 load_dotenv()
 KEYS = {
@@ -18,6 +27,10 @@ KEYS = {
     "deepseek": os.getenv("DEEPSEEK_API_KEY"),
 }
 DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+gemini = GeminiAdapter(KEYS["google"])  # configured once, one model per system prompt
+
+# Stop / tab close closes the provider stream instead of letting it run to the end
+streams = SessionStreams()
 
 # -------------------- Personalities + News --------------------
 def fetch_headlines(url="https://www.reuters.com/world/") -> List[str]:
@@ -36,9 +49,63 @@ def inject_news(system_prompt: str, personality: str) -> str:
         return system_prompt + news_block
     return system_prompt
 
+# -------------------- Provider Streams (return text deltas, close) --------------------
+# `close` shuts the HTTP response from any thread, so stop, tab close and a
+# beaten hedge leg end the request even while it waits for its next chunk
+def openai_deltas(messages):
+    client = openai.OpenAI(api_key=KEYS["openai"])
+    stream = client.chat.completions.create(model="gpt-4", messages=messages, stream=True)
+    return (chunk.choices[0].delta.content or "" for chunk in stream), closer(stream)
+
+def deepseek_deltas(messages):
+    client = openai.OpenAI(api_key=KEYS["deepseek"], base_url=DEEPSEEK_BASE_URL)
+    stream = client.chat.completions.create(model="deepseek-chat", messages=messages, stream=True)
+    return (chunk.choices[0].delta.content or "" for chunk in stream), closer(stream)
+
+def claude_deltas(messages):
+    client = anthropic.Anthropic(api_key=KEYS["anthropic"])
+    filtered = [m for m in messages if m["role"] != "system"]
+    # Not streamed: a cancelled Claude call runs to completion, its reply is dropped
+    return hedging.once(lambda: client.messages.create(
+        model="claude-3-haiku-20240307",
+        messages=filtered,
+        max_tokens=1000
+    ).content[0].text.strip())
+
+def gemini_deltas(messages):
+    system, contents = to_contents(messages)
+    return gemini.open_stream(contents, "gemini-1.5-flash", system)
+
+STREAMERS = {
+    "openai": openai_deltas,
+    "deepseek": deepseek_deltas,
+    "claude": claude_deltas,
+    "gemini": gemini_deltas,
+}
+
+# Backup tried when hedging is on and the primary is slower than its p90 to start
+HEDGE_BACKUPS = {"openai": "deepseek", "deepseek": "openai", "claude": "openai", "gemini": "openai"}
+
+# "auto" picks the fastest healthy provider (any tier here), falling back on failure
+router = Router([
+    Candidate("openai", "gpt-4", "premium"),
+    Candidate("deepseek", "deepseek-chat", "standard"),
+    Candidate("claude", "claude-3-haiku-20240307", "standard"),
+    Candidate("gemini", "gemini-1.5-flash", "standard"),
+])
+
 # -------------------- Model Router --------------------
-def stream_response(message, history, model_choice):
+@tracing.traced("stream_response")
+def stream_response(message, history, model_choice, hedge=False, request: gr.Request = None):
+    with streams.track(session_id(request)) as token:
+        yield from _stream_response(message, history, model_choice, hedge, token)
+
+
+def _stream_response(message, history, model_choice, hedge, token):
     provider, personality = model_choice.split("::")
+    if provider != "auto" and provider not in STREAMERS:
+        yield "❌ Unknown model provider."
+        return
     system_prompt = inject_news("You are a helpful assistant.", personality)
 
     # Build messages list
@@ -48,70 +115,55 @@ def stream_response(message, history, model_choice):
         messages.append({"role": "assistant", "content": h[1]})
     messages.append({"role": "user", "content": message})
 
-    if provider == "openai":
-        client = OpenAI(api_key=KEYS["openai"])
-        stream = client.chat.completions.create(
-            model="gpt-4",
-            messages=messages,
-            stream=True
-        )
-        reply = ""
-        for chunk in stream:
-            delta = chunk.choices[0].delta.content or ""
-            reply += delta
-            yield reply
+    def start(name):
+        return router.track(name, lambda: STREAMERS[name](messages))
+
+    if provider == "auto":
+        ranking = [c.provider for c in router.rank("standard")]
+        backup = ranking[1] if hedge and len(ranking) > 1 else None
+        if backup:
+            provider = ranking[0]
+    else:
+        backup = HEDGE_BACKUPS.get(provider) if hedge else None
 
-    elif provider == "deepseek":
-        client = OpenAI(api_key=KEYS["deepseek"], base_url=DEEPSEEK_BASE_URL)
-        stream = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=messages,
-            stream=True
-        )
-        reply = ""
-        for chunk in stream:
-            delta = chunk.choices[0].delta.content or ""
+    def open_deltas():
+        if backup:
+            return hedging.hedged(provider, lambda: start(provider), backup, lambda: start(backup), token=token)
+        if provider == "auto":
+            return router.stream(lambda name: STREAMERS[name](messages), token=token)
+        deltas, close = start(provider)
+        return guarded(deltas, provider, close=close, token=token)
+
+    reply = ""
+    try:
+        for delta in open_deltas():
             reply += delta
             yield reply
+    except Exception as e:
+        yield (reply + "\n\n" if reply else "") + f"❌ {provider.title()} error: {e}"
 
-    elif provider == "claude":
-        client = anthropic.Anthropic(api_key=KEYS["anthropic"])
-        filtered = [m for m in messages if m["role"] != "system"]
-        try:
-            result = client.messages.create(
-                model="claude-3-haiku-20240307",
-                messages=filtered,
-                max_tokens=1000
-            )
-            yield result.content[0].text.strip()
-        except Exception as e:
-            yield f"❌ Claude error: {e}"
-
-    elif provider == "gemini":
-        genai.configure(api_key=KEYS["google"])
-        system = next((m["content"] for m in messages if m["role"] == "system"), "")
-        history_gen = [{"role": m["role"], "parts": [m["content"]]} for m in messages if m["role"] != "system"]
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        chat = model.start_chat(history=history_gen)
-        try:
-            response = chat.send_message(message)
-            yield response.text
-        except Exception as e:
-            yield f"❌ Gemini error: {e}"
-
-    else:
-        yield "❌ Unknown model provider."
+def cancel_session(request: gr.Request):
+    if streams.cancel(session_id(request)):
+        print(metrics.report())
 
 # -------------------- UI --------------------
-model_options = [f"{p}::{tone}" for p in ["openai", "claude", "gemini", "deepseek"]
+model_options = [f"{p}::{tone}" for p in ["auto", "openai", "claude", "gemini", "deepseek"]
                  for tone in ["Neutral", "Helpful", "Motivational", "Snarky"]]
 
-demo = gr.ChatInterface(
-    fn=stream_response,
-    additional_inputs=gr.Dropdown(model_options, label="Choose Model + Personality", value="openai::Helpful"),
-    title="🧠 Multi-Model AI Chat (Streaming)",
-    description="Talk to GPT-4, Claude, Gemini, or DeepSeek with different personalities. 'Helpful' and 'Motivational' inject live news 🗞️"
-)
+with gr.Blocks(title="Multi-Model AI Chat") as demo:
+    gr.ChatInterface(
+        fn=stream_response,
+        additional_inputs=[
+            gr.Dropdown(model_options, label="Choose Model + Personality", value="openai::Helpful"),
+            gr.Checkbox(value=False, label="⚡ Hedge slow requests with a backup provider"),
+        ],
+        title="🧠 Multi-Model AI Chat (Streaming)",
+        description="Talk to GPT-4, Claude, Gemini, or DeepSeek with different personalities - or let 'auto' pick the fastest. 'Helpful' and 'Motivational' inject live news 🗞️"
+    )
+    with gr.Accordion("📊 Live provider stats (used by auto)", open=False):
+        gr.Markdown(router.dashboard, every=5)
+demo.unload(cancel_session)
 
 if __name__ == "__main__":
+    telemetry.serve()
     demo.launch(share=True)
@@ -4,6 +4,10 @@ import os
 from dotenv import load_dotenv
 from openai import OpenAI
 import gradio as gr
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import telemetry, tracing
 
 # ---------------------- Load Environment ----------------------
 def load_api_keys():
@@ -27,6 +31,7 @@ def load_api_keys():
 def init_openai(api_key):
     return OpenAI(api_key=api_key)
 
+@tracing.traced("chat")
 def chat(message, history):
     messages = [{"role": "system", "content": system_message}] + history + [{"role": "user", "content": message}]
 
@@ -55,6 +60,7 @@ MODEL = "gpt-4o-mini"
 system_message = "You are a helpful assistant."
 
 if __name__ == "__main__":
+    telemetry.serve()
     keys = load_api_keys()
     if not keys["openai"]:
         raise EnvironmentError("❌ OpenAI API key is missing in your .env file.")
@@ -1,49 +1,42 @@
+import os
+import sys
 import gradio as gr
-import requests
-import json
 
-def chat_with_llama(message, history):
-    # Start with the latest user message
-    messages = [{"role": "user", "content": message}]
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.conversation import ConversationStore, session_id
+from common.ollama import OllamaClient, OllamaError
+from common import telemetry, tracing
 
-    # Safely extract from history
-    if history:
-        for pair in reversed(history):
-            try:
-                if isinstance(pair, (list, tuple)) and len(pair) == 2:
-                    user_msg, assistant_msg = pair
-                    if isinstance(user_msg, dict) and isinstance(assistant_msg, dict):
-                        messages.insert(0, {"role": "assistant", "content": assistant_msg.get("content", "")})
-                        messages.insert(0, {"role": "user", "content": user_msg.get("content", "")})
-            except Exception as e:
-                print(f"⚠️ Skipping malformed history item: {pair} ({e})")
+MODEL = "llama3"
 
-    # Send request to Ollama
-    try:
-        response = requests.post(
-            "http://localhost:11434/api/chat",
-            json={"model": "llama3", "messages": messages, "stream": True},
-            stream=True
-        )
-    except Exception as e:
-        yield f"❌ Could not connect to Ollama: {e}"
-        return
+# One pooled session for every message; llama3 stays loaded for 30 minutes
+ollama = OllamaClient(keep_alive={MODEL: "30m"})
+conversations = ConversationStore()
+
+@tracing.traced("chat_with_llama")
+def chat_with_llama(message, history, request: gr.Request = None):
+    # Per-session conversation: only the turns added since last time are converted
+    conversation = conversations.get(session_id(request))
+    conversation.sync(history)
+    conversation.append("user", message)
+    messages = conversation.render("openai")
 
-    # Stream tokens
+    # Stream tokens (NDJSON parsed line by line)
     partial = ""
-    for line in response.iter_lines():
-        if line:
-            try:
-                data = json.loads(line.lstrip(b"data: ").decode("utf-8"))
-                token = data.get("message", {}).get("content", "")
-                partial += token
-                yield partial
-            except Exception as e:
-                yield f"\n❌ Error in stream parsing: {e}"
-                break
+    try:
+        for token in ollama.stream_chat(MODEL, messages):
+            partial += token
+            yield partial
+        conversation.append("assistant", partial)
+    except OllamaError as e:
+        yield f"❌ Could not connect to Ollama: {e}"
+    except ValueError as e:
+        yield partial + f"\n❌ Error in stream parsing: {e}"
 
 # Run Gradio UI
 if __name__ == "__main__":
+    telemetry.serve()
+    ollama.warm_up([MODEL])
     gr.ChatInterface(
         fn=chat_with_llama,
         type="messages",
@@ -4,6 +4,10 @@ import os
 from dotenv import load_dotenv
 from openai import OpenAI
 import gradio as gr
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import telemetry, tracing
 
 # ---------------------- Load Environment ----------------------
 def load_api_keys():
@@ -37,6 +41,7 @@ BELTS_PROMPT_EXTENSION = (
 )
 
 # ---------------------- Chat Function ----------------------
+@tracing.traced("chat")
 def chat(message, history):
     # Start with base system message
     system_message = BASE_SYSTEM_MESSAGE
@@ -70,6 +75,7 @@ def chat(message, history):
 
 # ---------------------- Main ----------------------
 if __name__ == "__main__":
+    telemetry.serve()
     api_key = load_api_keys()
     openai = OpenAI(api_key=api_key)
 
@@ -1,19 +1,22 @@
 import os
-import re
+import sys
 import gradio as gr
-from openai import OpenAI
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.fares import FareEngine
+from common.intent import PriceFastPath
+from common.ollama import OllamaClient
+from common.tool_stream import stream_with_tools
+from common import telemetry, tracing
 
 # ----------------------------
 # 1. Setup Ollama Client
 # ----------------------------
 
-OLLAMA_BASE_URL = "http://localhost:11434/v1"
 MODEL = "llama3"
 
-client = OpenAI(
-    base_url=OLLAMA_BASE_URL,
-    api_key="ollama"  # Dummy, not used by Ollama
-)
+# Native Ollama API: pooled session, model kept in memory for 30 minutes
+client = OllamaClient(keep_alive={MODEL: "30m"})
 
 # ----------------------------
 # 2. System Prompt (tell it to simulate tools)
@@ -33,49 +36,46 @@ For all other questions, respond normally with short, polite answers.
 # 3. Simulated Tool Function
 # ----------------------------
 
-ticket_prices = {
-    "london": "$799",
-    "paris": "$899",
-    "tokyo": "$1400",
-    "berlin": "$499"
-}
+fares = FareEngine.open()
 
 def get_ticket_price(city):
-    city = city.lower()
     print(f"[TOOL] Called for: {city}")
-    return ticket_prices.get(city, "Sorry, we don't have pricing info for that destination.")
+    return fares.price(city) or "Sorry, we don't have pricing info for that destination."
+
+# Answers "how much is a ticket to Paris?" locally, in the same wording as the tool reply
+fast_path = PriceFastPath(fares)
 
 # ----------------------------
 # 4. Chat Function with Tool Simulation
 # ----------------------------
 
-TOOL_REGEX = r'TOOL:get_ticket_price\("([^"]+)"\)'
+def price_tool(city):
+    return f"A return ticket to {city.title()} costs {get_ticket_price(city)}."
+
+SIMULATED_TOOLS = {"get_ticket_price": price_tool}
 
+@tracing.traced("chat")
 def chat(user_input, history):
+    with tracing.span("fast_path") as span:
+        answer = fast_path.try_answer(user_input)
+        span.set(cache_hit=bool(answer))
+    if answer:
+        yield answer
+        return
+
     messages = [{"role": "system", "content": system_message}]
     for h in history:
         if "role" in h and "content" in h:
-            messages.append(h)
+            messages.append({"role": h["role"], "content": h["content"]})
     messages.append({"role": "user", "content": user_input})
 
-    response = client.chat.completions.create(
-        model=MODEL,
-        messages=messages
-    )
-
-    output = response.choices[0].message.content
-
-    # Check for simulated tool call pattern
-    match = re.search(TOOL_REGEX, output)
-    if match:
-        city = match.group(1)
-        price = get_ticket_price(city)
-        return f"A return ticket to {city.title()} costs {price}."
-    else:
-        return output
+    # TOOL:get_ticket_price("City") markers are resolved as they stream past
+    yield from stream_with_tools(client.stream_chat(MODEL, messages), SIMULATED_TOOLS)
 
 # ----------------------------
 # 5. Launch Gradio Chat UI
 # ----------------------------
 
+client.warm_up([MODEL])  # load llama3 while the UI starts, not on the first message
+telemetry.serve()
 gr.ChatInterface(fn=chat, type="messages").launch()
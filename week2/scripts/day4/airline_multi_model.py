@@ -1,16 +1,30 @@
 """
-FlightAI Multi-Model Chatbot with Simulated Tool Calling
+FlightAI Multi-Model Chatbot with Simulated Tool Calling (streamed from every provider)
 Supports: Ollama (local), OpenAI, Claude, Gemini, DeepSeek, Cohere
 """
 
 import os
-import re
+import sys
+import time
 import gradio as gr
 from dotenv import load_dotenv
-from openai import OpenAI
-import anthropic
-import google.generativeai as genai
-import cohere
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.conversation import ConversationStore, session_id
+from common.fares import FareEngine
+from common.gemini import GeminiAdapter
+from common import hedging, lazy, telemetry, tracing, transcripts
+from common.cancellation import CancelToken, closer, estimate_tokens
+from common.ratelimit import estimate_request_tokens, limiter
+from common.router import Candidate, Router
+from common.singleflight import SingleFlight, make_key
+from common.ollama import OllamaClient
+from common.tool_stream import stream_with_tools
+
+# Provider SDKs are imported on first use: startup costs Gradio plus the provider picked
+openai = lazy.module("openai")
+anthropic = lazy.module("anthropic")
+cohere = lazy.module("cohere")
 
 
 # ---------------------- Load API Keys ----------------------
@@ -27,6 +41,8 @@ def setup_environment():
 
 
 key_list = setup_environment()
+DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+gemini = GeminiAdapter(key_list["google_key"])  # configured once, models cached
 
 # ---------------------- System Prompt ----------------------
 
@@ -42,187 +58,220 @@ Otherwise, respond normally with short, polite answers.
 
 # ---------------------- Simulated Tool ----------------------
 
-ticket_prices = {
-    "london": "$799",
-    "paris": "$899",
-    "tokyo": "$1400",
-    "berlin": "$499"
-}
+fares = FareEngine.open()
 
 
 def get_ticket_price(city):
-    city = city.lower()
-    return ticket_prices.get(city, "Sorry, we don't have pricing info for that destination.")
+    return fares.price(city) or "Sorry, we don't have pricing info for that destination."
 
 
-TOOL_REGEX = r'TOOL:get_ticket_price\("([^\"]+)"\)'
+def price_tool(city):
+    return f"A return ticket to {city.title()} costs {get_ticket_price(city)}."
 
 
-def run_tool_if_needed(response_text):
-    match = re.search(TOOL_REGEX, response_text)
-    if match:
-        city = match.group(1)
-        price = get_ticket_price(city)
-        return f"A return ticket to {city.title()} costs {price}."
-    return response_text
+# TOOL:<name>("<arg>") markers are resolved while the reply streams
+SIMULATED_TOOLS = {"get_ticket_price": price_tool}
 
 
-# ---------------------- Model Wrappers ----------------------
+# ---------------------- Model Streamers (return text deltas, close) ----------------------
+# Each streamer renders the session's conversation in its provider's format; the
+# rendering is cached per provider, so a turn only converts the newly added messages.
+# Hosted providers wait for rate limit capacity first (queued fairly per session),
+# and their SDK clients report the limits from response headers back to the limiter.
+# `close` shuts the HTTP response from any thread, so a cancelled stream ends at once.
 
-def ask_openai(messages):
-    client = OpenAI(api_key=key_list["openai_key"])
-    response = client.chat.completions.create(model="gpt-4", messages=messages)
-    return response.choices[0].message.content
+def reserve(provider, model, conversation, max_tokens=500):
+    tokens = estimate_request_tokens(conversation.render("openai"), max_tokens)
+    return limiter.acquire(provider, model, tokens, client=conversation, max_tokens=max_tokens)
 
 
-def ask_claude(messages):
-    client = anthropic.Anthropic(api_key=key_list["anthropic_key"])
+def stream_openai(conversation):
+    reservation = reserve("openai", "gpt-4", conversation)
+    client = openai.OpenAI(api_key=key_list["openai_key"], http_client=limiter.http_client("openai"))
+    stream = client.chat.completions.create(model="gpt-4", messages=conversation.render("openai"), stream=True)
+    deltas = (chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices)
+    return reservation.metered(deltas), closer(stream)
 
-    # Convert standard message format to Claude's format
-    claude_messages = []
-    system_content = ""
 
-    # Extract system message first
-    for msg in messages:
-        if msg["role"] == "system":
-            system_content = msg["content"]
-            break
-
-    # Add user/assistant messages
-    for msg in messages:
-        if msg["role"] != "system":
-            # Only include role and content, no metadata
-            claude_messages.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
-
-    response = client.messages.create(
+def stream_claude(conversation):
+    reservation = reserve("anthropic", "claude-3-haiku-20240307", conversation, max_tokens=1000)
+    client = anthropic.Anthropic(api_key=key_list["anthropic_key"], http_client=limiter.http_client("anthropic"))
+    stream = client.messages.create(
         model="claude-3-haiku-20240307",
         max_tokens=1000,
-        system=system_content,  # Pass system message separately
-        messages=claude_messages
+        system=conversation.system,  # Pass system message separately
+        messages=conversation.render("anthropic"),
+        stream=True,
     )
+    deltas = (event.delta.text for event in stream
+              if event.type == "content_block_delta" and event.delta.type == "text_delta")
+    return reservation.metered(deltas), closer(stream)
 
-    return response.content[0].text
 
+def stream_gemini(conversation):
+    # The rendered contents already end with the current message; it is sent once
+    return gemini.open_stream(conversation.render("gemini"), "gemini-2.0-flash-exp", conversation.system)
 
-def ask_gemini(messages):
-    genai.configure(api_key=key_list["google_key"])
-    system_prompt = next((m["content"] for m in messages if m["role"] == "system"), "")
-    history = [{"role": m["role"], "parts": [m["content"]]} for m in messages if m["role"] != "system"]
-    model = genai.GenerativeModel(model_name="gemini-2.0-flash-exp", system_instruction=system_prompt)
-    chat = model.start_chat(history=history)
-    response = chat.send_message(messages[-1]["content"])
-    return response.text
 
+def stream_deepseek(conversation):
+    reservation = reserve("deepseek", "deepseek-chat", conversation)
+    client = openai.OpenAI(api_key=key_list["deepseek_key"], base_url=DEEPSEEK_BASE_URL,
+                    http_client=limiter.http_client("deepseek"))
+    stream = client.chat.completions.create(model="deepseek-chat", messages=conversation.render("openai"), stream=True)
+    deltas = (chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices)
+    return reservation.metered(deltas), closer(stream)
 
-def ask_deepseek(messages):
-    client = OpenAI(api_key=key_list["deepseek_key"], base_url="https://api.deepseek.com")
-    response = client.chat.completions.create(model="deepseek-chat", messages=messages)
-    return response.choices[0].message.content
 
+def stream_cohere(conversation):
+    reservation = reserve("cohere", "command-r-plus", conversation)
+    client = cohere.Client(api_key=key_list["cohere_key"], httpx_client=limiter.http_client("cohere"))
+    response = client.chat_stream(
+        message=conversation.last_user_message,
+        chat_history=conversation.render("cohere", exclude_last=True),  # latest message is sent separately
+        preamble=conversation.system,
+        model="command-r-plus",
+    )
+    # Cohere's SDK hides the HTTP response, so a cancelled Cohere stream stops at its next event
+    return reservation.metered(event.text for event in response if event.event_type == "text-generation"), None
 
-def ask_cohere(messages):
-    client = cohere.Client(api_key=key_list["cohere_key"])
 
-    # Map standard roles to Cohere's expected format
-    role_mapping = {
-        "user": "User",
-        "assistant": "Chatbot",
-        "system": "System"
-    }
+OLLAMA_MODEL = "llama3"
+ollama_client = OllamaClient(keep_alive={OLLAMA_MODEL: "30m"})
 
-    # Get the latest user message
-    user_message = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
 
-    # Format chat history for Cohere
-    chat_history = []
-    for i in range(len(messages) - 1):  # Skip the last message as it's handled separately
-        m = messages[i]
-        if m["role"] != "system":  # Skip system messages in history
-            cohere_role = role_mapping.get(m["role"], "User")  # Default to User if unknown
-            chat_history.append({"role": cohere_role, "message": m["content"]})
+def stream_ollama(conversation):
+    return ollama_client.open_chat(OLLAMA_MODEL, conversation.render("openai"))
 
-    response = client.chat(
-        message=user_message,
-        chat_history=chat_history,
-        model="command-r-plus",
-    )
-    return response.text
 
+# ---------------------- Dispatcher ----------------------
 
-def ask_ollama(messages):
-    client = OpenAI(base_url="http://localhost:11434/v1", api_key="ollama")
-    response = client.chat.completions.create(model="llama3", messages=messages)
-    return response.choices[0].message.content
+STREAMERS = {
+    "openai": stream_openai,
+    "claude": stream_claude,
+    "gemini": stream_gemini,
+    "deepseek": stream_deepseek,
+    "cohere": stream_cohere,
+    "ollama": stream_ollama,
+}
 
+# Backup tried when hedging is on and the primary is slower than its p90 to start
+HEDGE_BACKUPS = {
+    "openai": "deepseek",
+    "claude": "openai",
+    "gemini": "openai",
+    "deepseek": "openai",
+    "cohere": "openai",
+    "ollama": "openai",
+}
 
-# ---------------------- Dispatcher ----------------------
+# "auto" picks the fastest healthy provider at or above the chosen quality tier
+router = Router([
+    Candidate("openai", "gpt-4", "premium"),
+    Candidate("claude", "claude-3-haiku-20240307", "standard"),
+    Candidate("gemini", "gemini-2.0-flash-exp", "standard"),
+    Candidate("deepseek", "deepseek-chat", "standard"),
+    Candidate("cohere", "command-r-plus", "standard"),
+    Candidate("ollama", OLLAMA_MODEL, "local"),
+])
+
+MODELS = {c.provider: c.model for c in router.candidates}
+
+conversations = ConversationStore(system=SYSTEM_MESSAGE)
+
+# Identical in-flight requests (the same opening question from several users at
+# once) attach to one upstream stream; each subscriber gets the full reply
+flights = SingleFlight("chat")
+
+
+@tracing.traced("multi_model_chat")
+def multi_model_chat(user_input, history, provider, session="default", hedge=False, tier="standard"):
+    if provider != "auto" and provider not in STREAMERS:
+        yield "❌ Unknown provider."
+        return
+
+    # Only the history entries added since this session's last turn are converted
+    conversation = conversations.get(session)
+    conversation.sync(history)
+    conversation.append("user", user_input)
+
+    def start(name):
+        return router.track(name, lambda: STREAMERS[name](conversation))
+
+    if provider == "auto":
+        ranking = [c.provider for c in router.rank(tier)]
+        backup = ranking[1] if hedge and len(ranking) > 1 else None
+        if backup:
+            provider = ranking[0]
+    else:
+        backup = HEDGE_BACKUPS.get(provider) if hedge else None
+
+    # (deltas, close) for the shared stream; hedged and auto streams close through a token
+    def upstream():
+        if provider != "auto" and not backup:
+            return start(provider)
+        token = CancelToken()
+        if backup:
+            deltas = hedging.hedged(provider, lambda: start(provider), backup, lambda: start(backup), token=token)
+        else:
+            deltas = router.stream(lambda name: STREAMERS[name](conversation), min_tier=tier, token=token)
+        return deltas, token.cancel
 
-def multi_model_chat(user_input, history, provider):
-    # Format history into messages
-    messages = [{"role": "system", "content": SYSTEM_MESSAGE}]
-
-    # Convert Gradio history to message format
-    for entry in history:
-        if isinstance(entry, list) and len(entry) == 2:
-            # Gradio history format: [user_message, assistant_message]
-            if entry[0]:  # User message
-                messages.append({"role": "user", "content": entry[0]})
-            if entry[1]:  # Assistant message
-                messages.append({"role": "assistant", "content": entry[1]})
-        elif isinstance(entry, dict) and "role" in entry and "content" in entry:
-            # Already in message format
-            messages.append(entry)
-
-    # Add current user input
-    messages.append({"role": "user", "content": user_input})
+    key = make_key(provider, tier, backup, conversation.render("openai"))
+    deltas = flights.stream(key, upstream)
 
+    record = transcripts.get().session("airline_multi_model", session, title=user_input)
+    record.add("User", user_input)
+    started = time.perf_counter()
+    reply = ""
     try:
-        if provider == "openai":
-            raw = ask_openai(messages)
-        elif provider == "claude":
-            raw = ask_claude(messages)
-        elif provider == "gemini":
-            raw = ask_gemini(messages)
-        elif provider == "deepseek":
-            raw = ask_deepseek(messages)
-        elif provider == "cohere":
-            raw = ask_cohere(messages)
-        elif provider == "ollama":
-            raw = ask_ollama(messages)
-        else:
-            return "❌ Unknown provider."
-
-        return run_tool_if_needed(raw)
+        for reply in stream_with_tools(deltas, SIMULATED_TOOLS):
+            yield reply
+        conversation.append("assistant", reply)
+        model = MODELS.get(provider) if not backup else None   # auto/hedged: whichever answered
+        record.add(provider, reply, model=model, latency_ms=1000 * (time.perf_counter() - started),
+                   tokens=estimate_tokens(reply))
     except Exception as e:
-        return f"Error: {str(e)}"
+        yield (reply + "\n\n" if reply else "") + f"Error: {str(e)}"
 
 
 # ---------------------- Gradio UI ----------------------
 
 def launch_interface():
+    ollama_client.warm_up([OLLAMA_MODEL])  # Ollama is the default provider; load it in the background
+
     provider_dropdown = gr.Radio(
-        choices=["openai", "claude", "gemini", "deepseek", "cohere", "ollama"],
+        choices=["auto", "openai", "claude", "gemini", "deepseek", "cohere", "ollama"],
         value="ollama",
         label="Select Model Provider",
         interactive=True
     )
 
+    hedge_checkbox = gr.Checkbox(value=False, label="⚡ Hedge slow requests with a backup provider")
+
+    tier_radio = gr.Radio(
+        choices=["premium", "standard", "local"],
+        value="standard",
+        label="Minimum quality tier (auto)",
+    )
+
     chatbot = gr.Chatbot(label="FlightAI", type="messages")
 
-    def chat_wrapper(user_input, history, provider):
-        return multi_model_chat(user_input, history, provider)
-
-    gr.ChatInterface(
-        fn=chat_wrapper,
-        chatbot=chatbot,
-        additional_inputs=[provider_dropdown],
-        title="FlightAI: Multi-Model Airline Chatbot",
-        description="Ask questions about flights, prices, or destinations. Ticket price inquiries trigger simulated tools.",
-        type="messages"
-    ).launch()
+    def chat_wrapper(user_input, history, provider, hedge, tier, request: gr.Request):
+        yield from multi_model_chat(user_input, history, provider, session_id(request), hedge, tier)
+
+    with gr.Blocks(title="FlightAI") as demo:
+        gr.ChatInterface(
+            fn=chat_wrapper,
+            chatbot=chatbot,
+            additional_inputs=[provider_dropdown, hedge_checkbox, tier_radio],
+            title="FlightAI: Multi-Model Airline Chatbot",
+            description="Ask questions about flights, prices, or destinations. Ticket price inquiries trigger simulated tools.",
+            type="messages"
+        )
+        with gr.Accordion("📊 Live provider stats (used by auto)", open=False):
+            gr.Markdown(router.dashboard, every=5)
+    telemetry.serve()
+    demo.launch()
 
 
 if __name__ == "__main__":
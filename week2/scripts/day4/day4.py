@@ -6,14 +6,23 @@ This script demonstrates:
 2. OpenAI chat completions with tool-calling
 3. Gradio ChatInterface integration
 4. Dynamic ticket price lookup
+5. Streaming replies, including every tool call the model asks for
+6. A local fast path that answers simple price questions without the LLM
 """
 
 import os
-import json
+import sys
 from dotenv import load_dotenv
 from openai import OpenAI
 import gradio as gr
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.agent import stream_chat_with_tools
+from common.fares import DEFAULT_ORIGIN, FareEngine
+from common.intent import PriceFastPath
+from common.tools import ToolRegistry
+from common import telemetry, tracing
+
 # ----------------------------
 # 1. Setup Environment & Client
 # ----------------------------
@@ -39,81 +48,54 @@ system_message = (
 )
 
 # ----------------------------
-# 3. Tool Function
+# 3. Tools (schemas generated once from the signatures)
 # ----------------------------
 
-ticket_prices = {
-    "london": "$799",
-    "paris": "$899",
-    "tokyo": "$1400",
-    "berlin": "$499"
-}
-
-def get_ticket_price(destination_city):
-    city = destination_city.lower()
-    print(f"[TOOL] Fetching price for: {city}")
-    return ticket_prices.get(city, "Unknown")
-
-# Tool schema
-price_tool = {
-    "name": "get_ticket_price",
-    "description": "Get the price of a return ticket to the destination city.",
-    "parameters": {
-        "type": "object",
-        "properties": {
-            "destination_city": {
-                "type": "string",
-                "description": "The city the customer wants to fly to."
-            },
-        },
-        "required": ["destination_city"]
-    }
-}
-
-tools = [{"type": "function", "function": price_tool}]
+tools = ToolRegistry()
 
-# ----------------------------
-# 4. Tool Call Handler
-# ----------------------------
+fares = FareEngine.open()
 
-def handle_tool_call(tool_call):
-    args = json.loads(tool_call.function.arguments)
-    city = args.get("destination_city")
-    price = get_ticket_price(city)
-    return {
-        "role": "tool",
-        "tool_call_id": tool_call.id,
-        "content": json.dumps({"destination_city": city, "price": price})
-    }
+@tools.register("Get the price of a return ticket to the destination city.",
+                destination_city="The city the customer wants to fly to.",
+                origin_city="The city the customer departs from (defaults to our New York hub).")
+def get_ticket_price(destination_city: str, origin_city: str = DEFAULT_ORIGIN):
+    print(f"[TOOL] Fetching price for: {origin_city} -> {destination_city}")
+    return {"destination_city": destination_city, "origin_city": origin_city,
+            "price": fares.price(destination_city, origin_city) or "Unknown"}
+
+fast_path = PriceFastPath(fares)
 
 # ----------------------------
-# 5. Chat Function
+# 4. Chat Function
 # ----------------------------
 
+@tracing.traced("chat")
 def chat(user_input, history):
+    # Simple "how much is a ticket to X?" questions never reach the model
+    with tracing.span("fast_path") as span:
+        answer = fast_path.try_answer(user_input)
+        span.set(cache_hit=bool(answer))
+    if answer:
+        yield answer
+        return
+
     messages = [{"role": "system", "content": system_message}]
     for h in history:
         if "role" in h and "content" in h:
             messages.append(h)
     messages.append({"role": "user", "content": user_input})
 
-    response = client.chat.completions.create(model=MODEL, messages=messages, tools=tools)
-
-    if response.choices[0].finish_reason == "tool_calls":
-        tool_call = response.choices[0].message.tool_calls[0]
-        tool_response = handle_tool_call(tool_call)
-
-        messages.append(response.choices[0].message)
-        messages.append(tool_response)
-
-        # Call again after tool response
-        response = client.chat.completions.create(model=MODEL, messages=messages)
-
-    return response.choices[0].message.content
+    # Stream the reply; tool rounds happen inside the loop
+    reply = ""
+    for event in stream_chat_with_tools(client, MODEL, messages, tools.schemas, tools.run_all):
+        if event[0] == "text":
+            reply += event[1]
+            yield reply
 
 # ----------------------------
-# 6. Launch Gradio Interface
+# 5. Launch Gradio Interface
 # ----------------------------
 
 demo = gr.ChatInterface(fn=chat, type="messages")
+telemetry.serve()
 demo.launch()
@@ -13,6 +13,7 @@ This script demonstrates:
 """
 
 import os
+import sys
 import json
 import base64
 from io import BytesIO
@@ -24,6 +25,11 @@ from pydub import AudioSegment
 from pydub.playback import play
 import gradio as gr
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import sink, telemetry, tracing
+from common.ratelimit import estimate_request_tokens, limiter
+from common.singleflight import SingleFlight
+
 # ----------------------------
 # 1. Setup Environment & Client
 # ----------------------------
@@ -34,8 +40,10 @@ if api_key:
 else:
     raise ValueError("❌ OPENAI_API_KEY not found in .env file")
 
-client = OpenAI(api_key=api_key)
+# Requests are throttled client-side; response headers keep the limiter's RPM/TPM current
+client = OpenAI(api_key=api_key, http_client=limiter.http_client("openai"))
 MODEL = "gpt-4o"
+outputs = sink.get("output")   # images and the chat log are written by a background thread
 
 # ----------------------------
 # 2. System Prompt
@@ -93,7 +101,13 @@ def handle_tool_call(tool_call):
 # ----------------------------
 # 5. Multimedia: Image Generation and TTS
 # ----------------------------
+# Concurrent requests for the same city share one DALL-E call (and one rate limit slot)
+flights = SingleFlight("artist")
+
+@flights.wrap(lambda city: ("dall-e-3", city.strip().lower()))
+@tracing.traced("image", model="dall-e-3")
 def artist(city):
+    limiter.acquire("openai", "dall-e-3")
     image_response = client.images.generate(
         model="dall-e-3",
         prompt=f"An image representing a vacation in {city}, showing tourist spots and everything unique about {city}, in charcoal sketch style",
@@ -103,11 +117,12 @@ def artist(city):
     )
     image_base64 = image_response.data[0].b64_json
     image_data = base64.b64decode(image_base64)
-    with open("latest_image.png", "wb") as f:
-        f.write(image_data)
+    outputs.write("latest_image.png", image_data, kind="image", replace=True)
     return Image.open(BytesIO(image_data)), image_base64
 
+@tracing.traced("tts", model="tts-1")
 def talker(message):
+    limiter.acquire("openai", "tts-1")
     response = client.audio.speech.create(
         model="tts-1",
         voice="onyx",
@@ -120,6 +135,17 @@ def talker(message):
 # ----------------------------
 # 6. Chat Function
 # ----------------------------
+def complete(messages, **kwargs):
+    """Chat completion that waits for rate limit capacity instead of hitting a 429."""
+    reservation = limiter.acquire("openai", MODEL, estimate_request_tokens(messages))
+    with tracing.span("llm.complete", provider="openai", model=MODEL) as span:
+        response = client.chat.completions.create(model=MODEL, messages=messages, **kwargs)
+        if response.usage:
+            reservation.settle(response.usage.total_tokens)
+            span.set(output_tokens=response.usage.completion_tokens)
+    return response
+
+@tracing.traced("chat")
 def chat(history, enable_image, enable_tts):
     messages = [{"role": "system", "content": system_message}] + history
     image = None
@@ -127,7 +153,7 @@ def chat(history, enable_image, enable_tts):
     image_md = ""
 
     try:
-        response = client.chat.completions.create(model=MODEL, messages=messages, tools=tools)
+        response = complete(messages, tools=tools)
     except RateLimitError as e:
         warning = "⚠️ OpenAI quota exceeded. Please check your usage and billing."
         history.append({"role": "assistant", "content": warning})
@@ -158,7 +184,7 @@ def chat(history, enable_image, enable_tts):
                 image_md = "\n⚠️ Image generation quota exceeded."
 
         try:
-            response = client.chat.completions.create(model=MODEL, messages=messages)
+            response = complete(messages)
         except RateLimitError:
             warning = "⚠️ OpenAI quota exceeded after tool use."
             history.append({"role": "assistant", "content": warning})
@@ -168,9 +194,8 @@ def chat(history, enable_image, enable_tts):
     if image and city:
         reply += f"\n\n🖼️ Here's a sketch of **{city.title()}**!\n\n{image_md}"
 
-        with open("chatlog.md", "a") as f:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            f.write(f"\n\n## {timestamp}\n\n**User:** {history[-1]['content']}\n\n**Assistant:** {reply}\n")
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        outputs.append("chatlog.md", f"\n\n## {timestamp}\n\n**User:** {history[-1]['content']}\n\n**Assistant:** {reply}\n")
 
     history.append({"role": "assistant", "content": reply})
     if enable_tts:
@@ -205,4 +230,5 @@ with gr.Blocks() as ui:
     )
     clear.click(lambda: [], outputs=chatbot, queue=False)
 
+telemetry.serve()
 ui.launch(inbrowser=True)
@@ -8,9 +8,11 @@ This script demonstrates:
 4. Dynamic ticket price lookup
 5. DALL·E 3 image generation
 6. TTS with OpenAI's speech API and pydub playback
+7. Streaming replies, including every tool call the model asks for
 """
 
 import os
+import sys
 import json
 import base64
 from io import BytesIO
@@ -21,6 +23,13 @@ from pydub import AudioSegment
 from pydub.playback import play
 import gradio as gr
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import telemetry, tracing
+from common.agent import stream_chat_with_tools
+from common.fares import DEFAULT_ORIGIN, FareEngine
+from common.singleflight import SingleFlight
+from common.tools import ToolRegistry
+
 # ----------------------------
 # 1. Setup Environment & Client
 # ----------------------------
@@ -43,53 +52,28 @@ system_message = (
 )
 
 # ----------------------------
-# 3. Tool Function (Flight Ticket Lookup)
+# 3. Tools (schemas generated once from the signatures)
 # ----------------------------
-ticket_prices = {
-    "london": "$799",
-    "paris": "$899",
-    "tokyo": "$1400",
-    "berlin": "$499"
-}
-
-def get_ticket_price(destination_city):
-    city = destination_city.lower()
-    print(f"[TOOL] Fetching price for: {city}")
-    return ticket_prices.get(city, "Unknown")
-
-price_tool = {
-    "name": "get_ticket_price",
-    "description": "Get the price of a return ticket to the destination city.",
-    "parameters": {
-        "type": "object",
-        "properties": {
-            "destination_city": {
-                "type": "string",
-                "description": "The city the customer wants to fly to."
-            },
-        },
-        "required": ["destination_city"]
-    }
-}
-
-tools = [{"type": "function", "function": price_tool}]
+tools = ToolRegistry()
 
-# ----------------------------
-# 4. Tool Call Handler
-# ----------------------------
-def handle_tool_call(tool_call):
-    args = json.loads(tool_call.function.arguments)
-    city = args.get("destination_city", "").strip()
-    price = get_ticket_price(city)
-    return {
-        "role": "tool",
-        "tool_call_id": tool_call.id,
-        "content": json.dumps({"destination_city": city, "price": price})
-    }, city
+fares = FareEngine.open()
+
+@tools.register("Get the price of a return ticket to the destination city.",
+                destination_city="The city the customer wants to fly to.",
+                origin_city="The city the customer departs from (defaults to our New York hub).")
+def get_ticket_price(destination_city: str, origin_city: str = DEFAULT_ORIGIN):
+    print(f"[TOOL] Fetching price for: {origin_city} -> {destination_city}")
+    return {"destination_city": destination_city, "origin_city": origin_city,
+            "price": fares.price(destination_city, origin_city) or "Unknown"}
 
 # ----------------------------
-# 5. Multimedia: Image Generation and TTS
+# 4. Multimedia: Image Generation and TTS
 # ----------------------------
+# Concurrent requests for the same city share one DALL-E call
+flights = SingleFlight("artist")
+
+@flights.wrap(lambda city: ("dall-e-3", city.strip().lower()))
+@tracing.traced("image", model="dall-e-3")
 def artist(city):
     image_response = client.images.generate(
         model="dall-e-3",
@@ -102,6 +86,7 @@ def artist(city):
     image_data = base64.b64decode(image_base64)
     return Image.open(BytesIO(image_data))
 
+@tracing.traced("tts", model="tts-1")
 def talker(message):
     response = client.audio.speech.create(
         model="tts-1",
@@ -113,46 +98,36 @@ def talker(message):
     play(audio)
 
 # ----------------------------
-# 6. Chat Function
+# 5. Chat Function
 # ----------------------------
+@tracing.traced("chat")
 def chat(history):
     messages = [{"role": "system", "content": system_message}] + history
     image = None
     city = None
 
-    response = client.chat.completions.create(model=MODEL, messages=messages, tools=tools)
+    history.append({"role": "assistant", "content": ""})
+    reply = ""
+    for event in stream_chat_with_tools(client, MODEL, messages, tools.schemas, tools.run_all):
+        if event[0] == "text":
+            reply += event[1]
+            history[-1]["content"] = reply
+            yield history, image
+        elif event[0] == "tool_result" and image is None:
+            city = json.loads(event[2]["content"]).get("destination_city", "").strip().lower()
+            if city:
+                print(f"[DEBUG] Calling artist() with city: {city}")
+                image = artist(city)
+                yield history, image
 
-    if response.choices[0].finish_reason == "tool_calls":
-        tool_call = response.choices[0].message.tool_calls[0]
-        tool_response, city = handle_tool_call(tool_call)
-
-        tool_call_msg = response.choices[0].message
-        tool_call_dict = {
-            "role": str(tool_call_msg.role),
-            "content": str(tool_call_msg.content or "")
-        }
-        if hasattr(tool_call_msg, "tool_calls"):
-            tool_call_dict["tool_calls"] = tool_call_msg.tool_calls
-        messages.append(tool_call_dict)
-        messages.append(tool_response)
-
-        if city:
-            city = city.strip().lower()
-            print(f"[DEBUG] Calling artist() with city: {city}")
-            image = artist(city)
-
-        response = client.chat.completions.create(model=MODEL, messages=messages)
-
-    reply = response.choices[0].message.content
     if image and city:
         reply += f"\n\n🖼️ Here's a sketch of **{city.title()}**!"
-    history.append({"role": "assistant", "content": reply})
+        history[-1]["content"] = reply
+        yield history, image
     talker(reply)
 
-    return history, image
-
 # ----------------------------
-# 7. Gradio UI
+# 6. Gradio UI
 # ----------------------------
 with gr.Blocks() as ui:
     with gr.Row():
@@ -172,4 +147,5 @@ with gr.Blocks() as ui:
     )
     clear.click(lambda: [], outputs=chatbot, queue=False)
 
+telemetry.serve()
 ui.launch(inbrowser=True)
@@ -8,6 +8,7 @@ import json
 import base64
 import csv
 import re
+import sys
 import time
 from io import BytesIO
 from datetime import datetime
@@ -18,6 +19,15 @@ from pydub import AudioSegment
 from pydub.playback import play
 import gradio as gr
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import sink, telemetry, tracing, transcripts
+from common.agent import stream_chat_with_tools
+from common.fares import DEFAULT_ORIGIN, FareEngine
+from common.intent import PriceFastPath
+from common.singleflight import SingleFlight
+from common.tools import ToolRegistry
+from common.transcription import StreamingTranscriber
+
 # 1. Setup
 load_dotenv(override=True)
 api_key = os.getenv("OPENAI_API_KEY")
@@ -28,6 +38,10 @@ translation_client = OpenAI(api_key=api_key)  # Same or different key/model if n
 MODEL = "gpt-4o"
 OUTPUT_DIR = "../output"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+outputs = sink.get(OUTPUT_DIR)   # images and the usage log are written off the request thread
+
+# Identical in-flight image/translation requests share one upstream call (and one charge)
+flights = SingleFlight("day5")
 
 
 class SessionState:
@@ -36,6 +50,7 @@ class SessionState:
         self.chat_log = []
         self.total_cost = 0.0
         self.record_start_time = None
+        self.transcriber = None
 
 
 session = SessionState()
@@ -46,14 +61,26 @@ system_message = (
     "If a booking is made, confirm it nicely with the booking ID."
 )
 
-ticket_prices = {"london": "$799", "paris": "$899", "tokyo": "$1400", "berlin": "$499"}
+tools = ToolRegistry()
+
+fares = FareEngine.open()
 
 
-def get_ticket_price(destination_city):
-    return ticket_prices.get(destination_city.lower(), "Unknown")
+@tools.register("Get the price of a return ticket to the destination city.",
+                destination_city="The city the customer wants to fly to.",
+                origin_city="The city the customer departs from (defaults to our New York hub).")
+def get_ticket_price(destination_city: str, origin_city: str = DEFAULT_ORIGIN):
+    return {"destination_city": destination_city, "origin_city": origin_city,
+            "price": fares.price(destination_city, origin_city) or "Unknown"}
 
 
-def make_booking(destination_city, passenger_name):
+fast_path = PriceFastPath(fares)
+
+
+@tools.register("Book a ticket to the destination city and return the booking ID.",
+                destination_city="The city the customer wants to fly to.",
+                passenger_name="Full name of the passenger.")
+def make_booking(destination_city: str, passenger_name: str):
     booking_time = datetime.now().isoformat()
     booking_id = f"{passenger_name[:3].upper()}{int(time.time())}"
     with open(os.path.join(OUTPUT_DIR, "bookings.csv"), "a", newline="") as f:
@@ -86,29 +113,15 @@ def show_all_bookings():
     return output
 
 
-def handle_tool_call(tool_call):
-    args = json.loads(tool_call.function.arguments)
-    if tool_call.function.name == "get_ticket_price":
-        city = args.get("destination_city", "").strip()
-        price = get_ticket_price(city)
-        return {"role": "tool", "tool_call_id": tool_call.id,
-                "content": json.dumps({"destination_city": city, "price": price})}, city
-    elif tool_call.function.name == "make_booking":
-        city = args.get("destination_city", "").strip()
-        passenger = args.get("passenger_name", "").strip()
-        booking_info = make_booking(city, passenger)
-        return {"role": "tool", "tool_call_id": tool_call.id, "content": json.dumps(booking_info)}, city
-    else:
-        return {"role": "tool", "tool_call_id": tool_call.id, "content": "Unknown tool call."}, ""
-
-
 def log_usage(feature, cost=0.0):
     session.total_cost += cost
-    with open(os.path.join(OUTPUT_DIR, "usage_log.csv"), "a", newline="") as f:
-        csv.writer(f).writerow([datetime.now().isoformat(), feature, f"{cost:.4f}"])
+    outputs.append("usage_log.csv", f"{datetime.now().isoformat()},{feature},{cost:.4f}\r\n")
 
 
+@flights.wrap(lambda city: ("dall-e-3", city.strip().lower()))
+@tracing.traced("image", model="dall-e-3")
 def artist(city):
+    tracing.current_span().set(city=city)
     image_response = client.images.generate(
         model="dall-e-3",
         prompt=f"A vacation scene in {city}, charcoal sketch style",
@@ -118,9 +131,7 @@ def artist(city):
     )
     log_usage("image_generation", 0.08)
     image_data = base64.b64decode(image_response.data[0].b64_json)
-    filepath = os.path.join(OUTPUT_DIR, f"{city}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
-    with open(filepath, "wb") as f:
-        f.write(image_data)
+    outputs.write(f"{city}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png", image_data, kind="image")
     return Image.open(BytesIO(image_data))
 
 
@@ -131,9 +142,12 @@ def clean_for_tts(text):
     return text.strip()
 
 
+@tracing.traced("tts", model="tts-1")
 def talker(message):
     message = clean_for_tts(message)
+    tracing.current_span().set(chars=len(message))
     if len(message) > 400:
+        tracing.current_span().set(skipped=True)
         log_usage("tts_skipped", 0.0)
         return
     response = client.audio.speech.create(model="tts-1", voice="onyx", input=message)
@@ -144,7 +158,10 @@ def talker(message):
     play(audio)
 
 
+@flights.wrap(lambda original_text, target_language: ("gpt-3.5-turbo", target_language, original_text))
+@tracing.traced("llm.translate", model="gpt-3.5-turbo")
 def translate_text(original_text, target_language):
+    tracing.current_span().set(language=target_language, chars=len(original_text))
     try:
         response = translation_client.chat.completions.create(
             model="gpt-3.5-turbo",
@@ -157,73 +174,61 @@ def translate_text(original_text, target_language):
         translation = response.choices[0].message.content
         return translation
     except Exception as e:
+        tracing.current_span().record_error(e)
         return f"⚠️ Translation failed: {str(e)}"
 
 
 def chat(history, enable_image, enable_tts):
+    """Stream the assistant reply into `history`; yields (history, reply so far)."""
     messages = [{"role": "system", "content": system_message}] + history
-    try:
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=messages,
-            tools=[
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "get_ticket_price",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "destination_city": {"type": "string"}
-                            },
-                            "required": ["destination_city"]
-                        }
-                    }
-                },
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "make_booking",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "destination_city": {"type": "string"},
-                                "passenger_name": {"type": "string"}
-                            },
-                            "required": ["destination_city", "passenger_name"]
-                        }
-                    }
-                }
-            ]
-        )
-        log_usage("chat")
-    except OpenAIError as e:
-        history.append({"role": "assistant", "content": f"⚠️ OpenAI error: {e}"})
-        return history, None
-
-    if response.choices[0].finish_reason == "tool_calls":
-        tool_call_msg = response.choices[0].message
-        tool_call = tool_call_msg.tool_calls[0]
-        tool_response, city = handle_tool_call(tool_call)
-        session.current_city = city
-        messages.append(
-            {"role": "assistant", "content": tool_call_msg.content or "", "tool_calls": tool_call_msg.tool_calls})
-        messages.append(tool_response)
-        try:
-            response = client.chat.completions.create(model=MODEL, messages=messages)
-            log_usage("chat")
-        except OpenAIError as e:
-            history.append({"role": "assistant", "content": f"⚠️ OpenAI error after tool use: {e}"})
-            return history, None
-
-    reply = response.choices[0].message.content
-    history.append({"role": "assistant", "content": reply})
+    history.append({"role": "assistant", "content": ""})
+    started = time.perf_counter()
+
+    # Plain price lookups are answered from the table, skipping both model calls
+    with tracing.span("fast_path") as span:
+        reply = fast_path.try_answer(history[-2]["content"])
+        span.set(cache_hit=bool(reply))
+    if reply:
+        session.current_city = fast_path.last_intent.city
+        model = None
+    else:
+        reply = yield from stream_reply(messages, history)
+        if reply is None:
+            return
+        model = MODEL
+    history[-1]["content"] = reply
+
     session.chat_log.append({"user": history[-2]["content"], "assistant": reply})
+    record = transcripts.get().session("flightai", "default", title=history[-2]["content"])
+    record.add("User", history[-2]["content"])
+    record.add("FlightAI", reply, model=model, latency_ms=1000 * (time.perf_counter() - started))
 
     if enable_tts and reply:
         talker(reply)
 
-    return history, reply
+    yield history, reply
+
+
+def stream_reply(messages, history):
+    """Run the streaming tool loop; returns the final reply, or None after an OpenAI error."""
+    reply = ""
+    try:
+        for event in stream_chat_with_tools(client, MODEL, messages, tools.schemas, tools.run_all):
+            if event[0] == "round":
+                log_usage("chat")
+            elif event[0] == "tool_result":
+                result = json.loads(event[2]["content"])
+                if result.get("destination_city"):
+                    session.current_city = result["destination_city"].strip()
+            elif event[0] == "text":
+                reply += event[1]
+                history[-1]["content"] = reply
+                yield history, reply
+    except OpenAIError as e:
+        history[-1]["content"] = (reply + "\n\n" if reply else "") + f"⚠️ OpenAI error: {e}"
+        yield history, None
+        return None
+    return reply
 
 
 def start_recording():
@@ -236,7 +241,7 @@ def listen_and_transcribe(audio_path):
         return "No audio recorded.", ""
     elapsed = time.time() - session.record_start_time if session.record_start_time else 0
     try:
-        with open(audio_path, "rb") as audio_file:
+        with open(audio_path, "rb") as audio_file, tracing.span("transcription", model="whisper-1"):
             transcript_response = client.audio.transcriptions.create(
                 model="whisper-1",
                 file=audio_file,
@@ -248,6 +253,63 @@ def listen_and_transcribe(audio_path):
         return f"⚠️ Error: {e}", ""
 
 
+# Streaming mic: transcribe 2-second windows while the user is still talking
+@tracing.traced("transcription", model="whisper-1")
+def transcribe_chunk(wav_file, prompt=""):
+    return client.audio.transcriptions.create(
+        model="whisper-1",
+        file=wav_file,
+        response_format="text",
+        prompt=prompt
+    )
+
+
+def start_streaming():
+    session.record_start_time = time.time()
+    session.transcriber = StreamingTranscriber(transcribe_chunk)
+    return "🎤 Listening..."
+
+
+def stream_transcribe(chunk):
+    if chunk is None or session.transcriber is None:
+        return gr.update()
+    sample_rate, samples = chunk
+    session.transcriber.feed(sample_rate, samples)
+    partial = session.transcriber.partial_text()
+    return f"🎤 {session.transcriber.elapsed:.1f}s — {partial or '...'}"
+
+
+def finish_streaming():
+    transcriber = session.transcriber
+    if transcriber is None:
+        return "No audio recorded.", ""
+    transcript = transcriber.finish()
+    session.transcriber = None
+    log_usage("audio_transcription", round(transcriber.seconds_sent / 60 * 0.006, 4))
+    status = f"Recording stopped. Duration: {transcriber.elapsed:.1f} seconds"
+    if transcriber.errors:
+        status += f" (⚠️ {len(transcriber.errors)} chunk(s) failed: {transcriber.errors[-1]})"
+    return status, transcript
+
+
+# Chat, tools, translation, image and TTS are tracing spans (TRACE_EXPORT=console for a waterfall)
+@tracing.traced("process_chat")
+def process_chat(history, enable_image_flag, enable_tts_flag, target_language):
+    reply = None
+    cost = f"**Total Estimated Cost: ${session.total_cost:.2f}**"
+    for updated_history, reply in chat(history, enable_image_flag, enable_tts_flag):
+        yield updated_history, gr.update(), cost, gr.update()
+
+    translation = ""
+    if reply:
+        translation = translate_text(reply, target_language)
+
+    image = None
+    if enable_image_flag and session.current_city:
+        image = artist(session.current_city)
+    yield updated_history, image, f"**Total Estimated Cost: ${session.total_cost:.2f}**", translation
+
+
 with gr.Blocks() as ui:
     with gr.Row():
         chatbot = gr.Chatbot(height=500, type="messages")
@@ -262,6 +324,10 @@ with gr.Blocks() as ui:
         record_timer = gr.Markdown("Recording status...")
         audio_transcript = gr.Textbox(label="Transcribed Text (Editable)")
 
+    with gr.Row():
+        mic_stream = gr.Audio(sources=["microphone"], streaming=True, type="numpy",
+                              label="🎙️ Live Mic (transcribes while you speak)")
+
     with gr.Row():
         enable_image = gr.Checkbox(label="Enable Image Generation", value=False)
         enable_tts = gr.Checkbox(label="Enable Text-to-Speech", value=True)
@@ -282,18 +348,6 @@ with gr.Blocks() as ui:
         return "", history
 
 
-    def process_chat(history, enable_image_flag, enable_tts_flag, target_language):
-        updated_history, reply = chat(history, enable_image_flag, enable_tts_flag)
-        translation = ""
-        if reply:
-            translation = translate_text(reply, target_language)
-
-        if enable_image_flag and session.current_city:
-            image = artist(session.current_city)
-            return updated_history, image, f"**Total Estimated Cost: ${session.total_cost:.2f}**", translation
-        return updated_history, None, f"**Total Estimated Cost: ${session.total_cost:.2f}**", translation
-
-
     entry.submit(do_entry, inputs=[entry, chatbot], outputs=[entry, chatbot]).then(
         process_chat,
         inputs=[chatbot, enable_image, enable_tts, language_selector],
@@ -311,8 +365,22 @@ with gr.Blocks() as ui:
         outputs=[chatbot, image_output, cost_display, translation_output]
     )
 
+    mic_stream.start_recording(start_streaming, outputs=[record_timer])
+    mic_stream.stream(stream_transcribe, inputs=[mic_stream], outputs=[record_timer], stream_every=0.5)
+    mic_stream.stop_recording(finish_streaming, outputs=[record_timer, audio_transcript]).then(
+        do_entry,
+        inputs=[audio_transcript, chatbot],
+        outputs=[entry, chatbot]
+    ).then(
+        process_chat,
+        inputs=[chatbot, enable_image, enable_tts, language_selector],
+        outputs=[chatbot, image_output, cost_display, translation_output]
+    )
+
     test_tts_button.click(lambda: talker("Hello, welcome to FlightAI! This is a TTS test."), outputs=[])
     clear.click(lambda: [], outputs=chatbot, queue=False)
     show_bookings.click(lambda: [{"role": "assistant", "content": show_all_bookings()}], outputs=chatbot)
 
-ui.launch(inbrowser=True)
+if __name__ == "__main__":
+    telemetry.serve()
+    ui.launch(inbrowser=True)